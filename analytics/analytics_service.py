@@ -1,10 +1,16 @@
+import copy
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import threading
 import time
-from typing import Dict, List, Tuple
-from models.monitoring import SystemMetrics, db
+from typing import Dict, List, Optional, Tuple
+from flask import current_app
+from analytics.model_cache import ModelCache
+from analytics.streaming_detector import StreamingAnomalyDetector
+from models.metric_catalog import metric_unit, metrics_in_group
+from storage.metrics_store import SqlMetricsStore
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression
@@ -12,11 +18,15 @@ import warnings
 
 warnings.filterwarnings('ignore')
 
+# Признаки моделей аналитики (входят в отпечаток кэша моделей)
+ANALYTICS_FEATURES = metrics_in_group('analysis')
+
 
 class AnalyticsService:
     """Сервис аналитики и машинного обучения для мониторинга ЦОД"""
 
-    def __init__(self):
+    def __init__(self, store=None, streaming: StreamingAnomalyDetector = None, model_cache: ModelCache = None,
+                 executor_factory=None):
         self.models = {}
         self.scalers = {}
         self.is_initialized = False
@@ -30,41 +40,262 @@ class AnalyticsService:
         }
         self.last_analysis = None
         self.min_data_points = 50  # Минимум записей для анализа
+        self.store = store or SqlMetricsStore()  # Хранилище сырых строк
+
+        # Потоковый детектор оценивает каждый замер, IsolationForest переобучается в фоне
+        self.streaming = streaming or StreamingAnomalyDetector(ANALYTICS_FEATURES)
+        self.model_lock = threading.Lock()
+        self.retrain_thread = None
+        self.last_retrain = None
+        self.samples_since_retrain = 0
+        self.events_since_retrain = 0
+        self.model_cache = model_cache  # Кэш обученных моделей на диске (None - без кэша)
+        self.init_lock = threading.Lock()
+
+        # Пул процессов для обучения и анализа (None - выполнение в потоке веб-процесса)
+        self.executor_factory = executor_factory
+        self.executor = None
+        self.retrain_future = None
 
     def initialize_training(self) -> bool:
-        """Инициализация и обучение моделей"""
+        """Инициализация моделей: из кэша с дообучением на новых данных или полное обучение"""
+        # Инициализацию могут одновременно запустить поток старта и фоновый сервис
+        if not self.init_lock.acquire(blocking=False):
+            return self.is_initialized
+
+        try:
+            if self.executor_factory is not None:
+                return self._initialize_in_pool()
+            if not self.is_initialized and self.model_cache is not None and self._load_cached_models():
+                return True
+            return self._train_full()
+        finally:
+            self.init_lock.release()
+
+    def _submit(self, job, *args):
+        """Отправка задачи в пул процессов; упавший пул пересоздается"""
+        from analytics import worker
+
+        if self.executor is None:
+            self.executor = self.executor_factory()
+        try:
+            return self.executor.submit(getattr(worker, job), *args)
+        except BrokenProcessPool:
+            print("⚠️ Пул процессов аналитики перезапускается")
+            self.executor = self.executor_factory()
+            return self.executor.submit(getattr(worker, job), *args)
+
+    def _initialize_in_pool(self) -> bool:
+        """Инициализация через пул: кэш читается сразу, обучение и дообучение - в процессе пула"""
+        if not self.is_initialized and self.model_cache is not None and self._load_cached_models(update=False):
+            # Дообучение на новых данных не задерживает показ результатов из кэша
+            self._submit('job_initialize').add_done_callback(self._apply_future)
+            return True
+
+        try:
+            snapshot = self._submit('job_initialize').result()
+        except Exception as e:
+            print(f"❌ Ошибка инициализации моделей в процессе аналитики: {e}")
+            return False
+
+        if snapshot is None:
+            print("⚠️ Недостаточно данных для обучения")
+            return False
+
+        self.apply_snapshot(snapshot)
+        print("✅ Модели обучены в процессе аналитики")
+        return True
+
+    def _apply_future(self, future):
+        """Публикация результата задачи пула по ее завершении"""
+        try:
+            snapshot = future.result()
+            if snapshot is not None:
+                self.apply_snapshot(snapshot)
+        except Exception as e:
+            print(f"❌ Ошибка задачи аналитики: {e}")
+
+    def snapshot(self, include_results: bool = True) -> Dict:
+        """Состояние моделей для передачи между процессами"""
+        with self.model_lock:
+            snapshot = {
+                'models': dict(self.models),
+                'scalers': dict(self.scalers),
+                'streaming': self.streaming.export_state(),
+                'last_retrain': self.last_retrain
+            }
+        if include_results:
+            snapshot.update(self.snapshot_results(self.analysis_results))
+        return snapshot
+
+    def snapshot_results(self, results: Dict) -> Dict:
+        return {'analysis_results': results, 'last_analysis': self.last_analysis}
+
+    def apply_snapshot(self, snapshot: Dict):
+        """Атомарная публикация результатов процесса пула: до этого API отдает предыдущие"""
+        if 'models' in snapshot:
+            with self.model_lock:
+                self.models = snapshot['models']
+                self.scalers = snapshot['scalers']
+            if not self.is_initialized:
+                # Статистики потокового детектора веб-процесса актуальнее обучающей выборки
+                self.streaming.load_state(snapshot['streaming'])
+            self.last_retrain = snapshot.get('last_retrain') or self.last_retrain
+
+        if 'analysis_results' in snapshot:
+            self.analysis_results = snapshot['analysis_results']
+            self.last_analysis = snapshot.get('last_analysis') or self.last_analysis
+
+        self.is_initialized = True
+
+    def export_view(self) -> Dict:
+        """Результаты анализа и события потокового детектора для веб-процессов"""
+        return {
+            'analysis_results': self.analysis_results,
+            'last_analysis': self.last_analysis,
+            'last_retrain': self.last_retrain,
+            'is_initialized': self.is_initialized,
+            'streaming': self.streaming.export_view()
+        }
+
+    def apply_view(self, view: Dict):
+        """Отображение результатов процесса фоновых служб (веб-процесс сам не обучает модели)"""
+        self.analysis_results = view['analysis_results']
+        self.last_analysis = view['last_analysis']
+        self.last_retrain = view['last_retrain']
+        self.is_initialized = view['is_initialized']
+        self.streaming.apply_view(view['streaming'])
+
+    def _load_cached_models(self, update: bool = True) -> bool:
+        """Загрузка моделей и последних результатов анализа из кэша"""
+        cached = self.model_cache.load(ANALYTICS_FEATURES, current_app.config['ANALYTICS_MODEL_MAX_AGE_HOURS'])
+        if cached is None:
+            return False
+
+        meta = cached['meta']
+        with self.model_lock:
+            self.models.update(cached['models'])
+            self.scalers.update(cached['scalers'])
+        if meta.get('streaming'):
+            self.streaming.load_state(meta['streaming'])
+        self.last_retrain = datetime.fromisoformat(meta['saved_at'])
+
+        results = self.model_cache.load_results()
+        if results:
+            self.analysis_results = results
+            if results.get('last_updated'):
+                self.last_analysis = datetime.strptime(results['last_updated'], '%Y-%m-%d %H:%M:%S')
+
+        self.is_initialized = True
+        print(f"✅ Модели загружены из кэша (окно обучения до {meta['window_end']:%Y-%m-%d %H:%M:%S}, "
+              f"{meta['samples']} записей)")
+
+        # Дообучение только на данных, появившихся после окна кэша
+        if update:
+            self._update_incremental(meta)
+        return True
+
+    def _update_incremental(self, meta: Dict):
+        """Дообучение IsolationForest дополнительными деревьями на новых данных (warm_start)"""
+        try:
+            df = self._get_training_data(since=meta['window_end'])
+            if len(df) < self.min_data_points:
+                return
+
+            config = current_app.config
+            with self.model_lock:
+                model = self.models.get('anomaly')
+                scaler = self.scalers.get('anomaly')
+            if model is None:
+                return
+
+            if model.n_estimators + config['ANALYTICS_INCREMENTAL_ESTIMATORS'] > config['ANALYTICS_MAX_ESTIMATORS']:
+                # Лес разросся - полное переобучение на всем окне
+                print("🔄 Лес моделей достиг предельного размера, полное переобучение...")
+                self._train_full(run_analysis=False)
+                return
+
+            X_scaled = scaler.transform(df[ANALYTICS_FEATURES].fillna(0))
+
+            # Новые деревья обучаются на копии: текущая модель продолжает работать
+            updated = copy.deepcopy(model)
+            updated.set_params(
+                warm_start=True,
+                n_estimators=model.n_estimators + config['ANALYTICS_INCREMENTAL_ESTIMATORS']
+            )
+            updated.fit(X_scaled)
+
+            with self.model_lock:
+                self.models['anomaly'] = updated
+            for feature in ANALYTICS_FEATURES:
+                if len(df[feature].dropna()) > 10:
+                    self._train_trend_model(df, feature)
+
+            _, window_end = self._data_window(df)
+            self._save_model_cache(meta['window_start'], window_end, meta['samples'] + len(df))
+            print(f"✅ Модели дообучены на {len(df)} новых записях")
+
+        except Exception as e:
+            print(f"❌ Ошибка дообучения моделей: {e}")
+
+    @staticmethod
+    def _data_window(df: pd.DataFrame) -> Tuple[datetime, datetime]:
+        """Границы времени обучающей выборки"""
+        timestamps = pd.to_datetime(df['timestamp'])
+        return timestamps.min().to_pydatetime(), timestamps.max().to_pydatetime()
+
+    def _save_model_cache(self, window_start: datetime, window_end: datetime, samples: int):
+        """Сохранение текущих моделей и статистик потокового детектора"""
+        if self.model_cache is None:
+            return
+
+        try:
+            with self.model_lock:
+                models = dict(self.models)
+                scalers = dict(self.scalers)
+            self.model_cache.save(
+                models, scalers, ANALYTICS_FEATURES, window_start, window_end, samples,
+                extra={'streaming': self.streaming.export_state()}
+            )
+        except Exception as e:
+            print(f"Ошибка сохранения кэша моделей: {e}")
+
+    def _train_full(self, run_analysis: bool = True) -> bool:
+        """Полное обучение моделей на окне истории"""
         try:
             print("🔄 Инициализация аналитических моделей...")
 
             # Получаем данные для обучения
-            data = self._get_training_data()
+            df = self._get_training_data()
 
-            if len(data) < self.min_data_points:
-                print(f"⚠️ Недостаточно данных для обучения: {len(data)} < {self.min_data_points}")
+            if len(df) < self.min_data_points:
+                print(f"⚠️ Недостаточно данных для обучения: {len(df)} < {self.min_data_points}")
                 return False
 
-            print(f"📊 Загружено {len(data)} записей для обучения")
+            print(f"📊 Загружено {len(df)} записей для обучения")
 
             # Подготавливаем данные
-            df = pd.DataFrame(data)
-            features = ['cpu_percent', 'memory_percent', 'disk_percent', 'temperature', 'humidity']
+            features = ANALYTICS_FEATURES
 
             if not all(col in df.columns for col in features):
                 print("❌ Отсутствуют необходимые столбцы данных")
                 return False
 
-            X = df[features].fillna(0)
-
             # Обучаем модель детекции аномалий
-            self.scalers['anomaly'] = StandardScaler()
-            X_scaled = self.scalers['anomaly'].fit_transform(X)
-
-            self.models['anomaly'] = IsolationForest(
-                contamination=0.1,
-                random_state=42,
-                n_estimators=100
-            )
-            self.models['anomaly'].fit(X_scaled)
+            scaler, model = self._fit_anomaly_model(df, features)
+            with self.model_lock:
+                self.scalers['anomaly'] = scaler
+                self.models['anomaly'] = model
+            self.last_retrain = datetime.now()
+
+            # Начальные статистики потокового детектора - по последним сырым замерам, с тем же разбросом,
+            # что у оцениваемых им значений (обучающая выборка может быть прорежена)
+            end = datetime.now()
+            recent = self._load_frame(end - timedelta(days=1), end, limit=current_app.config['ANOMALY_STREAM_SEED_ROWS'])
+            self.streaming.seed({
+                feature: pd.to_numeric(recent[feature], errors='coerce').to_numpy(dtype=np.float64)
+                for feature in features
+            })
 
             # Обучаем модели тренд-анализа для каждой метрики
             for feature in features:
@@ -74,8 +305,12 @@ class AnalyticsService:
             self.is_initialized = True
             print("✅ Модели успешно инициализированы")
 
+            window_start, window_end = self._data_window(df)
+            self._save_model_cache(window_start, window_end, len(df))
+
             # Запускаем первичный анализ
-            self.run_analysis()
+            if run_analysis:
+                self.run_analysis()
 
             return True
 
@@ -83,21 +318,120 @@ class AnalyticsService:
             print(f"❌ Ошибка инициализации моделей: {e}")
             return False
 
-    def _get_training_data(self) -> List[Dict]:
-        """Получение данных для обучения"""
-        try:
-            # Берем данные за последние 7 дней
-            since = datetime.now() - timedelta(days=7)
+    @staticmethod
+    def _fit_anomaly_model(df: pd.DataFrame, features: List[str]) -> Tuple[StandardScaler, IsolationForest]:
+        """Обучение нормализатора и IsolationForest по выборке"""
+        X = df[features].fillna(0)
+
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+
+        model = IsolationForest(
+            contamination=0.1,
+            random_state=42,
+            n_estimators=100
+        )
+        model.fit(X_scaled)
+        return scaler, model
+
+    def score_sample(self, metrics: Dict) -> List[Dict]:
+        """Потоковая оценка нового замера (вызывается из цикла мониторинга)"""
+        events = self.streaming.score(metrics)
+        self.samples_since_retrain += 1
+        self.events_since_retrain += len(events)
 
-            metrics = SystemMetrics.query.filter(
-                SystemMetrics.timestamp >= since
-            ).order_by(SystemMetrics.timestamp.asc()).all()
+        for event in events:
+            print(f"⚠️ {event['description']}")
 
-            return [metric.to_dict() for metric in metrics]
+        if self._retrain_due():
+            self.request_retrain(current_app._get_current_object())
+
+        return events
+
+    def _retrain_due(self) -> bool:
+        """Пора ли переобучить IsolationForest: накопились замеры или серия аномалий"""
+        if not self.is_initialized or (self.retrain_thread is not None and self.retrain_thread.is_alive()):
+            return False
+        if self.retrain_future is not None and not self.retrain_future.done():
+            return False
+
+        config = current_app.config
+        if self.last_retrain and (datetime.now() - self.last_retrain).total_seconds() < \
+                config['ANALYTICS_RETRAIN_MIN_INTERVAL']:
+            return False
+
+        return (self.samples_since_retrain >= config['ANALYTICS_RETRAIN_SAMPLES'] or
+                self.events_since_retrain >= config['ANALYTICS_RETRAIN_EVENTS'])
+
+    def request_retrain(self, app):
+        """Пакетное переобучение IsolationForest в фоновом потоке"""
+        if self.retrain_thread is not None and self.retrain_thread.is_alive():
+            return
+
+        self.samples_since_retrain = 0
+        self.events_since_retrain = 0
+
+        if self.executor_factory is not None:
+            self.last_retrain = datetime.now()
+            self.retrain_future = self._submit('job_retrain')
+            self.retrain_future.add_done_callback(self._apply_future)
+            return
+
+        self.retrain_thread = threading.Thread(target=self._retrain_worker, args=(app,), daemon=True)
+        self.retrain_thread.start()
+
+    def _retrain_worker(self, app):
+        """Обучение новой модели на свежей истории и замена текущей"""
+        with app.app_context():
+            try:
+                started = time.time()
+                df = self._get_training_data()
+                if len(df) < self.min_data_points:
+                    return
+
+                features = ANALYTICS_FEATURES
+                scaler, model = self._fit_anomaly_model(df, features)
+
+                # Модель заменяется целиком: анализ не увидит нормализатор от другой модели
+                with self.model_lock:
+                    self.scalers['anomaly'] = scaler
+                    self.models['anomaly'] = model
+                self.last_retrain = datetime.now()
+
+                window_start, window_end = self._data_window(df)
+                self._save_model_cache(window_start, window_end, len(df))
+                print(f"🔁 Модель аномалий переобучена на {len(df)} записях за {time.time() - started:.1f} с")
+
+            except Exception as e:
+                print(f"❌ Ошибка переобучения модели аномалий: {e}")
+
+    def _load_frame(self, since: datetime, end: datetime, max_points: Optional[int] = None,
+                    limit: Optional[int] = None) -> pd.DataFrame:
+        """Сырые признаки за диапазон колонками NumPy без ORM
+
+        limit - только последние строки; max_points - равномерное прореживание сырых строк (каждая k-я
+        строка без усреднения, поэтому разброс значений в выборке сохраняется).
+        """
+        data = self.store.read_range(ANALYTICS_FEATURES, since, end, limit=limit)
+        count = len(data['timestamp'])
+        if max_points and count > max_points:
+            index = np.linspace(0, count - 1, max_points).astype(np.int64)
+            data = {name: values[index] for name, values in data.items()}
+
+        # timestamp остается datetime64, признаки - float64 (пропуски - NaN)
+        return pd.DataFrame(data, columns=['timestamp'] + ANALYTICS_FEATURES)
+
+    def _get_training_data(self, since: Optional[datetime] = None) -> pd.DataFrame:
+        """Получение данных для обучения (since - только данные новее этой отметки)"""
+        try:
+            # Берем данные за последние 7 дней
+            end = datetime.now()
+            since = max(since, end - timedelta(days=7)) if since else end - timedelta(days=7)
+            return self._load_frame(since, end, current_app.config['ANALYTICS_TRAINING_MAX_POINTS'])
 
         except Exception as e:
             print(f"Ошибка получения данных: {e}")
-            return []
+            return pd.DataFrame(columns=['timestamp'] + ANALYTICS_FEATURES)
 
     def _train_trend_model(self, df: pd.DataFrame, feature: str):
         """Обучение модели тренд-анализа для метрики"""
@@ -125,18 +459,26 @@ class AnalyticsService:
             print("⚠️ Модели не инициализированы")
             return self.analysis_results
 
+        if self.executor_factory is not None:
+            # Анализ в процессе пула; до его завершения API отдает предыдущие результаты
+            try:
+                with self.model_lock:
+                    models, scalers = dict(self.models), dict(self.scalers)
+                self.apply_snapshot(self._submit('job_run_analysis', models, scalers).result())
+            except Exception as e:
+                print(f"❌ Ошибка анализа в процессе аналитики: {e}")
+            return self.analysis_results
+
         try:
             print("🔍 Запуск анализа...")
 
             # Получаем свежие данные
-            data = self._get_recent_data(hours=24)
+            df = self._get_recent_data(hours=24)
 
-            if len(data) < 10:
+            if len(df) < 10:
                 print("⚠️ Недостаточно данных для анализа")
                 return self.analysis_results
 
-            df = pd.DataFrame(data)
-
             # Выполняем различные виды анализа
             anomalies = self._detect_anomalies(df)
             trends = self._analyze_trends(df)
@@ -156,6 +498,8 @@ class AnalyticsService:
             }
 
             self.last_analysis = datetime.now()
+            if self.model_cache is not None:
+                self.model_cache.save_results(self.analysis_results)
             print("✅ Анализ завершен")
 
             return self.analysis_results
@@ -164,36 +508,35 @@ class AnalyticsService:
             print(f"❌ Ошибка анализа: {e}")
             return self.analysis_results
 
-    def _get_recent_data(self, hours: int = 24) -> List[Dict]:
+    def _get_recent_data(self, hours: int = 24) -> pd.DataFrame:
         """Получение свежих данных"""
         try:
-            since = datetime.now() - timedelta(hours=hours)
-
-            metrics = SystemMetrics.query.filter(
-                SystemMetrics.timestamp >= since
-            ).order_by(SystemMetrics.timestamp.desc()).limit(500).all()
-
-            return [metric.to_dict() for metric in reversed(metrics)]
+            end = datetime.now()
+            since = end - timedelta(hours=hours)
+            return self._load_frame(since, end, limit=500)
 
         except Exception as e:
             print(f"Ошибка получения данных: {e}")
-            return []
+            return pd.DataFrame(columns=['timestamp'] + ANALYTICS_FEATURES)
 
     def _detect_anomalies(self, df: pd.DataFrame) -> Dict:
         """Детекция аномалий"""
         try:
-            features = ['cpu_percent', 'memory_percent', 'disk_percent', 'temperature', 'humidity']
+            features = ANALYTICS_FEATURES
             X = df[features].fillna(0)
 
-            if 'anomaly' not in self.models:
+            with self.model_lock:
+                model = self.models.get('anomaly')
+                scaler = self.scalers.get('anomaly')
+            if model is None:
                 return {'anomalies': [], 'scores': {}}
 
             # Масштабируем данные
-            X_scaled = self.scalers['anomaly'].transform(X)
+            X_scaled = scaler.transform(X)
 
-            # Получаем предсказания и аномальные скоры
-            predictions = self.models['anomaly'].predict(X_scaled)
-            scores = self.models['anomaly'].decision_function(X_scaled)
+            # Один проход по деревьям: predict эквивалентен знаку decision_function
+            scores = model.decision_function(X_scaled)
+            predictions = np.where(scores < 0, -1, 1)
 
             # Находим аномалии
             anomalies = []
@@ -204,7 +547,7 @@ class AnalyticsService:
                 anomaly_feature = features[np.argmin([row[f] for f in features])]  # Простейшая логика
 
                 anomalies.append({
-                    'timestamp': row.get('timestamp', ''),
+                    'timestamp': row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
                     'metric': anomaly_feature,
                     'value': float(row[anomaly_feature]),
                     'severity': 'critical' if scores[idx] < -0.5 else 'warning',
@@ -228,7 +571,7 @@ class AnalyticsService:
     def _analyze_trends(self, df: pd.DataFrame) -> Dict:
         """Анализ трендов - улучшенная версия с более реалистичным прогнозированием"""
         try:
-            features = ['cpu_percent', 'memory_percent', 'disk_percent', 'temperature', 'humidity']
+            features = ANALYTICS_FEATURES
             trends = {}
             forecasts = {}
 
@@ -291,7 +634,7 @@ class AnalyticsService:
                     predicted_value = current_value + trend_change + random_variation + acceleration_effect
 
                     # Применяем реалистичные ограничения
-                    if feature in ['cpu_percent', 'memory_percent', 'disk_percent', 'humidity']:
+                    if metric_unit(feature) == '%':
                         predicted_value = max(0, min(predicted_value, 100))
                     elif feature == 'temperature':
                         predicted_value = max(15, min(predicted_value, 60))
@@ -299,7 +642,7 @@ class AnalyticsService:
                     # Добавляем небольшое изменение даже для стабильных трендов
                     if abs(predicted_value - current_value) < 0.5:
                         predicted_value += np.random.normal(0, 1.0)
-                        if feature in ['cpu_percent', 'memory_percent', 'disk_percent', 'humidity']:
+                        if metric_unit(feature) == '%':
                             predicted_value = max(0, min(predicted_value, 100))
                         elif feature == 'temperature':
                             predicted_value = max(15, min(predicted_value, 60))
@@ -320,7 +663,7 @@ class AnalyticsService:
     def _analyze_correlations(self, df: pd.DataFrame) -> Dict:
         """Корреляционный анализ"""
         try:
-            features = ['cpu_percent', 'memory_percent', 'disk_percent', 'temperature', 'humidity']
+            features = ANALYTICS_FEATURES
 
             # Фильтруем только доступные колонки
             available_features = [f for f in features if f in df.columns]
@@ -511,7 +854,9 @@ class AnalyticsService:
             'status': self.analysis_results.get('status', 'Анализ...'),
             'anomalies_count': len(self.analysis_results.get('anomalies', {}).get('anomalies', [])),
             'recommendations_count': len(self.analysis_results.get('recommendations', [])),
-            'last_analysis': self.last_analysis.strftime('%Y-%m-%d %H:%M:%S') if self.last_analysis else None
+            'streaming_anomalies_count': len(self.streaming.get_events()),
+            'last_analysis': self.last_analysis.strftime('%Y-%m-%d %H:%M:%S') if self.last_analysis else None,
+            'last_retrain': self.last_retrain.strftime('%Y-%m-%d %H:%M:%S') if self.last_retrain else None
         }
 
 
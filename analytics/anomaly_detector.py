@@ -6,6 +6,7 @@ from sklearn.cluster import DBSCAN
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime, timedelta
 import warnings
+from models.metric_catalog import metrics_in_group
 
 warnings.filterwarnings('ignore')
 
@@ -29,12 +30,7 @@ class AnomalyDetector:
         df = pd.DataFrame(metrics_data)
 
         # Выбираем только числовые колонки для анализа
-        numeric_columns = [
-            'cpu_percent', 'memory_percent', 'disk_percent',
-            'temperature', 'humidity', 'pressure',
-            'network_sent_mb', 'network_recv_mb',
-            'processes_count'
-        ]
+        numeric_columns = metrics_in_group('profile')
 
         # Оставляем только существующие колонки
         available_columns = [col for col in numeric_columns if col in df.columns]
@@ -115,9 +111,9 @@ class AnomalyDetector:
                 # Нормализация текущего значения
                 value_scaled = scaler.transform([[value]])
 
-                # Получение аномальности (score)
+                # Получение аномальности (score); predict эквивалентен знаку decision_function
                 anomaly_score = model.decision_function(value_scaled)[0]
-                is_anomaly = model.predict(value_scaled)[0] == -1
+                is_anomaly = anomaly_score < 0
 
                 scores[metric_name] = {
                     'score': float(anomaly_score),
@@ -199,7 +195,7 @@ class TrendPredictor:
             trends = {}
             forecasts = {}
 
-            numeric_columns = ['cpu_percent', 'memory_percent', 'disk_percent', 'temperature', 'humidity']
+            numeric_columns = metrics_in_group('analysis')
 
             for column in numeric_columns:
                 if column in df.columns:
@@ -293,10 +289,7 @@ class CorrelationAnalyzer:
             if df.empty:
                 return {'correlations': {}, 'insights': []}
 
-            numeric_columns = [
-                'cpu_percent', 'memory_percent', 'disk_percent',
-                'temperature', 'humidity', 'network_sent_mb', 'network_recv_mb'
-            ]
+            numeric_columns = metrics_in_group('correlation')
 
             # Оставляем только доступные колонки
             available_columns = [col for col in numeric_columns if col in df.columns]
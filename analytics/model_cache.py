@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+import joblib
+import sklearn
+
+# Версия формата кэша: увеличивается при изменении состава или смысла сохраняемых моделей
+MODEL_CACHE_VERSION = 1
+
+
+def feature_schema_hash(features: Iterable[str]) -> str:
+    """Отпечаток набора признаков: модели, обученные на другом наборе, непригодны"""
+    return hashlib.sha256(json.dumps(list(features)).encode('utf-8')).hexdigest()[:16]
+
+
+class ModelCache:
+    """Кэш обученных моделей аналитики на диске"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.models_path = os.path.join(directory, 'models.joblib')
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.results_path = os.path.join(directory, 'analysis.json')
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _write_atomic(path: str, write):
+        tmp_path = path + '.tmp'
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def save(self, models: Dict, scalers: Dict, features: Iterable[str], window_start: datetime,
+             window_end: datetime, samples: int, extra: Optional[Dict] = None):
+        """Сохранение моделей и метаданных (метаданные пишутся последними)"""
+        self._write_atomic(self.models_path, lambda path: joblib.dump({'models': models, 'scalers': scalers}, path))
+
+        meta = {
+            'version': MODEL_CACHE_VERSION,
+            'schema_hash': feature_schema_hash(features),
+            'sklearn_version': sklearn.__version__,
+            'window_start': window_start.isoformat(),
+            'window_end': window_end.isoformat(),
+            'samples': samples,
+            'saved_at': datetime.now().isoformat()
+        }
+        meta.update(extra or {})
+
+        def write_meta(path):
+            with open(path, 'w') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+        self._write_atomic(self.meta_path, write_meta)
+
+    def load(self, features: Iterable[str], max_age_hours: float) -> Optional[Dict]:
+        """Модели из кэша, если они совместимы и окно обучения не устарело; иначе None"""
+        try:
+            if not os.path.exists(self.meta_path) or not os.path.exists(self.models_path):
+                return None
+
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+
+            if meta.get('version') != MODEL_CACHE_VERSION:
+                print("⚠️ Кэш моделей другой версии, требуется переобучение")
+                return None
+            if meta.get('schema_hash') != feature_schema_hash(features):
+                print("⚠️ Набор признаков изменился, требуется переобучение")
+                return None
+            if meta.get('sklearn_version') != sklearn.__version__:
+                print("⚠️ Кэш моделей создан другой версией scikit-learn, требуется переобучение")
+                return None
+
+            window_end = datetime.fromisoformat(meta['window_end'])
+            if (datetime.now() - window_end).total_seconds() > max_age_hours * 3600:
+                print("⚠️ Кэш моделей устарел, требуется переобучение")
+                return None
+
+            payload = joblib.load(self.models_path)
+            meta['window_start'] = datetime.fromisoformat(meta['window_start'])
+            meta['window_end'] = window_end
+            return {'models': payload['models'], 'scalers': payload['scalers'], 'meta': meta}
+
+        except Exception as e:
+            print(f"Ошибка чтения кэша моделей: {e}")
+            return None
+
+    def save_results(self, results: Dict):
+        """Сохранение последних результатов анализа для показа сразу после запуска"""
+
+        def write_results(path):
+            with open(path, 'w') as f:
+                json.dump(results, f, ensure_ascii=False, default=str)
+
+        try:
+            self._write_atomic(self.results_path, write_results)
+        except Exception as e:
+            print(f"Ошибка сохранения результатов анализа: {e}")
+
+    def load_results(self) -> Optional[Dict]:
+        """Последние сохраненные результаты анализа"""
+        try:
+            if not os.path.exists(self.results_path):
+                return None
+            with open(self.results_path) as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ошибка чтения результатов анализа: {e}")
+            return None
@@ -0,0 +1,214 @@
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+# Коэффициент перевода MAD в оценку стандартного отклонения для нормального распределения
+MAD_SCALE = 1.4826
+# Нижняя граница разброса: у постоянной или квантованной метрики (disk_percent=43.2) нулевая дисперсия
+# не должна превращать изменение в последнем знаке в критическое отклонение
+RELATIVE_SPREAD_FLOOR = 1e-3  # Доля от уровня метрики
+ABSOLUTE_SPREAD_FLOOR = 1e-3  # Для метрик около нуля
+
+
+def _spread_floor(center: float) -> float:
+    return max(abs(center) * RELATIVE_SPREAD_FLOOR, ABSOLUTE_SPREAD_FLOOR)
+
+
+class MetricStats:
+    """Скользящие статистики одной метрики: EWMA среднего и дисперсии, медиана и MAD"""
+
+    __slots__ = ('alpha', 'quantile_rate', 'count', 'mean', 'variance', 'median', 'mad', 'anomalous')
+
+    def __init__(self, alpha: float = 0.02, quantile_rate: float = 0.02):
+        self.alpha = alpha
+        self.quantile_rate = quantile_rate  # Шаг стохастической оценки медианы и MAD
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        self.median = 0.0
+        self.mad = 0.0
+        self.anomalous = False  # Метрика сейчас в аномальном состоянии
+
+    def seed(self, values: np.ndarray):
+        """Начальные статистики по истории (точные значения вместо прогрева)"""
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count = len(values)
+        self.mean = float(values.mean())
+        self.variance = float(values.var())
+        self.median = float(np.median(values))
+        self.mad = float(np.median(np.abs(values - self.median)))
+
+    def score(self, value: float) -> float:
+        """Отклонение значения в единицах разброса: меньшая из EWMA- и робастной z-оценок"""
+        deviation = abs(value - self.mean)
+        ewma_z = deviation / max(math.sqrt(self.variance), _spread_floor(self.mean))
+
+        spread = max(self.mad * MAD_SCALE, _spread_floor(self.median))
+        robust_z = abs(value - self.median) / spread
+
+        # Обе оценки должны согласиться: EWMA реагирует на сдвиг, MAD устойчива к выбросам
+        return min(ewma_z, robust_z)
+
+    def update(self, value: float):
+        """Учет нового значения за O(1)"""
+        self.count += 1
+        if self.count == 1:
+            self.mean = self.median = value
+            return
+
+        delta = value - self.mean
+        self.mean += self.alpha * delta
+        self.variance = (1 - self.alpha) * (self.variance + self.alpha * delta * delta)
+
+        # Стохастическое приближение квантилей: шаг пропорционален текущему разбросу
+        step = self.quantile_rate * max(self.mad, abs(self.median) * 1e-3, 1e-6)
+        if value > self.median:
+            self.median += step
+        elif value < self.median:
+            self.median -= step
+
+        if abs(value - self.median) > self.mad:
+            self.mad += step
+        else:
+            self.mad = max(self.mad - step, 0.0)
+
+
+class StreamingAnomalyDetector:
+    """Потоковый детектор аномалий: оценка каждого нового замера в цикле мониторинга"""
+
+    def __init__(self, metrics: Iterable[str], alpha: float = 0.02, warning_z: float = 4.0,
+                 critical_z: float = 6.0, warmup: int = 30, max_events: int = 200):
+        self.metrics = list(metrics)
+        self.alpha = alpha
+        self.warning_z = warning_z
+        self.critical_z = critical_z
+        self.warmup = warmup  # Замеров до начала оценки
+        self.stats = {metric: MetricStats(alpha) for metric in self.metrics}
+        self.events = deque(maxlen=max_events)
+        self.lock = threading.Lock()
+        self.samples = 0
+        self.events_total = 0
+        self.last_score_us = 0.0
+        self.view = None  # События и счетчики процесса фоновых служб (в веб-процессах)
+
+    def seed(self, data: Dict[str, np.ndarray]):
+        """Инициализация статистик по историческим колонкам"""
+        with self.lock:
+            for metric in self.metrics:
+                if metric in data:
+                    stats = MetricStats(self.alpha)
+                    stats.seed(np.asarray(data[metric], dtype=np.float64))
+                    self.stats[metric] = stats
+
+    def export_state(self) -> Dict:
+        """Статистики метрик для сохранения между перезапусками"""
+        with self.lock:
+            return {
+                metric: {
+                    'count': stats.count,
+                    'mean': stats.mean,
+                    'variance': stats.variance,
+                    'median': stats.median,
+                    'mad': stats.mad
+                }
+                for metric, stats in self.stats.items()
+            }
+
+    def load_state(self, state: Dict):
+        """Восстановление статистик, сохраненных export_state"""
+        with self.lock:
+            for metric, values in state.items():
+                if metric not in self.stats:
+                    continue
+                stats = MetricStats(self.alpha)
+                stats.count = int(values['count'])
+                stats.mean = float(values['mean'])
+                stats.variance = float(values['variance'])
+                stats.median = float(values['median'])
+                stats.mad = float(values['mad'])
+                self.stats[metric] = stats
+
+    def score(self, metrics: Dict) -> List[Dict]:
+        """Оценка замера и обновление статистик; возвращает новые события аномалий"""
+        started = time.perf_counter()
+        new_events = []
+
+        with self.lock:
+            self.samples += 1
+            for metric in self.metrics:
+                value = metrics.get(metric)
+                if not isinstance(value, (int, float)) or value != value:
+                    continue
+
+                stats = self.stats[metric]
+                z_score = stats.score(value) if stats.count >= self.warmup else 0.0
+                is_anomaly = z_score >= self.warning_z
+
+                # Событие только при входе в аномальное состояние, а не на каждом замере
+                if is_anomaly and not stats.anomalous:
+                    severity = 'critical' if z_score >= self.critical_z else 'warning'
+                    event = {
+                        'timestamp': metrics.get('timestamp') or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'metric': metric,
+                        'value': float(value),
+                        'score': float(min(z_score, 1e6)),
+                        'baseline_mean': stats.mean,
+                        'baseline_median': stats.median,
+                        'severity': severity,
+                        'source': 'stream',
+                        'description': f'Аномалия в метрике {metric}: {value:.1f} '
+                                       f'(обычно {stats.median:.1f}, отклонение {min(z_score, 999):.1f}σ)'
+                    }
+                    self.events.appendleft(event)
+                    new_events.append(event)
+                    self.events_total += 1
+
+                stats.anomalous = is_anomaly
+                # Аномальные значения учитываются в статистиках, чтобы детектор адаптировался к новому уровню
+                stats.update(float(value))
+
+            self.last_score_us = (time.perf_counter() - started) * 1e6
+
+        return new_events
+
+    def get_events(self, limit: Optional[int] = None) -> List[Dict]:
+        """Последние события, новые первыми"""
+        with self.lock:
+            events = list(self.view['events'] if self.view is not None else self.events)
+        return events[:limit] if limit else events
+
+    def get_stats(self) -> Dict:
+        """Состояние детектора"""
+        with self.lock:
+            if self.view is not None:
+                return self.view['stats']
+            return {
+                'samples': self.samples,
+                'events_total': self.events_total,
+                'last_score_us': round(self.last_score_us, 1),
+                'metrics': {
+                    metric: {
+                        'mean': round(stats.mean, 3),
+                        'std': round(math.sqrt(stats.variance), 3),
+                        'median': round(stats.median, 3),
+                        'mad': round(stats.mad, 3),
+                        'anomalous': stats.anomalous
+                    }
+                    for metric, stats in self.stats.items()
+                }
+            }
+
+    def export_view(self) -> Dict:
+        """События и счетчики для процессов, которые сами не оценивают замеры"""
+        return {'events': self.get_events(), 'stats': self.get_stats()}
+
+    def apply_view(self, view: Dict):
+        """Отображение событий и счетчиков процесса фоновых служб вместо собственных"""
+        with self.lock:
+            self.view = view
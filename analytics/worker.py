@@ -0,0 +1,70 @@
+"""
+Процессы пула аналитики: обучение моделей и анализ выполняются вне веб-процесса,
+данные читаются напрямую из хранилища, результат возвращается целиком
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from flask import Flask
+from analytics.analytics_service import AnalyticsService
+from analytics.model_cache import ModelCache
+from models.monitoring import db, configure_sqlite
+from storage.metrics_store import create_metrics_store
+
+# Состояние процесса пула (заполняется init_worker)
+_app = None
+_service = None
+
+
+def init_worker(config: Dict, instance_path: str):
+    """Инициализация процесса пула: минимальное приложение Flask без фоновых служб"""
+    global _app, _service
+
+    _app = Flask('analytics_worker', instance_path=instance_path)
+    _app.config.update(config)
+    db.init_app(_app)
+
+    with _app.app_context():
+        configure_sqlite(db.engine)
+
+    _service = AnalyticsService(
+        store=create_metrics_store(_app.config, read_only=True),
+        model_cache=ModelCache(_app.config['ANALYTICS_MODEL_DIR'])
+    )
+
+
+def job_initialize() -> Optional[Dict]:
+    """Загрузка моделей из кэша (с дообучением) или полное обучение"""
+    with _app.app_context():
+        _service.is_initialized = False
+        if not _service.initialize_training():
+            return None
+        return _service.snapshot()
+
+
+def job_retrain() -> Optional[Dict]:
+    """Полное переобучение моделей на свежем окне истории"""
+    with _app.app_context():
+        if not _service._train_full(run_analysis=False):
+            return None
+        return _service.snapshot(include_results=False)
+
+
+def job_run_analysis(models: Dict, scalers: Dict) -> Dict:
+    """Анализ свежих данных моделями веб-процесса: аномалии, тренды, корреляции, рекомендации"""
+    with _app.app_context():
+        _service.models, _service.scalers = models, scalers
+        _service.is_initialized = True
+        return _service.snapshot_results(_service.run_analysis())
+
+
+def create_analytics_executor(app, processes: int) -> ProcessPoolExecutor:
+    """Пул процессов аналитики (spawn: без копирования потоков и соединений веб-процесса)"""
+    config = {key: value for key, value in app.config.items() if isinstance(value, (str, int, float, bool, type(None)))}
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(config, app.instance_path)
+    )
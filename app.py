@@ -1,17 +1,38 @@
 from flask_mail import Mail
 from config import Config
 from collectors.system_metrics import EnhancedSystemMetricsCollector
-from models.monitoring import db, SystemMetrics, AlertLog
+from collectors.device_poller import DevicePoller, load_inventory
+from models.metric_catalog import alert_type_for
+from models.monitoring import db, AlertLog, configure_sqlite, upgrade_schema
 from models.settings import AlertSettings, NotificationSettings, init_default_settings
 from services.notification_service import NotificationService, AlertManager
+from services.notification_queue import NotificationQueue
+from services.mail_transport import PooledMailTransport, DigestBatcher
+import os
+import re
 import threading
 import time
 import json
-from analytics.analytics_service import AnalyticsService, start_analytics_background_service
+from analytics.analytics_service import ANALYTICS_FEATURES, AnalyticsService, start_analytics_background_service
+from analytics.model_cache import ModelCache
+from analytics.streaming_detector import StreamingAnomalyDetector
+from analytics.worker import create_analytics_executor
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from models.users import User, AuditLog, SystemSettings, init_default_admin
 from services.admin_service import AdminService
-from flask import Flask, render_template, jsonify, request, redirect, flash
+from services.dashboard_stream import DashboardBroadcaster
+from services.alert_state import ThresholdSnapshot, OpenIncidentIndex
+from services.escalation_scheduler import EscalationScheduler
+from services.ingest_service import IngestBuffer
+from services.leader import LeaderLock
+from services.query_service import QueryService, parse_duration, parse_time
+from services.retention_service import RetentionService
+from services.rollup_service import RollupService
+from services.shared_state import SharedState
+from storage.metrics_store import create_metrics_store
+from storage.label_index import Matcher
+from storage.series_store import SOURCE_LABELS, SeriesStore, parse_labels, source_name
+from flask import Flask, Response, render_template, jsonify, request, redirect, flash
 from datetime import datetime, timezone, timedelta
 
 app = Flask(__name__)
@@ -25,7 +46,38 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Пожалуйста, войдите в систему'
 
-admin_service = AdminService()
+# Импорт выполняют все веб-процессы и процессы аналитики: хранилище открывается для чтения,
+# процесс-лидер заменяет его записывающим в start_background_services()
+metrics_store = create_metrics_store(app.config, read_only=True)
+series_store = SeriesStore(app.config['RETENTION_DELETE_BATCH'])
+rollup_service = RollupService()
+retention_service = RetentionService(
+    metrics_store,
+    rollup_service=rollup_service,
+    batch_size=app.config['RETENTION_DELETE_BATCH'],
+    vacuum_pages=app.config['RETENTION_VACUUM_PAGES'],
+    series_store=series_store
+)
+alert_thresholds = ThresholdSnapshot()
+admin_service = AdminService(metrics_store, retention_service, alert_thresholds)
+query_service = QueryService(
+    metrics_store,
+    rollup_service=rollup_service,
+    max_points=app.config['QUERY_MAX_POINTS'],
+    default_points=app.config['QUERY_DEFAULT_POINTS']
+)
+
+
+dashboard_stream = DashboardBroadcaster(
+    buffer_size=app.config['STREAM_BUFFER_SIZE'], heartbeat=app.config['STREAM_HEARTBEAT']
+)
+
+# Фоновые службы работают в одном процессе-лидере, веб-процессы читают их результаты из общего состояния
+shared_state = SharedState(app.config['SHARED_STATE_DIR'])
+leader_lock = LeaderLock(os.path.join(app.config['SHARED_STATE_DIR'], 'scheduler.lock'))
+background_role = None  # leader - фоновые службы в этом процессе, web - только запросы
+follower_pid = None
+follower_lock = threading.Lock()
 
 
 @login_manager.user_loader
@@ -34,13 +86,105 @@ def load_user(user_id):
 
 
 # Глобальные сервисы
-metrics_collector = EnhancedSystemMetricsCollector()
-notification_service = NotificationService(app, mail)
-alert_manager = AlertManager(notification_service)
-analytics_service = AnalyticsService()
+ingest_buffer = IngestBuffer(
+    app,
+    batch_size=app.config['INGEST_BATCH_SIZE'],
+    flush_interval=app.config['INGEST_FLUSH_INTERVAL'],
+    max_queue=app.config['INGEST_MAX_QUEUE'],
+    rollup_service=rollup_service,
+    store=metrics_store
+)
+series_ingest = IngestBuffer(
+    app,
+    batch_size=app.config['INGEST_BATCH_SIZE'],
+    flush_interval=app.config['INGEST_FLUSH_INTERVAL'],
+    max_queue=app.config['INGEST_MAX_QUEUE'],
+    store=series_store
+)
+metrics_collector = EnhancedSystemMetricsCollector(
+    ingest_buffer=ingest_buffer, rollup_service=rollup_service, store=metrics_store, thresholds=alert_thresholds,
+    series_ingest=series_ingest if app.config['SERIES_LOCAL_METRICS'] else None,
+    host_labels=dict(parse_labels(app.config['HOST_LABELS']), host=app.config['HOST_NAME'])
+)
+notification_queue = NotificationQueue(
+    app,
+    workers=app.config['NOTIFY_WORKERS'],
+    max_queue=app.config['NOTIFY_MAX_QUEUE'],
+    max_attempts=app.config['NOTIFY_MAX_ATTEMPTS'],
+    backoff_base=app.config['NOTIFY_BACKOFF_BASE'],
+    backoff_max=app.config['NOTIFY_BACKOFF_MAX']
+)
+mail_transport = PooledMailTransport(
+    mail, size=app.config['MAIL_POOL_SIZE'], idle_timeout=app.config['MAIL_POOL_IDLE_TIMEOUT']
+)
+mail_digest = DigestBatcher(
+    lambda payload: notification_queue.enqueue('email', payload),
+    window_seconds=app.config['MAIL_DIGEST_WINDOW'],
+    max_items=app.config['MAIL_DIGEST_MAX_ITEMS']
+)
+notification_service = NotificationService(
+    app, mail, queue=notification_queue, transport=mail_transport, digest=mail_digest
+)
+notification_queue.register_channel(
+    'email', notification_service.deliver_email, concurrency=app.config['NOTIFY_EMAIL_CONCURRENCY']
+)
+escalation_scheduler = EscalationScheduler(app, notification_service, alert_thresholds)
+alert_manager = AlertManager(
+    notification_service,
+    OpenIncidentIndex(app.config['ALERT_COOLDOWN_MINUTES']),
+    email_warnings=app.config['MAIL_DIGEST_WARNINGS'],
+    escalations=escalation_scheduler
+)
+analytics_service = AnalyticsService(
+    store=metrics_store,
+    model_cache=ModelCache(app.config['ANALYTICS_MODEL_DIR']),
+    executor_factory=(
+        (lambda: create_analytics_executor(app, app.config['ANALYTICS_WORKER_PROCESSES']))
+        if app.config['ANALYTICS_WORKER_PROCESSES'] > 0 else None
+    ),
+    streaming=StreamingAnomalyDetector(
+        ANALYTICS_FEATURES,
+        warning_z=app.config['ANOMALY_STREAM_WARNING_Z'],
+        critical_z=app.config['ANOMALY_STREAM_CRITICAL_Z']
+    )
+)
 current_metrics = {}
 
 
+def handle_device_samples(rows: list):
+    """Показания опрошенного устройства: пакетная запись серий и проверка порогов по типу метрики из каталога"""
+    series_ingest.submit_many(rows)
+
+    with app.app_context():
+        for row in rows:
+            alert_type = alert_type_for(row['metric'])
+            severity, threshold = alert_thresholds.classify(alert_type, row['value'])
+            source = source_name(row['labels'])
+            if severity and not alert_manager.incidents.has_recent(alert_type, severity, host=source):
+                alert_manager.process_alert(
+                    alert_type=alert_type,
+                    severity=severity,
+                    value=row['value'],
+                    threshold=threshold,
+                    message=f"Устройство {source}: {row['metric']} = {row['value']:g} (порог {threshold:g})",
+                    host=source
+                )
+
+
+device_poller = DevicePoller(
+    load_inventory(
+        app.config['DEVICE_INVENTORY'],
+        default_interval=app.config['DEVICE_POLL_INTERVAL'],
+        default_timeout=app.config['DEVICE_POLL_TIMEOUT']
+    ) if app.config['DEVICE_INVENTORY'] else [],
+    sink=handle_device_samples,
+    concurrency=app.config['DEVICE_POLL_CONCURRENCY'],
+    jitter=app.config['DEVICE_POLL_JITTER'],
+    http_connections=app.config['DEVICE_HTTP_CONNECTIONS'],
+    inventory_ttl=app.config['DEVICE_INVENTORY_TTL']
+)
+
+
 def background_monitoring():
     """Фоновый процесс сбора метрик"""
     global current_metrics
@@ -56,8 +200,14 @@ def background_monitoring():
         except Exception as e:
             print(f"❌ Ошибка первичного сбора: {e}")
 
+        interval = app.config['MONITORING_INTERVAL']
+        next_tick = time.monotonic()
+
         while True:
             try:
+                # Изменения настроек и инцидентов, сделанные в веб-процессах
+                apply_shared_signals()
+
                 # Сбор метрик
                 print("🔄 Начинаем сбор данных...")
                 current_metrics = metrics_collector.get_current_metrics()
@@ -70,17 +220,34 @@ def background_monitoring():
                 # Проверка оповещений с использованием AlertManager
                 metrics_collector.check_alerts(current_metrics, alert_manager)
 
+                # Потоковая оценка аномалий
+                analytics_service.score_sample(current_metrics)
+
                 # Счетчик циклов
                 if hasattr(background_monitoring, 'counter'):
                     background_monitoring.counter += 1
                 else:
                     background_monitoring.counter = 1
 
-                print(f"📊 Цикл {background_monitoring.counter} завершен")
-
-                # Пауза
-                print(f"😴 Спим {app.config['MONITORING_INTERVAL']} секунд...")
-                time.sleep(app.config['MONITORING_INTERVAL'])
+                # Одна публикация изменений за цикл для всех открытых панелей
+                status, alerts = build_status(current_metrics), recent_alerts()
+                dashboard_stream.publish(
+                    current_metrics, status, metrics_collector.get_history(), alerts,
+                    seq=background_monitoring.counter
+                )
+                publish_shared_state(status, alerts)
+
+                print(f"📊 Цикл {background_monitoring.counter} завершен "
+                      f"(сбор {metrics_collector.last_collection_ms} мс)")
+
+                # Пауза до следующего тика по фиксированной сетке, чтобы цикл не накапливал сдвиг
+                next_tick += interval
+                delay = next_tick - time.monotonic()
+                if delay < 0:
+                    # Цикл не уложился в интервал - начинаем сетку заново, не догоняя пропуски
+                    next_tick = time.monotonic()
+                    delay = 0
+                time.sleep(delay)
 
             except Exception as e:
                 print(f"❌ Ошибка в фоновом мониторинге: {e}")
@@ -89,16 +256,102 @@ def background_monitoring():
                 time.sleep(5)
 
 
-def escalation_check():
-    """Фоновый процесс проверки эскалации"""
+def publish_shared_state(status: dict, alerts: list):
+    """Результаты цикла для веб-процессов, которые не запускают фоновые службы"""
+    try:
+        history, history_seq, history_epoch = metrics_collector.export_history()
+        shared_state.publish('dashboard', {
+            'cycle': background_monitoring.counter,
+            'metrics': current_metrics,
+            'status': status,
+            'alerts': alerts,
+            'history': history,
+            'history_seq': history_seq,
+            'history_epoch': history_epoch
+        })
+        shared_state.publish('analytics', analytics_service.export_view())
+        shared_state.publish('services', service_stats())
+    except Exception as e:
+        print(f"Ошибка публикации общего состояния: {e}")
+
+
+def apply_shared_signals():
+    """Процесс-лидер: пороги, сроки эскалации, разрешенные инциденты и запрошенная очистка из веб-процессов"""
+    if shared_state.changed('settings'):
+        alert_thresholds.invalidate()
+        escalation_scheduler.reload()
+    if shared_state.changed('incidents'):
+        alert_manager.incidents.reset()
+    if shared_state.changed('cleanup'):
+        # Файлы хранилища удаляет только владелец: у веб-процессов оно открыто только для чтения
+        request_data = shared_state.read('cleanup') or {}
+        retention_days = request_data.get('retention_days', app.config['DATA_RETENTION_DAYS'])
+        result = admin_service.cleanup_old_data(retention_days)
+        if result['success']:
+            print(f"🧹 Очистка данных старше {retention_days} дней: {result['cleaned']}")
+        else:
+            print(f"Ошибка очистки данных: {result['error']}")
+
+
+def follow_shared_state():
+    """Веб-процесс: применение результатов процесса-лидера по мере их публикации"""
+    global current_metrics
+
+    interval = app.config['SHARED_STATE_POLL_INTERVAL']
+    last_version = None
+
     with app.app_context():
         while True:
             try:
-                notification_service.check_escalation()
-                time.sleep(app.config.get('ESCALATION_CHECK_INTERVAL', 300))
+                if shared_state.changed('settings'):
+                    alert_thresholds.invalidate()
+
+                # Файл перечитывается только после новой публикации
+                version = shared_state.version('dashboard')
+                if version is not None and version != last_version:
+                    last_version = version
+                    # Серии, созданные лидером за цикл, догружаются в справочник и индекс меток
+                    series_store.refresh()
+                    state = shared_state.read('dashboard')
+                    if state:
+                        current_metrics = state['metrics']
+                        metrics_collector.load_history(state['history'], state['history_seq'], state['history_epoch'])
+                        dashboard_stream.publish(
+                            state['metrics'], state['status'], state['history'], state['alerts'], seq=state['cycle']
+                        )
+
+                    analytics = shared_state.read('analytics')
+                    if analytics:
+                        analytics_service.apply_view(analytics)
+
             except Exception as e:
-                print(f"Ошибка проверки эскалации: {e}")
-                time.sleep(60)
+                print(f"Ошибка чтения общего состояния: {e}")
+
+            time.sleep(interval)
+
+
+def service_stats() -> dict:
+    """Счетчики фоновых служб этого процесса"""
+    return {
+        'notifications': notification_queue.get_stats(),
+        'transport': mail_transport.get_stats(),
+        'digest': mail_digest.get_stats(),
+        'escalations': escalation_scheduler.get_stats(),
+        'ingest': ingest_buffer.get_stats(),
+        'series': dict(series_store.get_stats(), ingest=series_ingest.get_stats()),
+        'devices': device_poller.get_stats(),
+        'device_inventory': device_poller.get_devices()
+    }
+
+
+def background_stats() -> dict:
+    """Счетчики фоновых служб: свои у лидера, опубликованные лидером - у веб-процесса"""
+    if leader_lock.is_leader:
+        return service_stats()
+    return shared_state.read('services') or {
+        'notifications': {}, 'transport': {}, 'digest': {}, 'escalations': {}, 'ingest': {},
+        'series': {}, 'devices': {}, 'device_inventory': []
+    }
 
 
 def cleanup_old_data():
@@ -108,14 +361,12 @@ def cleanup_old_data():
             try:
                 cutoff_date = datetime.now() - timedelta(days=app.config['DATA_RETENTION_DAYS'])
 
-                old_metrics = SystemMetrics.query.filter(SystemMetrics.timestamp < cutoff_date)
-                old_alerts = AlertLog.query.filter(AlertLog.timestamp < cutoff_date)
+                dropped = retention_service.drop_metrics(cutoff_date)
+                alerts_count = retention_service.delete_alerts(cutoff_date)
+                freed_pages = retention_service.incremental_vacuum()
 
-                old_metrics.delete()
-                old_alerts.delete()
-
-                db.session.commit()
-                print(f"Очищены данные старше {cutoff_date}")
+                print(f"Очищены данные старше {cutoff_date}: метрик {dropped['metrics']}, "
+                      f"агрегатов {dropped['rollups']}, значений серий {dropped['samples']}, оповещений {alerts_count}, освобождено страниц {freed_pages}")
 
             except Exception as e:
                 print(f"Ошибка очистки данных: {e}")
@@ -124,44 +375,65 @@ def cleanup_old_data():
             time.sleep(86400)  # Раз в день
 
 
-# Создание таблиц и инициализация настроек
-with app.app_context():
-    db.create_all()
-    init_default_settings()
-    init_default_admin()
-    # Создаем дополнительных пользователей
-    operator = User.query.filter_by(username='operator').first()
-    if not operator:
-        operator = User(
-            username='operator',
-            email='operator@datacenter.local',
-            role='operator'
-        )
-        operator.set_password('operator123')
-        db.session.add(operator)
-
-    viewer = User.query.filter_by(username='viewer').first()
-    if not viewer:
-        viewer = User(
-            username='viewer',
-            email='viewer@datacenter.local',
-            role='viewer'
-        )
-        viewer.set_password('viewer123')
-        db.session.add(viewer)
+def init_database():
+    """Создание таблиц и инициализация настроек (повторный вызов из другого процесса безопасен)"""
+    with app.app_context():
+        configure_sqlite(db.engine)
+        db.create_all()
+        upgrade_schema(db.engine)
+        # Индекс меток серий строится при запуске, дальше пополняется при создании серий
+        series_store.refresh()
+        init_default_settings()
+        alert_thresholds.invalidate()
+        init_default_admin()
+        # Создаем дополнительных пользователей
+        operator = User.query.filter_by(username='operator').first()
+        if not operator:
+            operator = User(
+                username='operator',
+                email='operator@datacenter.local',
+                role='operator'
+            )
+            operator.set_password('operator123')
+            db.session.add(operator)
+
+        viewer = User.query.filter_by(username='viewer').first()
+        if not viewer:
+            viewer = User(
+                username='viewer',
+                email='viewer@datacenter.local',
+                role='viewer'
+            )
+            viewer.set_password('viewer123')
+            db.session.add(viewer)
 
-    try:
-        db.session.commit()
-    except:
-        db.session.rollback()
+        try:
+            db.session.commit()
+        except:
+            db.session.rollback()
+
+
+def open_writable_metrics_store():
+    """Записывающее хранилище метрик для процесса-лидера вместо открытого при импорте"""
+    global metrics_store
+    metrics_store = create_metrics_store(app.config)
+    for service in (ingest_buffer, metrics_collector, query_service, analytics_service):
+        service.store = metrics_store
+    retention_service.metrics_store = metrics_store
+    admin_service.metrics_store = metrics_store
 
 
+def start_background_services():
+    """Запуск фоновых служб; только в процессе, захватившем блокировку лидера"""
+    global background_role
+    background_role = 'leader'
+    open_writable_metrics_store()
+
     def init_analytics():
         """Инициализация аналитики в фоновом режиме"""
 
         def init_task():
             with app.app_context():
-                time.sleep(10)  # Ждем накопления данных
                 success = analytics_service.initialize_training()
                 if success:
                     print("Аналитика инициализирована успешно")
@@ -170,40 +442,118 @@ with app.app_context():
 
         threading.Thread(target=init_task, daemon=True).start()
 
-
     init_analytics()
 
-# Запуск фоновых процессов
-print("🚀 Запуск фоновых служб...")
+    def init_rollups():
+        """Построение агрегатов по данным, накопленным до их появления"""
+        # Граница фиксируется до запуска буфера записи: строки после нее агрегирует сам буфер
+        with app.app_context():
+            if metrics_store.name != 'sqlite' or not rollup_service.is_empty():
+                return
+            max_id = rollup_service.last_raw_id()
+        if not max_id:
+            return
+
+        def backfill_task():
+            with app.app_context():
+                print("🔄 Построение агрегатов по сохраненным метрикам...")
+                processed = rollup_service.backfill(max_id=max_id)
+                print(f"✅ Агрегаты построены по {processed} записям")
+
+        threading.Thread(target=backfill_task, daemon=True).start()
+
+    init_rollups()
 
-try:
-    monitoring_thread = threading.Thread(target=background_monitoring, daemon=True)
-    monitoring_thread.start()
-    print("✅ Фоновый мониторинг запущен")
-except Exception as e:
-    print(f"❌ Ошибка запуска мониторинга: {e}")
+    # Запуск фоновых процессов
+    print("🚀 Запуск фоновых служб...")
 
-try:
-    escalation_thread = threading.Thread(target=escalation_check, daemon=True)
-    escalation_thread.start()
-    print("✅ Проверка эскалации запущена")
-except Exception as e:
-    print(f"❌ Ошибка запуска эскалации: {e}")
+    try:
+        ingest_buffer.start()
+        series_ingest.start()
+        print("✅ Пакетная запись метрик запущена")
+    except Exception as e:
+        print(f"❌ Ошибка запуска пакетной записи: {e}")
+
+    if device_poller.devices:
+        try:
+            device_poller.start()
+            print(f"✅ Опрос устройств запущен ({len(device_poller.devices)} в инвентаре)")
+        except Exception as e:
+            print(f"❌ Ошибка запуска опроса устройств: {e}")
 
-try:
-    cleanup_thread = threading.Thread(target=cleanup_old_data, daemon=True)
-    cleanup_thread.start()
-    print("✅ Очистка данных запущена")
-except Exception as e:
-    print(f"❌ Ошибка запуска очистки: {e}")
+    try:
+        notification_queue.start()
+        mail_digest.start()
+        print("✅ Очередь уведомлений запущена")
+    except Exception as e:
+        print(f"❌ Ошибка запуска очереди уведомлений: {e}")
 
-try:
-    start_analytics_background_service(analytics_service, app)
-    print("✅ Аналитический сервис запущен")
-except Exception as e:
-    print(f"❌ Ошибка запуска аналитики: {e}")
+    try:
+        monitoring_thread = threading.Thread(target=background_monitoring, daemon=True)
+        monitoring_thread.start()
+        print("✅ Фоновый мониторинг запущен")
+    except Exception as e:
+        print(f"❌ Ошибка запуска мониторинга: {e}")
 
-print("🎯 Все фоновые службы инициализированы")
+    try:
+        escalation_scheduler.start()
+        print("✅ Планировщик эскалации запущен")
+    except Exception as e:
+        print(f"❌ Ошибка запуска эскалации: {e}")
+
+    try:
+        cleanup_thread = threading.Thread(target=cleanup_old_data, daemon=True)
+        cleanup_thread.start()
+        print("✅ Очистка данных запущена")
+    except Exception as e:
+        print(f"❌ Ошибка запуска очистки: {e}")
+
+    try:
+        start_analytics_background_service(analytics_service, app)
+        print("✅ Аналитический сервис запущен")
+    except Exception as e:
+        print(f"❌ Ошибка запуска аналитики: {e}")
+
+    print("🎯 Все фоновые службы инициализированы")
+
+
+def start_web_follower():
+    """Веб-процесс: поток, применяющий опубликованные лидером результаты"""
+    global background_role, follower_pid
+    with follower_lock:
+        background_role = 'web'
+        if follower_pid == os.getpid():
+            return
+        follower_pid = os.getpid()
+    threading.Thread(target=follow_shared_state, daemon=True).start()
+
+
+@app.before_request
+def ensure_shared_state_follower():
+    # Рабочие процессы, созданные fork после create_app (gunicorn --preload), запускают свой поток
+    if background_role == 'web' and follower_pid != os.getpid():
+        start_web_follower()
+
+
+def create_app(background: str = None) -> Flask:
+    """Приложение для веб-сервера: python app.py или gunicorn 'app:create_app()' (gunicorn.conf.py)
+
+    background (по умолчанию BACKGROUND_SERVICES): auto - фоновые службы запускает процесс,
+    захвативший блокировку лидера, остальные только обслуживают запросы; off - процесс только
+    обслуживает запросы, а службы работают в scheduler.py. Импорт модуля ничего не запускает.
+    """
+    if background_role is not None:
+        return app
+
+    init_database()
+    background = background or app.config['BACKGROUND_SERVICES']
+    if background == 'auto' and leader_lock.acquire():
+        print("👑 Процесс выбран лидером фоновых служб")
+        start_background_services()
+    else:
+        print(f"🌐 Веб-процесс без фоновых служб (лидер: {leader_lock.holder() or 'еще не запущен'})")
+        start_web_follower()
+    return app
 
 
 # Основные маршруты
@@ -232,7 +582,87 @@ def api_metrics():
 @app.route('/api/history')
 @login_required
 def api_history():
-    return jsonify(metrics_collector.get_history())
+    """История для графиков; с since=<курсор> - только точки после курсора и курсор следующего запроса
+
+    hours=<часы> - история из базы за период, прореженная LTTB до points точек (не больше MAX_DATA_POINTS)
+    """
+    hours = request.args.get('hours', type=float)
+    if hours:
+        points = request.args.get('points', app.config['MAX_DATA_POINTS'], type=int)
+        return jsonify(metrics_collector.get_historical_data(hours, min(max(points, 3), app.config['MAX_DATA_POINTS'])))
+
+    since = request.args.get('since')
+    if since is None:
+        return jsonify(metrics_collector.get_history())
+    return jsonify(metrics_collector.get_history_since(since))
+
+
+@app.route('/api/query')
+@login_required
+def api_query():
+    """Ряды метрик за диапазон с агрегацией по шагу
+
+    Параметры: metric (можно повторять) или metrics=cpu_percent,memory_percent,
+    start/end (ISO 8601, секунды от эпохи или -24h), step (300, 5m, 1h),
+    agg (avg, min, max, last, p50, p95, p99),
+    downsample (lttb, minmax) и width - ширина графика в пикселях (не больше MAX_DATA_POINTS точек)
+    """
+    try:
+        metrics = request.args.getlist('metric')
+        for value in request.args.getlist('metrics'):
+            metrics.extend(name.strip() for name in value.split(',') if name.strip())
+
+        end = parse_time(request.args.get('end'), datetime.now())
+        start = parse_time(request.args.get('start'), end - timedelta(hours=1))
+        step = request.args.get('step')
+
+        downsample = request.args.get('downsample')
+        if downsample:
+            limit = app.config['MAX_DATA_POINTS']
+            width = request.args.get('width', limit, type=int)
+            result = query_service.query_downsampled(
+                metrics, start, end,
+                points=min(max(width, 3), limit),
+                method=downsample.lower(),
+                raw_interval=app.config['MONITORING_INTERVAL']
+            )
+            return jsonify(result)
+
+        result = query_service.query(
+            metrics, start, end,
+            step=parse_duration(step) if step else None,
+            agg=request.args.get('agg', 'avg'),
+            raw_interval=app.config['MONITORING_INTERVAL']
+        )
+        return jsonify(result)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Ошибка запроса рядов: {e}")
+        return jsonify({'error': 'Ошибка выполнения запроса'}), 500
+
+
+def build_status(metrics: dict) -> dict:
+    """Цвета статусов метрик по снимку порогов"""
+    return {
+        'cpu_status': metrics_collector.get_status_color('cpu', metrics.get('cpu_percent', 0)),
+        'memory_status': metrics_collector.get_status_color('memory', metrics.get('memory_percent', 0)),
+        'disk_status': metrics_collector.get_status_color('disk', metrics.get('disk_percent', 0)),
+        'temperature_status': metrics_collector.get_status_color('temperature', metrics.get('temperature', 0)),
+        'humidity_status': metrics_collector.get_status_color('humidity', metrics.get('humidity', 0)),
+        'overall_status': 'operational'
+    }
+
+
+def recent_alerts(limit: int = 10) -> list:
+    """Недавние оповещения, новые первыми"""
+    try:
+        alerts = AlertLog.query.order_by(AlertLog.timestamp.desc()).limit(limit).all()
+        return [alert.to_dict() for alert in alerts]
+    except Exception as e:
+        print(f"Ошибка получения оповещений: {e}")
+        return []
 
 
 @app.route('/api/status')
@@ -241,16 +671,8 @@ def api_status():
     if not current_metrics:
         return jsonify({'status': 'initializing'})
 
-    status = {
-        'cpu_status': metrics_collector.get_status_color('cpu', current_metrics.get('cpu_percent', 0)),
-        'memory_status': metrics_collector.get_status_color('memory', current_metrics.get('memory_percent', 0)),
-        'disk_status': metrics_collector.get_status_color('disk', current_metrics.get('disk_percent', 0)),
-        'temperature_status': metrics_collector.get_status_color('temperature', current_metrics.get('temperature', 0)),
-        'humidity_status': metrics_collector.get_status_color('humidity', current_metrics.get('humidity', 0)),
-        'overall_status': 'operational',
-        'timestamp': datetime.now().strftime('%H:%M:%S')
-    }
-
+    status = build_status(current_metrics)
+    status['timestamp'] = datetime.now().strftime('%H:%M:%S')
     return jsonify(status)
 
 
@@ -258,11 +680,43 @@ def api_status():
 @login_required
 def api_alerts():
     """API для получения недавних оповещений"""
-    try:
-        recent_alerts = AlertLog.query.order_by(AlertLog.timestamp.desc()).limit(10).all()
-        return jsonify([alert.to_dict() for alert in recent_alerts])
-    except Exception as e:
-        return jsonify([])
+    return jsonify(recent_alerts())
+
+
+@app.route('/api/stream')
+@login_required
+def api_stream():
+    """Server-Sent Events: снимок состояния панели, затем изменения каждого цикла мониторинга"""
+    return Response(
+        dashboard_stream.stream(request.headers.get('Last-Event-ID')),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/dashboard/snapshot')
+@login_required
+def api_dashboard_snapshot():
+    """Метрики, статусы, история и оповещения одним ответом; при неизменном снимке - 304 без сериализации
+
+    history=0 исключает историю (клиент догружает графики через /api/history?since=)
+    """
+    etag, body = dashboard_stream.snapshot_body(request.args.get('history', '1') != '0')
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Браузер хранит ответ, но каждый раз сверяет ETag с сервером
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/stream/stats')
+@login_required
+def api_stream_stats():
+    """API для счетчиков потока обновлений панели"""
+    return jsonify(dashboard_stream.get_stats())
 
 
 @app.route('/api/alerts/active')
@@ -278,6 +732,29 @@ def api_alert_stats():
     return jsonify(notification_service.get_notification_stats())
 
 
+@app.route('/api/notifications/stats')
+@login_required
+def api_notification_queue_stats():
+    """API для состояния очереди уведомлений: глубина, задержка доставки, повторы"""
+    services = background_stats()
+    stats = dict(services['notifications'])
+    stats['transport'] = services['transport']
+    stats['digest'] = services['digest']
+    stats['escalations'] = services['escalations']
+    return jsonify(stats)
+
+
+@app.route('/api/notifications/dead-letters')
+@login_required
+def api_notification_dead_letters():
+    """API для уведомлений, не доставленных после всех попыток"""
+    if not current_user.has_permission('admin'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(notification_queue.get_dead_letters(limit))
+
+
 @app.route('/api/alerts/resolve/<int:alert_id>', methods=['POST'])
 @login_required
 def api_resolve_alert(alert_id):
@@ -287,6 +764,8 @@ def api_resolve_alert(alert_id):
     success = alert_manager.resolve_alert(alert_id)
 
     if success:
+        # Индекс открытых инцидентов процесса-лидера перечитывается из базы
+        shared_state.bump('incidents')
         admin_service.log_action('alert_resolved', 'alerts', f'Разрешен инцидент #{alert_id}', current_user.id)
 
     return jsonify({'success': success})
@@ -319,6 +798,9 @@ def api_save_alert_settings():
                 setting.updated_at = datetime.now(timezone.utc)
 
         db.session.commit()
+        alert_thresholds.invalidate()
+        # Остальные процессы сбрасывают пороги, лидер пересчитывает сроки эскалации по новым escalation_minutes
+        shared_state.bump('settings')
         admin_service.log_action('update_settings', 'alert_settings', 'Обновлены настройки оповещений', current_user.id)
         return jsonify({'success': True})
 
@@ -475,15 +957,18 @@ def api_analytics_anomalies():
     results = analytics_service.analysis_results
     anomalies_data = results.get('anomalies', {'anomalies': [], 'scores': {}})
 
+    # Сначала события потокового детектора, затем результаты периодического анализа
+    anomalies = analytics_service.streaming.get_events() + (anomalies_data['anomalies'] or [])
+
     # Ограничиваем количество аномалий
     if limit and limit > 0:
-        limited_anomalies = anomalies_data['anomalies'][:limit] if anomalies_data['anomalies'] else []
-        return jsonify({
-            'anomalies': limited_anomalies,
-            'scores': anomalies_data.get('scores', {})
-        })
+        anomalies = anomalies[:limit]
 
-    return jsonify(anomalies_data)
+    return jsonify({
+        'anomalies': anomalies,
+        'scores': anomalies_data.get('scores', {}),
+        'streaming': analytics_service.streaming.get_stats()
+    })
 
 
 @app.route('/api/analytics/trends')
@@ -502,8 +987,8 @@ def api_analytics_correlations():
         results = analytics_service.analysis_results
         correlations_data = results.get('correlations', {'correlations': {}, 'insights': []})
 
-        # Если нет корреляций, попробуем запустить анализ
-        if not correlations_data.get('correlations'):
+        # Если нет корреляций, попробуем запустить анализ (веб-процесс ждет результатов лидера)
+        if not correlations_data.get('correlations') and leader_lock.is_leader:
             print("🔄 Запуск корреляционного анализа...")
             analytics_service.run_analysis()
             results = analytics_service.analysis_results
@@ -678,6 +1163,8 @@ def api_import_config():
 
     data = request.get_json()
     result = admin_service.import_configuration(data, current_user.id)
+    if result.get('success'):
+        shared_state.bump('settings')
     return jsonify(result)
 
 
@@ -688,14 +1175,18 @@ def api_cleanup_data():
         return jsonify({'success': False, 'error': 'Недостаточно прав'})
 
     data = request.get_json()
-    retention_days = data.get('retention_days', 30)
-    result = admin_service.cleanup_old_data(retention_days)
-
-    if result['success']:
-        admin_service.log_action('cleanup_data', 'system', f'Очистка данных старше {retention_days} дней',
-                                 current_user.id)
+    try:
+        retention_days = int(data.get('retention_days', 30))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Некорректный срок хранения'})
+    if retention_days < 1:
+        return jsonify({'success': False, 'error': 'Срок хранения должен быть не меньше 1 дня'})
 
-    return jsonify(result)
+    # Очистку выполняет процесс-лидер в следующем цикле мониторинга (apply_shared_signals)
+    shared_state.bump('cleanup', {'retention_days': retention_days})
+    admin_service.log_action('cleanup_data', 'system', f'Очистка данных старше {retention_days} дней',
+                             current_user.id)
+    return jsonify({'success': True, 'queued': True, 'retention_days': retention_days})
 
 
 @app.route('/api/system/health')
@@ -717,15 +1208,14 @@ def api_background_status():
 
     try:
         # Проверяем последние данные
-        last_metric = SystemMetrics.query.order_by(SystemMetrics.timestamp.desc()).first()
+        last_time = metrics_store.last_timestamp()
 
         print(f"🔍 Отладка API background status:")
-        print(f"   Последняя запись: {last_metric.timestamp if last_metric else 'Нет данных'}")
+        print(f"   Последняя запись: {last_time if last_time else 'Нет данных'}")
         print(f"   Текущее время: {datetime.utcnow()}")
 
-        if last_metric:
+        if last_time:
             current_time = datetime.utcnow()
-            last_time = last_metric.timestamp
 
             time_diff = current_time - last_time
             seconds_ago = int(time_diff.total_seconds())
@@ -737,7 +1227,7 @@ def api_background_status():
                 'last_data_time': last_time.strftime('%Y-%m-%d %H:%M:%S'),
                 'seconds_since_last': seconds_ago,
                 'current_metrics_available': bool(current_metrics),
-                'total_metrics_count': SystemMetrics.query.count(),
+                'total_metrics_count': metrics_store.count(),
                 'debug_current_time': current_time.strftime('%Y-%m-%d %H:%M:%S')
             }
         else:
@@ -749,6 +1239,7 @@ def api_background_status():
                 'total_metrics_count': 0
             }
 
+        status['scheduler'] = leader_lock.get_stats()
         print(f"   Возвращаем статус: {status}")
         return jsonify(status)
 
@@ -759,6 +1250,110 @@ def api_background_status():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/system/ingest-stats')
+@login_required
+def api_ingest_stats():
+    """API для счетчиков пакетной записи метрик"""
+    if not current_user.has_permission('admin'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+
+    return jsonify(background_stats()['ingest'])
+
+
+@app.route('/api/devices')
+@login_required
+def api_devices():
+    """API инвентаря опрашиваемых устройств: состояние опроса и последние показания"""
+    try:
+        stats = background_stats()
+        names = {device['name'] for device in stats['device_inventory']}
+
+        # Серии самих устройств: host из инвентаря, без меток интерфейса и датчика BMC
+        device_series = series_store.select(('select', [
+            Matcher('host', '=~', '|'.join(re.escape(name) for name in names)),
+            *(Matcher(label, '=', '') for label in SOURCE_LABELS)
+        ])) if names else []
+        latest = series_store.latest([info.id for info in device_series], since=datetime.now() - timedelta(hours=1))
+        values = {}
+        for info in device_series:
+            if info.id in latest:
+                values.setdefault(info.labels['host'], {})[info.metric] = latest[info.id]
+
+        devices = [dict(device, values=values.get(device['name'], {})) for device in stats['device_inventory']]
+        return jsonify({'poller': stats['devices'], 'devices': devices})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/devices/<name>/history')
+@login_required
+def api_device_history(name):
+    """API истории одной метрики устройства: metric, start/end в формате /api/query (по умолчанию за час);
+    остальные параметры - метки серии (interface=Gi1/0/1, sensor=InletTemp)
+    """
+    metric = request.args.get('metric')
+    if not metric:
+        return jsonify({'error': 'Не указан параметр metric'}), 400
+
+    try:
+        end = parse_time(request.args.get('end'), datetime.now())
+        start = parse_time(request.args.get('start'), end - timedelta(hours=1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    labels = {key: value for key, value in request.args.items() if key not in ('metric', 'start', 'end')}
+    labels['host'] = name
+    # Без interface/sensor - серия самого устройства, у нее меньше всего меток
+    series = min(series_store.find(metric, labels), key=lambda info: len(info.labels), default=None)
+
+    return jsonify({
+        'device': name,
+        'metric': metric,
+        'labels': series.labels if series else labels,
+        'unit': series.unit if series else None,
+        'points': series_store.read_range(series.id, start, end) if series else []
+    })
+
+
+@app.route('/api/series')
+@login_required
+def api_series():
+    """API выборки серий по селектору меток
+
+    Параметры: match - селектор (temperature{rack="A3"}, cpu_percent{role=~"db|cache"} or {room="2"}),
+    limit - не больше серий в ответе (до SERIES_MAX_RESULTS), latest=1 - последние значения,
+    start/end - значения за диапазон
+    """
+    selector = request.args.get('match')
+    if not selector:
+        return jsonify({'error': 'Не указан параметр match'}), 400
+
+    try:
+        limit = min(request.args.get('limit', 100, type=int), app.config['SERIES_MAX_RESULTS'])
+        started = time.perf_counter()
+        series = series_store.select(selector)
+        select_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        result = [info.to_dict() for info in series[:limit]]
+        if request.args.get('latest'):
+            latest = series_store.latest([item['id'] for item in result])
+            for item in result:
+                item['latest'] = latest.get(item['id'])
+        if request.args.get('start') or request.args.get('end'):
+            end = parse_time(request.args.get('end'), datetime.now())
+            start = parse_time(request.args.get('start'), end - timedelta(hours=1))
+            for item in result:
+                item['points'] = series_store.read_range(item['id'], start, end)
+
+        return jsonify({'match': selector, 'total': len(series), 'select_ms': select_ms, 'series': result})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Ошибка выборки серий: {e}")
+        return jsonify({'error': 'Ошибка выполнения запроса'}), 500
+
+
 @app.route('/api/system/statistics')
 @login_required
 def api_system_statistics():
@@ -832,4 +1427,5 @@ def logout():
     return redirect('/login')
 
 if __name__ == '__main__':
+    create_app()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Замер сжатия рядов в формате Gorilla
+Запускать: python benchmarks/bench_compression.py [--points 100000] [--data-dir data/tsdb]
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import gorilla
+
+
+def synthetic_series(points: int) -> dict:
+    """Типичные ряды system_metrics с интервалом сбора 5 секунд"""
+    rng = np.random.default_rng(42)
+    start_ms = 1_700_000_000_000
+    jitter = rng.integers(-3, 4, points)
+    timestamps = start_ms + np.arange(points, dtype=np.int64) * 5000 + jitter
+
+    return {
+        'timestamp': timestamps,
+        'cpu_percent': np.round(np.clip(35 + np.cumsum(rng.normal(0, 1.5, points)) % 60, 0, 100), 1),
+        'memory_percent': np.round(60 + 5 * np.sin(np.arange(points) / 500), 1),
+        'disk_total_gb': np.full(points, 476.94),
+        'memory_total_gb': np.full(points, 31.27),
+        'pressure': np.round(1013 + np.cumsum(rng.normal(0, 0.02, points)), 1),
+        'uptime_seconds': np.arange(points, dtype=np.float64) * 5 + 86400,
+        'temperature': np.round(22 + rng.normal(0, 0.3, points), 2),
+    }
+
+
+def measure(name: str, values: np.ndarray, repeats: int = 5) -> dict:
+    """Размер, степень сжатия и скорость кодирования/декодирования одного ряда"""
+    is_time = name == 'timestamp'
+    encode = gorilla.encode_timestamps if is_time else gorilla.encode_floats
+    decode = gorilla.decode_timestamps if is_time else gorilla.decode_floats
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        encoded = encode(values)
+    encode_seconds = (time.perf_counter() - started) / repeats
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        decoded, _ = decode(encoded)
+    decode_seconds = (time.perf_counter() - started) / repeats
+
+    expected = np.asarray(values, dtype=np.int64 if is_time else np.float64)
+    if not np.array_equal(decoded.view(np.uint64), expected.view(np.uint64)):
+        raise AssertionError(f'Ряд {name} восстановлен с ошибкой')
+
+    return {
+        'name': name,
+        'raw': expected.nbytes,
+        'compressed': len(encoded),
+        'encode_mps': len(values) / max(encode_seconds, 1e-9) / 1e6,
+        'decode_mps': len(values) / max(decode_seconds, 1e-9) / 1e6,
+    }
+
+
+def store_series(data_dir: str) -> dict:
+    """Колонки существующего колоночного хранилища"""
+    from storage.columnar_store import ColumnarMetricsStore
+    from datetime import datetime
+
+    store = ColumnarMetricsStore(data_dir)
+    data = store.read_range(store.columns, datetime(1970, 1, 2), datetime.max)
+    series = {'timestamp': data.pop('timestamp').view(np.int64)}
+    series.update(data)
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер сжатия рядов Gorilla')
+    parser.add_argument('--points', type=int, default=100000, help='Точек в синтетическом ряде')
+    parser.add_argument('--data-dir', help='Взять ряды из колоночного хранилища')
+    args = parser.parse_args()
+
+    series = store_series(args.data_dir) if args.data_dir else synthetic_series(args.points)
+    points = len(series['timestamp'])
+    if not points:
+        print("⚠️ Нет данных для замера")
+        return
+
+    print(f"📊 Рядов: {len(series)}, точек: {points}")
+    print(f"{'ряд':<20}{'исходно, КБ':>14}{'сжато, КБ':>12}{'бит/точку':>11}{'сжатие':>9}"
+          f"{'код., Мт/с':>12}{'декод., Мт/с':>14}")
+
+    total_raw = total_compressed = 0
+    for name, values in series.items():
+        result = measure(name, values)
+        total_raw += result['raw']
+        total_compressed += result['compressed']
+        print(f"{name:<20}{result['raw'] / 1024:>14.1f}{result['compressed'] / 1024:>12.1f}"
+              f"{result['compressed'] * 8 / points:>11.2f}{result['raw'] / result['compressed']:>8.1f}x"
+              f"{result['encode_mps']:>12.1f}{result['decode_mps']:>14.1f}")
+
+    print(f"✅ Итого: {total_raw / 1024:.1f} КБ -> {total_compressed / 1024:.1f} КБ "
+          f"({total_raw / total_compressed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Замер выборки серий по селекторам меток через инвертированный индекс
+Запускать: python benchmarks/bench_label_index.py [--series 100000] [--repeats 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.label_index import METRIC_LABEL, LabelIndex, parse_selector
+
+METRICS = ('temperature', 'humidity', 'cpu_percent', 'memory_percent', 'power_watts', 'fan_rpm', 'if_in_bps',
+           'if_out_bps', 'if_in_errors', 'disk_percent')
+ROLES = ('db', 'web', 'cache', 'storage', 'compute')
+
+SELECTORS = (
+    'temperature{rack="A3"}',
+    'cpu_percent{role="db"}',
+    'cpu_percent{role=~"db|cache",room="2"}',
+    '{rack=~"A[0-4]",room="1"}',
+    'temperature{room="3"} or humidity{room="3"}',
+    'if_in_bps{host=~"srv-1.*",interface!="Gi0"}',
+    '{__name__=~"if_.*",role!~"web|compute"}',
+    'power_watts{rack="B7"} and {role="storage"}',
+    'memory_percent{room="4",role!="db"}',
+)
+
+
+def synthetic_series(count: int):
+    """Серии парка: host в стойке и зале, роль сервера; у части метрик - метка interface"""
+    rng = random.Random(42)
+    series = []
+    hosts = max(1, count // len(METRICS))
+    for host_number in range(hosts):
+        rack = f"{'ABCDEFGH'[host_number % 8]}{host_number // 8 % 40}"
+        labels = {'host': f"srv-{host_number}", 'rack': rack, 'room': str(host_number % 5 + 1),
+                  'role': rng.choice(ROLES)}
+        for metric in METRICS:
+            if len(series) >= count:
+                break
+            extra = {'interface': f"Gi{host_number % 4}"} if metric.startswith('if_') else {}
+            series.append((len(series) + 1, metric, dict(labels, **extra)))
+    return series
+
+
+def scan(series, tree):
+    """Проверка результата полным перебором серий"""
+
+    def matches(metric, labels, matcher):
+        value = metric if matcher.name == METRIC_LABEL else labels.get(matcher.name, '')
+        if matcher.op == '=':
+            return value == matcher.value
+        if matcher.op == '!=':
+            return value != matcher.value
+        found = matcher.regex.fullmatch(value) is not None
+        return found if matcher.op == '=~' else not found
+
+    def evaluate(node):
+        kind, items = node
+        if kind == 'select':
+            return {series_id for series_id, metric, labels in series
+                    if all(matches(metric, labels, matcher) for matcher in items)}
+        sets = [evaluate(item) for item in items]
+        return set.union(*sets) if kind == 'or' else set.intersection(*sets)
+
+    return sorted(evaluate(tree))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--series', type=int, default=100000)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    series = synthetic_series(args.series)
+    index = LabelIndex()
+    started = time.perf_counter()
+    for series_id, metric, labels in series:
+        index.add(series_id, metric, labels)
+    build_s = time.perf_counter() - started
+    stats = index.get_stats()
+    print(f"Серий: {stats['series']}, меток: {stats['labels']}, пар: {stats['pairs']}; "
+          f"построение индекса {build_s:.2f} с")
+
+    print(f"{'селектор':<52} {'серий':>7} {'первый, мс':>11} {'медиана, мс':>12} {'перебор, мс':>12}")
+    for selector in SELECTORS:
+        tree = parse_selector(selector)
+
+        # Первый запрос строит массивы списков, повторные берут их из кэша
+        started = time.perf_counter()
+        result = index.select(tree)
+        first_ms = (time.perf_counter() - started) * 1000
+
+        timings = []
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            index.select(selector)  # Вместе с разбором строки селектора
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        started = time.perf_counter()
+        expected = scan(series, tree)
+        scan_ms = (time.perf_counter() - started) * 1000
+        if result.tolist() != expected:
+            raise SystemExit(f"Результат {selector} не совпадает с перебором: {len(result)} != {len(expected)}")
+
+        print(f"{selector:<52} {len(result):>7} {first_ms:>11.3f} {timings[len(timings) // 2]:>12.3f} "
+              f"{scan_ms:>12.1f}")
+
+    # Новая серия сбрасывает только массивы своих пар
+    series_id = len(series) + 1
+    started = time.perf_counter()
+    index.add(series_id, 'temperature', {'host': 'srv-new', 'rack': 'A3', 'room': '1', 'role': 'db'})
+    add_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    result = index.select('temperature{rack="A3"}')
+    print(f"Добавление серии {add_ms:.3f} мс, первый запрос после него {(time.perf_counter() - started) * 1000:.3f} мс, "
+          f"новая серия найдена: {series_id in result.tolist()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Замер отправки почты при шторме оповещений на локальный SMTP-приемник
+Запускать: python benchmarks/bench_mail_storm.py [--alerts 1000] [--connect-latency 0.02] [--critical-share 0.1]
+"""
+
+import argparse
+import os
+import random
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_mail import Mail, Message
+from services.mail_transport import PooledMailTransport, DigestBatcher
+
+RECIPIENT_LISTS = (['ops@datacenter.local'], ['admin@datacenter.local', 'duty@datacenter.local'])
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-приемник: принимает письма и отбрасывает их"""
+
+    def handle(self):
+        sink = self.server
+        # Задержка приветствия имитирует сетевое рукопожатие и TLS
+        time.sleep(sink.connect_latency)
+        self.wfile.write(b'220 sink ESMTP\r\n')
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line == b'.\r\n':
+                    in_data = False
+                    time.sleep(sink.message_latency)
+                    with sink.lock:
+                        sink.messages += 1
+                    self.wfile.write(b'250 queued\r\n')
+                continue
+
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.wfile.write(b'250 sink\r\n')
+            elif command == b'DATA':
+                in_data = True
+                self.wfile.write(b'354 end with .\r\n')
+            elif command == b'QUIT':
+                self.wfile.write(b'221 bye\r\n')
+                return
+            else:
+                self.wfile.write(b'250 ok\r\n')
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_latency: float, message_latency: float):
+        super().__init__(('127.0.0.1', 0), SinkHandler)
+        self.connect_latency = connect_latency
+        self.message_latency = message_latency
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.connections = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def reset(self):
+        with self.lock:
+            self.messages = 0
+            self.connections = 0
+
+
+def storm(alerts: int, critical_share: float) -> list:
+    """Оповещения шторма: разные метрики и хосты, часть критичных"""
+    rng = random.Random(42)
+    metrics = ('cpu', 'memory', 'disk', 'temperature', 'humidity')
+    payloads = []
+    for index in range(alerts):
+        severity = 'critical' if rng.random() < critical_share else 'warning'
+        metric = rng.choice(metrics)
+        payloads.append({
+            'alert_id': index,
+            'severity': severity,
+            'subject': f"[{severity.upper()}] Инцидент в ЦОД: {metric} (rack-{index % 40:02d})",
+            'sender': 'monitor@datacenter.local',
+            'recipients': RECIPIENT_LISTS[index % len(RECIPIENT_LISTS)],
+            'body': f"Тип: {metric}\nУровень: {severity}\nЗначение: {rng.uniform(80, 100):.1f}\n"
+        })
+    return payloads
+
+
+def to_message(payload: dict) -> Message:
+    return Message(subject=payload['subject'], sender=payload['sender'],
+                   recipients=payload['recipients'], body=payload['body'])
+
+
+def run(name: str, sink: SmtpSink, send_all) -> dict:
+    sink.reset()
+    started = time.perf_counter()
+    send_all()
+    elapsed = time.perf_counter() - started
+    return {'name': name, 'seconds': elapsed, 'messages': sink.messages, 'connections': sink.connections}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер отправки почты при шторме оповещений')
+    parser.add_argument('--alerts', type=int, default=1000, help='Оповещений в шторме')
+    parser.add_argument('--connect-latency', type=float, default=0.02, help='Секунд на установку SMTP-сессии')
+    parser.add_argument('--message-latency', type=float, default=0.002, help='Секунд на прием письма')
+    parser.add_argument('--critical-share', type=float, default=0.1, help='Доля критичных оповещений')
+    args = parser.parse_args()
+
+    sink = SmtpSink(args.connect_latency, args.message_latency)
+    app = Flask('bench_mail_storm')
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=sink.server_address[1], MAIL_USE_TLS=False,
+                      MAIL_USE_SSL=False, MAIL_SUPPRESS_SEND=False)
+    mail = Mail(app)
+    payloads = storm(args.alerts, args.critical_share)
+
+    def per_message():
+        for payload in payloads:
+            mail.send(to_message(payload))
+
+    def pooled():
+        transport = PooledMailTransport(mail, size=1)
+        for payload in payloads:
+            transport.send(to_message(payload))
+        transport.close()
+
+    def pooled_digest():
+        transport = PooledMailTransport(mail, size=1)
+        # Окно больше длительности шторма: некритичные оповещения уходят одним письмом на список получателей
+        digest = DigestBatcher(lambda payload: transport.send(to_message(payload)), window_seconds=3600,
+                               max_items=args.alerts)
+        for payload in payloads:
+            if payload['severity'] == 'critical':
+                transport.send(to_message(payload))
+            else:
+                digest.add(payload)
+        digest.flush(force=True)
+        transport.close()
+
+    with app.app_context():
+        results = [
+            run('Соединение на письмо (flask_mail)', sink, per_message),
+            run('Пул постоянных сессий', sink, pooled),
+            run('Пул + дайджест некритичных', sink, pooled_digest),
+        ]
+
+    baseline = results[0]['seconds']
+    print(f"Шторм: {args.alerts} оповещений, критичных {args.critical_share:.0%}, "
+          f"установка сессии {args.connect_latency * 1000:.0f} мс, прием письма {args.message_latency * 1000:.0f} мс")
+    print(f"{'Режим':<36}{'Время, с':>10}{'Писем':>8}{'Сессий':>8}{'Оповещ./с':>12}{'Ускорение':>11}")
+    for result in results:
+        print(f"{result['name']:<36}{result['seconds']:>10.2f}{result['messages']:>8}{result['connections']:>8}"
+              f"{args.alerts / result['seconds']:>12.0f}{baseline / result['seconds']:>10.1f}x")
+
+    sink.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Замер чтения таблицы интерфейсов: GET по каждому OID против обхода GETBULK, и расчет скоростей по дельтам
+Запускать: python benchmarks/bench_snmp_walk.py [--interfaces 4000] [--repetitions 10,25,50,100]
+Против snmpsim: python benchmarks/bench_snmp_walk.py --write-snmprec data/switch.snmprec
+                snmpsim-command-responder --data-dir=data --agent-udpv4-endpoint=127.0.0.1:1161
+                python benchmarks/bench_snmp_walk.py --agent 127.0.0.1:1161 --community switch
+"""
+
+import argparse
+import asyncio
+import bisect
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from collectors import snmp
+from collectors.interface_metrics import (
+    INTERFACE_COLUMNS, SYS_UPTIME, CounterDeltaEngine, InterfaceSnapshot, SnmpInterfaceCollector
+)
+
+MAX_MESSAGE = 65000  # байт ответа, как у агентов с большим буфером; остальные строки - в следующем запросе
+HIGH_SPEED_MBPS = 10000
+COUNTER_64 = 1 << 64
+COUNTER_32 = 1 << 32
+
+
+class InterfaceTable:
+    """Счетчики N интерфейсов, растущие с заданной скоростью; часть 64-битных счетчиков у максимума"""
+
+    def __init__(self, interfaces: int, started: float):
+        self.interfaces = interfaces
+        self.started = started
+        self.rows = list(range(1, interfaces + 1))
+        # Битовая скорость интерфейса i: от 1 до ~9 Гбит/с; счетчик октетов каждого 10-го переходит
+        # через 2^64 в первые 30 секунд работы агента (проверка wrap)
+        self.bps = {index: 1e9 + (index * 7919 % 8000) * 1e6 for index in self.rows}
+        self.base = {
+            index: COUNTER_64 - int(self.bps[index] / 8 * (index % 30 + 1)) if index % 10 == 0 else index * 10 ** 9
+            for index in self.rows
+        }
+
+        columns = {name: tuple(int(arc) for arc in oid.split('.')) for name, oid in INTERFACE_COLUMNS.items()}
+        self.column_by_oid = {oid: name for name, oid in columns.items()}
+        self.oids = sorted(columns[name] + (index,) for name in columns for index in self.rows)
+        self.oids.append(tuple(int(arc) for arc in SYS_UPTIME.split('.')))
+        self.oids.sort()
+
+    def value(self, oid: tuple):
+        if oid == tuple(int(arc) for arc in SYS_UPTIME.split('.')):
+            return snmp.TIMETICKS, int((time.monotonic() - self.started) * 100)
+
+        name = self.column_by_oid.get(oid[:-1])
+        index = oid[-1]
+        if name is None or not 1 <= index <= self.interfaces:
+            return snmp.NO_SUCH_INSTANCE, None
+
+        elapsed = time.monotonic() - self.started
+        octets = self.base[index] + int(self.bps[index] / 8 * elapsed)
+        packets = index * 1000 + int(self.bps[index] / 8 / 700 * elapsed)  # средний пакет 700 байт
+        if name == 'name':
+            return snmp.OCTET_STRING, f"Eth{index // 48 + 1}/{index % 48 + 1}"
+        if name == 'oper_status':
+            return snmp.INTEGER, 1
+        if name == 'high_speed':
+            return snmp.GAUGE32, HIGH_SPEED_MBPS
+        if name == 'discontinuity':
+            return snmp.TIMETICKS, 0
+        if name.endswith('octets'):
+            return snmp.COUNTER64, octets % COUNTER_64
+        if name.endswith(('ucast', 'mcast', 'bcast')):
+            return snmp.COUNTER64, (packets if name.endswith('ucast') else packets // 100) % COUNTER_64
+        # Ошибки и отбрасывания - 32-битные, у части интерфейсов рядом с переполнением
+        if index % 7 == 0:
+            return snmp.COUNTER32, (COUNTER_32 - 10 * (index % 30 + 1) + int(elapsed * 10)) % COUNTER_32
+        return snmp.COUNTER32, int(elapsed)
+
+    def next_after(self, oid: tuple):
+        position = bisect.bisect_right(self.oids, oid)
+        return self.oids[position] if position < len(self.oids) else None
+
+
+class TableAgent(asyncio.DatagramProtocol):
+    """Агент SNMPv2c для таблицы интерфейсов: GET, GETNEXT, GETBULK с ограничением размера ответа"""
+
+    def __init__(self, table: InterfaceTable):
+        self.table = table
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        message = snmp.decode_message(data)
+        requested = [tuple(int(arc) for arc in oid.split('.')) for oid, _, _ in message['varbinds']]
+        pdu_type = message['pdu_type']
+
+        if pdu_type == snmp.GET_REQUEST:
+            varbinds = [(oid, self.table.value(oid)) for oid in requested]
+        elif pdu_type == snmp.GET_NEXT_REQUEST:
+            varbinds = [self._next(oid) for oid in requested]
+        else:
+            non_repeaters, repetitions = message['error_status'], message['error_index']
+            varbinds = [self._next(oid) for oid in requested[:non_repeaters]]
+            cursors = requested[non_repeaters:]
+            for _ in range(repetitions):
+                row = [self._next(oid) for oid in cursors]
+                varbinds.extend(row)
+                cursors = [oid for oid, _ in row]
+                if all(value[0] == snmp.END_OF_MIB_VIEW for _, value in row):
+                    break
+
+        encoded, size = [], 0
+        for oid, value in varbinds:
+            item = snmp.encode_tlv(snmp.SEQUENCE, snmp.encode_oid('.'.join(map(str, oid))) + snmp.encode_value(value))
+            size += len(item)
+            if size > MAX_MESSAGE and encoded:
+                break  # GETBULK: агент отдает столько строк, сколько помещается в сообщение
+            encoded.append(item)
+
+        body = (snmp.encode_integer(message['request_id']) + snmp.encode_integer(0) + snmp.encode_integer(0)
+                + snmp.encode_tlv(snmp.SEQUENCE, b''.join(encoded)))
+        response = snmp.encode_tlv(snmp.SEQUENCE, (
+            snmp.encode_integer(snmp.SNMP_VERSION_2C) + snmp.encode_tlv(snmp.OCTET_STRING, message['community'].encode())
+            + snmp.encode_tlv(snmp.GET_RESPONSE, body)
+        ))
+        self.transport.sendto(response, addr)
+
+    def _next(self, oid: tuple):
+        following = self.table.next_after(oid)
+        if following is None:
+            return oid, (snmp.END_OF_MIB_VIEW, None)
+        return following, self.table.value(following)
+
+
+def run_agent(interfaces: int, port: int, ready):
+    """Агент в отдельном процессе: кодирование ответов не делит GIL с измеряемым клиентом"""
+    loop = asyncio.new_event_loop()
+    table = InterfaceTable(interfaces, time.monotonic())
+    loop.run_until_complete(loop.create_datagram_endpoint(lambda: TableAgent(table), local_addr=('127.0.0.1', port)))
+    ready.set()
+    loop.run_forever()
+
+
+def write_snmprec(path: str, interfaces: int):
+    """Файл данных snmpsim (OID|тип|значение) с той же таблицей интерфейсов"""
+    table = InterfaceTable(interfaces, time.monotonic())
+    types = {snmp.INTEGER: 2, snmp.OCTET_STRING: 4, snmp.COUNTER32: 65, snmp.GAUGE32: 66,
+             snmp.TIMETICKS: 67, snmp.COUNTER64: 70}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        for oid in table.oids:
+            tag, value = table.value(oid)
+            f.write(f"{'.'.join(map(str, oid))}|{types[tag]}|{value}\n")
+    print(f"Записано {len(table.oids)} объектов в {path}")
+
+
+async def bench_get_per_oid(client, host, port, community, interfaces, concurrency=16):
+    """Базовый вариант: отдельный GET на каждый OID каждой строки таблицы"""
+    oids = [f"{oid}.{index}" for oid in INTERFACE_COLUMNS.values() for index in range(1, interfaces + 1)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get(oid):
+        async with semaphore:
+            return await client.get(host, port, community, [oid], timeout=2.0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(get(oid) for oid in oids))
+    return time.perf_counter() - started, len(oids)
+
+
+async def run(args, host, port):
+    client = snmp.SnmpClient()
+    results = []
+
+    if args.interfaces * len(INTERFACE_COLUMNS) <= args.max_get_oids:
+        requests_before = client.stats['requests']
+        elapsed, count = await bench_get_per_oid(client, host, port, args.community, args.interfaces)
+        results.append(('GET на каждый OID (16 параллельно)', elapsed, client.stats['requests'] - requests_before))
+    else:
+        print(f"GET на каждый OID пропущен: {args.interfaces * len(INTERFACE_COLUMNS)} запросов "
+              f"(предел --max-get-oids {args.max_get_oids})")
+
+    for repetitions in args.repetitions:
+        requests_before = client.stats['requests']
+        started = time.perf_counter()
+        table = await client.walk(host, port, args.community, INTERFACE_COLUMNS, repetitions, timeout=5.0)
+        elapsed = time.perf_counter() - started
+        rows = len(table['in_octets'])
+        label = 'GETNEXT-эквивалент (GETBULK x1)' if repetitions == 1 else f"GETBULK max-repetitions={repetitions}"
+        results.append((f"{label}, строк {rows}", elapsed, client.stats['requests'] - requests_before))
+
+    print(f"\nТаблица интерфейсов: {args.interfaces} строк x {len(INTERFACE_COLUMNS)} колонок")
+    for label, elapsed, requests in results:
+        print(f"  {label:<50} {elapsed * 1000:9.1f} мс, запросов {requests}")
+
+    # Две выборки подряд через сборщик: скорости по дельтам 64-битных счетчиков
+    collector = SnmpInterfaceCollector(client, CounterDeltaEngine(), max_repetitions=max(args.repetitions))
+    first = await collector.read_snapshot(host, port, args.community, timeout=5.0)
+    await asyncio.sleep(args.delta_interval)
+    second = await collector.read_snapshot(host, port, args.community, timeout=5.0)
+
+    collector.engine.update('bench', first)
+    started = time.perf_counter()
+    rates = collector.engine.update('bench', second)
+    engine_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    collector.engine.previous.pop('bench')
+    collector.engine.update('bench', first)
+    readings = collector.interface_rates('bench', second)
+    readings_ms = (time.perf_counter() - started) * 1000
+
+    expected = np.array([1e9 + (index * 7919 % 8000) * 1e6 for index in second.index])
+    measured = rates['in_octets'] * 8
+    valid = ~np.isnan(measured)
+    error = np.abs(measured[valid] - expected[valid]) / expected[valid] * 100 if valid.any() else np.array([0.0])
+    print(f"\nСкорости по дельтам: интерфейсов {len(second.index)}, рассчитано {int(valid.sum())}, "
+          f"переходов через максимум {collector.engine.stats['wraps']}, сбросов {collector.engine.stats['resets']}")
+    print(f"  расчет дельт {engine_ms:.2f} мс, показаний {len(readings)} за {readings_ms:.1f} мс; "
+          f"отклонение in_bps от заданной скорости: среднее {error.mean():.2f}%, максимум {error.max():.2f}%")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--interfaces', type=int, default=4000)
+    parser.add_argument('--repetitions', default='1,10,25,50,100', help='значения max-repetitions через запятую')
+    parser.add_argument('--max-get-oids', type=int, default=20000, help='предел базового варианта GET по OID')
+    parser.add_argument('--delta-interval', type=float, default=2.0)
+    parser.add_argument('--port', type=int, default=16162)
+    parser.add_argument('--agent', default=None, help='host:port внешнего агента (snmpsim) вместо встроенного')
+    parser.add_argument('--community', default='public')
+    parser.add_argument('--write-snmprec', default=None, help='записать таблицу в файл данных snmpsim и выйти')
+    args = parser.parse_args()
+    args.repetitions = [int(value) for value in args.repetitions.split(',')]
+
+    if args.write_snmprec:
+        write_snmprec(args.write_snmprec, args.interfaces)
+        return
+
+    agent = None
+    if args.agent:
+        host, port = args.agent.rsplit(':', 1)
+        port = int(port)
+    else:
+        host, port = '127.0.0.1', args.port
+        ready = multiprocessing.Event()
+        agent = multiprocessing.Process(target=run_agent, args=(args.interfaces, port, ready), daemon=True)
+        agent.start()
+        ready.wait(30)
+
+    try:
+        asyncio.run(run(args, host, port))
+    finally:
+        if agent is not None:
+            agent.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Локальные агенты-заглушки для опроса устройств: HTTP-датчики и симулятор SNMPv2c
+Запускать: python benchmarks/device_agents.py [--devices 300] [--interval 5] [--duration 30] [--slow-share 0.05]
+Только агенты и файл инвентаря (для DEVICE_INVENTORY=... python app.py):
+           python benchmarks/device_agents.py --serve --inventory devices.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collectors import snmp
+from collectors.device_poller import DevicePoller, load_inventory
+
+# OID симулятора (в духе PDU/датчиков APC): температура и влажность в десятых долях, мощность в ваттах
+SNMP_OIDS = {
+    'temperature': '1.3.6.1.4.1.318.1.1.10.2.3.2.1.4.1',
+    'humidity': '1.3.6.1.4.1.318.1.1.10.2.3.2.1.6.1',
+    'power_watts': '1.3.6.1.4.1.318.1.1.12.1.16.0',
+    'uptime': '1.3.6.1.2.1.1.3.0'
+}
+
+
+class AgentFleet:
+    """Состояние виртуальных устройств: медленные отвечают позже тайм-аута, остальные - с сетевой задержкой"""
+
+    def __init__(self, devices: int, latency: float, slow_share: float, slow_delay: float):
+        self.latency = latency
+        self.slow_delay = slow_delay
+        self.slow = set(random.sample(range(devices), int(devices * slow_share)))
+        self.started = time.monotonic()
+        self.requests = Counter()  # протокол -> запросов
+        self.arrivals = Counter()  # номер 100-мс окна -> запросов (проверка "набегания" опросов)
+
+    def record(self, protocol: str):
+        self.requests[protocol] += 1
+        self.arrivals[int((time.monotonic() - self.started) * 10)] += 1
+
+    async def delay(self, index: int):
+        await asyncio.sleep(self.slow_delay if index in self.slow else random.uniform(0, 2 * self.latency))
+
+    @staticmethod
+    def readings(index: int) -> dict:
+        return {
+            'temperature': round(22 + index % 7 + random.uniform(-0.5, 0.5), 1),
+            'humidity': round(45 + index % 11 + random.uniform(-1, 1), 1),
+            'power_watts': 3000 + index * 3 + random.randint(-50, 50)
+        }
+
+
+class SnmpSimulator(asyncio.DatagramProtocol):
+    """Симулятор агентов SNMPv2c на одном порту: устройство выбирается по community (dev-<номер>)"""
+
+    def __init__(self, fleet: AgentFleet):
+        self.fleet = fleet
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        asyncio.ensure_future(self.respond(data, addr))
+
+    async def respond(self, data, addr):
+        message = snmp.decode_message(data)
+        index = int(message['community'].rsplit('-', 1)[-1])
+        self.fleet.record('snmp')
+        await self.fleet.delay(index)
+
+        readings = self.fleet.readings(index)
+        values = {
+            SNMP_OIDS['temperature']: (snmp.INTEGER, int(readings['temperature'] * 10)),
+            SNMP_OIDS['humidity']: (snmp.INTEGER, int(readings['humidity'] * 10)),
+            SNMP_OIDS['power_watts']: (snmp.GAUGE32, readings['power_watts']),
+            SNMP_OIDS['uptime']: (snmp.TIMETICKS, int((time.monotonic() - self.fleet.started) * 100))
+        }
+        varbinds = [(oid, values.get(oid, (snmp.NO_SUCH_OBJECT, None))) for oid, _, _ in message['varbinds']]
+        self.transport.sendto(
+            snmp.encode_message(message['community'], snmp.GET_RESPONSE, message['request_id'], varbinds), addr
+        )
+
+
+async def handle_http(reader, writer, fleet: AgentFleet):
+    """HTTP-датчик: GET /devices/<номер> отдает JSON показаний (как контроллер кондиционера)"""
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+
+        path = request_line.split()[1].decode()
+        index = int(path.rstrip('/').rsplit('/', 1)[-1])
+        fleet.record('http')
+        await fleet.delay(index)
+
+        readings = fleet.readings(index)
+        body = json.dumps({
+            'unit': f"crac-{index}",
+            'sensors': {'supply_temp': readings['temperature'], 'rh': readings['humidity']},
+            'fans': [{'rpm': 1200 + index}]
+        }).encode()
+        writer.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n'
+            + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, IndexError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+def build_inventory(devices: int, snmp_port: int, http_port: int, interval: float, timeout: float) -> dict:
+    """Инвентарь: четные устройства - PDU по SNMP, нечетные - кондиционеры по HTTP"""
+    entries = []
+    for index in range(devices):
+        if index % 2 == 0:
+            entries.append({
+                'name': f"pdu-{index}",
+                'protocol': 'snmp',
+                'host': '127.0.0.1',
+                'port': snmp_port,
+                'community': f"dev-{index}",
+                'metrics': {
+                    'temperature': {'source': SNMP_OIDS['temperature'], 'scale': 0.1},
+                    'humidity': {'source': SNMP_OIDS['humidity'], 'scale': 0.1},
+                    'power_watts': SNMP_OIDS['power_watts']
+                }
+            })
+        else:
+            entries.append({
+                'name': f"crac-{index}",
+                'protocol': 'http',
+                'url': f"http://127.0.0.1:{http_port}/devices/{index}",
+                'metrics': {'temperature': 'sensors.supply_temp', 'humidity': 'sensors.rh', 'fan_rpm': 'fans.0.rpm'}
+            })
+    return {'defaults': {'interval': interval, 'timeout': timeout}, 'devices': entries}
+
+
+async def start_agents(fleet: AgentFleet, snmp_port: int, http_port: int):
+    loop = asyncio.get_running_loop()
+    await loop.create_datagram_endpoint(lambda: SnmpSimulator(fleet), local_addr=('127.0.0.1', snmp_port))
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_http(reader, writer, fleet), '127.0.0.1', http_port, backlog=1024
+    )
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=300)
+    parser.add_argument('--interval', type=float, default=5.0, help='секунд между опросами устройства')
+    parser.add_argument('--timeout', type=float, default=1.0, help='тайм-аут опроса устройства')
+    parser.add_argument('--duration', type=float, default=30.0, help='длительность замера, секунд')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--latency', type=float, default=0.02, help='средняя задержка ответа агента')
+    parser.add_argument('--slow-share', type=float, default=0.05, help='доля устройств, не успевающих за тайм-аут')
+    parser.add_argument('--snmp-port', type=int, default=16161)
+    parser.add_argument('--http-port', type=int, default=18080)
+    parser.add_argument('--inventory', default=None, help='куда записать инвентарь')
+    parser.add_argument('--serve', action='store_true', help='только запустить агенты')
+    args = parser.parse_args()
+
+    fleet = AgentFleet(args.devices, args.latency, args.slow_share, slow_delay=args.timeout * 3)
+    inventory = build_inventory(args.devices, args.snmp_port, args.http_port, args.interval, args.timeout)
+    inventory_path = args.inventory or os.path.join('/tmp', 'device_agents_inventory.json')
+    with open(inventory_path, 'w', encoding='utf-8') as f:
+        json.dump(inventory, f, ensure_ascii=False, indent=1)
+
+    agents_loop = asyncio.new_event_loop()
+    agents_loop.run_until_complete(start_agents(fleet, args.snmp_port, args.http_port))
+    print(f"Агенты: SNMP udp/{args.snmp_port}, HTTP tcp/{args.http_port}; инвентарь {inventory_path} "
+          f"({args.devices} устройств, медленных {len(fleet.slow)})")
+
+    if args.serve:
+        try:
+            agents_loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    import threading
+    threading.Thread(target=agents_loop.run_forever, daemon=True).start()
+
+    samples = Counter()
+    poller = DevicePoller(
+        load_inventory(inventory_path), sink=lambda rows: samples.update(row['metric'] for row in rows),
+        concurrency=args.concurrency, jitter=args.jitter
+    )
+    poller.start()
+    time.sleep(args.duration)
+    stats = poller.get_stats()
+    poller.stop()
+
+    # Пик по 100-мс окнам после начального разброса: при "набегании" все устройства пришли бы в одно окно
+    steady = [count for window, count in fleet.arrivals.items() if window >= args.interval * 10]
+    expected = args.devices / (args.interval * 10)
+    failing = sum(1 for device in poller.devices if device.status['last_error'])
+
+    print(f"Опросов: {stats['polls']} ({stats['polls'] / args.duration:.1f}/с, ожидалось "
+          f"{args.devices / args.interval:.1f}/с), показаний: {stats['samples']}")
+    print(f"Тайм-аутов: {stats['timeouts']}, ошибок: {stats['failures']}, опоздавших опросов: {stats['late_polls']}, "
+          f"устройств с ошибкой: {failing}")
+    print(f"Одновременно в работе: максимум {stats['max_in_flight']} из {args.concurrency}; "
+          f"SNMP повторов: {stats['snmp']['retries']}")
+    if steady:
+        print(f"Запросов к агентам за 100 мс: среднее {sum(steady) / len(steady):.1f} "
+              f"(равномерно {expected:.1f}), пик {max(steady)}")
+    print(f"Показания по метрикам: {dict(samples)}")
+
+
+if __name__ == '__main__':
+    main()
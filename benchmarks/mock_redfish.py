@@ -0,0 +1,253 @@
+"""
+Мок-сервер Redfish (несколько BMC на соседних портах) и замер опросов в секунду
+Запускать: python benchmarks/mock_redfish.py [--bmcs 50] [--sensors 40] [--duration 5] [--latency 0.005]
+Только BMC и файл инвентаря (для DEVICE_INVENTORY=... python app.py):
+           python benchmarks/mock_redfish.py --serve --inventory redfish.json
+Варианты службы: --legacy (только Thermal/Power), --no-expand, --fake-expand (объявляет $expand, но отдает ссылки)
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collectors.http_pool import HttpConnectionPool
+from collectors.redfish import RedfishCollector
+
+CHASSIS = '/redfish/v1/Chassis/1'
+REASONS = {200: 'OK', 401: 'Unauthorized', 404: 'Not Found'}
+
+
+class MockBmc:
+    """Один BMC: дерево ресурсов Redfish с датчиками температуры, вентиляторами и блоками питания"""
+
+    def __init__(self, index: int, sensors: int, args):
+        self.index = index
+        self.args = args
+        self.started = time.monotonic()
+        self.connections = 0
+        self.requests = 0
+
+        # Около половины датчиков - температуры, остальное - вентиляторы и блоки питания
+        temperatures = max(2, sensors // 2)
+        fans = max(1, (sensors - temperatures) * 2 // 3)
+        supplies = max(1, sensors - temperatures - fans)
+        self.sensors = (
+            [('InletTemp', 'Inlet Temp', 'Temperature', 'Cel', 24.0), ('ExhaustTemp', 'Exhaust Temp', 'Temperature', 'Cel', 38.0)]
+            + [(f"CPU{i}Temp", f"CPU{i} Temp", 'Temperature', 'Cel', 55.0) for i in range(temperatures - 2)]
+            + [(f"Fan{i}", f"Fan {i}", 'Rotational', 'RPM', 9000.0) for i in range(fans)]
+            + [(f"PSU{i}Power", f"PSU {i} Input Power", 'Power', 'W', 450.0) for i in range(supplies)]
+        )
+
+    def reading(self, base: float, position: int) -> float:
+        elapsed = time.monotonic() - self.started
+        return round(base * (1 + 0.03 * math.sin(elapsed / 10 + position + self.index)), 1)
+
+    def sensor(self, position: int) -> dict:
+        sensor_id, name, reading_type, units, base = self.sensors[position]
+        return {
+            '@odata.id': f"{CHASSIS}/Sensors/{sensor_id}",
+            'Id': sensor_id,
+            'Name': name,
+            'ReadingType': reading_type,
+            'ReadingUnits': units,
+            'Reading': self.reading(base, position),
+            'Status': {'State': 'Enabled', 'Health': 'OK'}
+        }
+
+    def route(self, target: str):
+        """(код, документ, число датчиков в ответе) для пути запроса"""
+        parts = urlsplit(target)
+        path = parts.path.rstrip('/')
+        expand = '$expand' in parts.query
+
+        if path == '/redfish/v1':
+            root = {'@odata.id': '/redfish/v1/', 'RedfishVersion': '1.15.0', 'Chassis': {'@odata.id': '/redfish/v1/Chassis'}}
+            if not self.args.no_expand:
+                root['ProtocolFeaturesSupported'] = {
+                    'ExpandQuery': {'ExpandAll': True, 'Levels': True, 'MaxLevels': 3, 'Links': True, 'NoLinks': True}
+                }
+            return 200, root, 0
+        if path == '/redfish/v1/Chassis':
+            return 200, {'Members': [{'@odata.id': CHASSIS}], 'Members@odata.count': 1}, 0
+        if path == CHASSIS:
+            chassis = {'@odata.id': CHASSIS, 'Id': '1', 'Name': f"Server {self.index}",
+                       'Thermal': {'@odata.id': f"{CHASSIS}/Thermal"}, 'Power': {'@odata.id': f"{CHASSIS}/Power"}}
+            if not self.args.legacy:
+                chassis['Sensors'] = {'@odata.id': f"{CHASSIS}/Sensors"}
+            return 200, chassis, 0
+        if path == f"{CHASSIS}/Sensors" and not self.args.legacy:
+            if expand and not self.args.no_expand and not self.args.fake_expand:
+                members = [self.sensor(position) for position in range(len(self.sensors))]
+            else:
+                members = [{'@odata.id': f"{CHASSIS}/Sensors/{sensor[0]}"} for sensor in self.sensors]
+            return 200, {'Members': members, 'Members@odata.count': len(members)}, len(members) if expand else 0
+        if path.startswith(f"{CHASSIS}/Sensors/") and not self.args.legacy:
+            sensor_id = path.rsplit('/', 1)[-1]
+            for position, sensor in enumerate(self.sensors):
+                if sensor[0] == sensor_id:
+                    return 200, self.sensor(position), 1
+        if path == f"{CHASSIS}/Thermal":
+            document = {'Temperatures': [], 'Fans': []}
+            for position, (sensor_id, name, reading_type, _, base) in enumerate(self.sensors):
+                if reading_type == 'Temperature':
+                    document['Temperatures'].append({'MemberId': sensor_id, 'Name': name,
+                                                     'ReadingCelsius': self.reading(base, position)})
+                elif reading_type == 'Rotational':
+                    document['Fans'].append({'MemberId': sensor_id, 'Name': name, 'ReadingUnits': 'RPM',
+                                             'Reading': self.reading(base, position)})
+            return 200, document, len(document['Temperatures']) + len(document['Fans'])
+        if path == f"{CHASSIS}/Power":
+            supplies = [{'MemberId': sensor_id, 'Name': name, 'PowerInputWatts': self.reading(base, position)}
+                        for position, (sensor_id, name, reading_type, _, base) in enumerate(self.sensors)
+                        if reading_type == 'Power']
+            return 200, {'PowerSupplies': supplies}, len(supplies)
+        return 404, {'error': {'code': 'Base.1.0.ResourceMissingAtURI'}}, 0
+
+    async def handle(self, reader, writer):
+        """Соединение клиента: несколько запросов подряд, пока клиент не попросит закрыть"""
+        self.connections += 1
+        # Установка соединения с BMC (TCP + TLS) заметно дороже запроса
+        await asyncio.sleep(self.args.handshake)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                self.requests += 1
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if 'authorization' not in headers:
+                    status, document, sensors = 401, {'error': {'code': 'Base.1.0.NoValidSession'}}, 0
+                else:
+                    status, document, sensors = self.route(request_line.split()[1].decode())
+
+                # Время ответа BMC: базовая задержка плюс сбор каждого показания
+                await asyncio.sleep(self.args.latency + sensors * self.args.sensor_cost)
+                body = json.dumps(document).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode() + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, IndexError, asyncio.CancelledError):
+            # Клиент оборвал соединение или замер завершен
+            pass
+        finally:
+            writer.close()
+
+
+async def start_bmcs(args):
+    bmcs = [MockBmc(index, args.sensors, args) for index in range(args.bmcs)]
+    for index, bmc in enumerate(bmcs):
+        await asyncio.start_server(bmc.handle, '127.0.0.1', args.port + index, backlog=256)
+    return bmcs
+
+
+def build_inventory(args) -> dict:
+    return {
+        'defaults': {'interval': 10, 'timeout': 5},
+        'devices': [
+            {
+                'name': f"bmc-{index}",
+                'protocol': 'redfish',
+                'url': f"http://127.0.0.1:{args.port + index}",
+                'username': 'monitor',
+                'password': 'monitor',
+                'metrics': {'temperature': 'InletTemp'},
+                'sensors': True
+            }
+            for index in range(args.bmcs)
+        ]
+    }
+
+
+async def measure(label: str, args, keep_alive: bool, inventory_ttl: float, use_expand: bool, bmcs):
+    """Замкнутый цикл: каждый BMC опрашивается сразу после предыдущего ответа в течение duration секунд"""
+    pool = HttpConnectionPool(max_per_host=2, keep_alive=keep_alive)
+    collector = RedfishCollector(pool, inventory_ttl=inventory_ttl, use_expand=use_expand)
+    connections_before = sum(bmc.connections for bmc in bmcs)
+    requests_before = sum(bmc.requests for bmc in bmcs)
+    deadline = time.monotonic() + args.duration
+    polls = [0]
+    sensors = [0]
+
+    async def poll_loop(index):
+        url = f"http://127.0.0.1:{args.port + index}"
+        while time.monotonic() < deadline:
+            readings = await collector.read_sensors(url, 'monitor', 'monitor', timeout=10.0, verify_tls=False)
+            polls[0] += 1
+            sensors[0] = len(readings)
+
+    started = time.monotonic()
+    await asyncio.gather(*(poll_loop(index) for index in range(args.bmcs)))
+    elapsed = time.monotonic() - started
+    pool.close()
+
+    requests = sum(bmc.requests for bmc in bmcs) - requests_before
+    connections = sum(bmc.connections for bmc in bmcs) - connections_before
+    modes = collector.get_stats()['modes']
+    print(f"  {label:<44} {polls[0] / elapsed:8.1f} опросов/с, запросов на опрос {requests / max(polls[0], 1):5.1f}, "
+          f"соединений {connections}, датчиков {sensors[0]}, режим {','.join(modes) or '-'}")
+
+
+async def run(args):
+    bmcs = await start_bmcs(args)
+    print(f"BMC: {args.bmcs} (порты {args.port}-{args.port + args.bmcs - 1}), датчиков на BMC {len(bmcs[0].sensors)}, "
+          f"задержка ответа {args.latency * 1000:.0f} мс, установка соединения {args.handshake * 1000:.0f} мс")
+    await measure('новое соединение, опись на каждом опросе', args, False, 0, False, bmcs)
+    await measure('keep-alive, опись на каждом опросе', args, True, 0, False, bmcs)
+    await measure('keep-alive, кэш описи, датчики по одному', args, True, 3600, False, bmcs)
+    await measure('keep-alive, кэш описи, $expand', args, True, 3600, True, bmcs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bmcs', type=int, default=50)
+    parser.add_argument('--sensors', type=int, default=40)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--latency', type=float, default=0.005, help='задержка ответа BMC, секунд')
+    parser.add_argument('--sensor-cost', type=float, default=0.0002, help='секунд на одно показание в ответе')
+    parser.add_argument('--handshake', type=float, default=0.03, help='установка соединения (TCP + TLS), секунд')
+    parser.add_argument('--port', type=int, default=18400)
+    parser.add_argument('--legacy', action='store_true')
+    parser.add_argument('--no-expand', action='store_true')
+    parser.add_argument('--fake-expand', action='store_true')
+    parser.add_argument('--serve', action='store_true', help='только запустить BMC')
+    parser.add_argument('--inventory', default=None, help='куда записать инвентарь')
+    args = parser.parse_args()
+
+    if args.serve:
+        inventory_path = args.inventory or os.path.join('/tmp', 'mock_redfish_inventory.json')
+        with open(inventory_path, 'w', encoding='utf-8') as f:
+            json.dump(build_inventory(args), f, ensure_ascii=False, indent=1)
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(start_bmcs(args))
+        print(f"BMC запущены на портах {args.port}-{args.port + args.bmcs - 1}; инвентарь {inventory_path}")
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
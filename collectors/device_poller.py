@@ -0,0 +1,396 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from collectors.http_pool import HttpConnectionPool, basic_auth
+from collectors.interface_metrics import SnmpInterfaceCollector
+from collectors.redfish import RedfishCollector
+from collectors.snmp import SnmpClient
+
+# Поддерживаемые протоколы опроса
+DEVICE_PROTOCOLS = ('snmp', 'http', 'ipmi', 'redfish')
+
+
+class Device:
+    """Устройство из инвентаря: адрес, протокол, интервал и соответствие метрик объектам устройства"""
+
+    __slots__ = ('name', 'protocol', 'host', 'port', 'community', 'url', 'username', 'password',
+                 'interval', 'timeout', 'retries', 'metrics', 'scale', 'interfaces', 'bulk_repetitions', 'sensors',
+                 'verify_tls', 'labels', 'status')
+
+    def __init__(self, name: str, protocol: str, host: Optional[str] = None, port: Optional[int] = None,
+                 community: str = 'public', url: Optional[str] = None, username: Optional[str] = None,
+                 password: Optional[str] = None, interval: float = 10.0, timeout: float = 2.0, retries: int = 1,
+                 metrics: Optional[Dict] = None, interfaces=False, bulk_repetitions: int = 25, sensors: bool = False,
+                 verify_tls: bool = True, labels: Optional[Dict[str, str]] = None):
+        if protocol not in DEVICE_PROTOCOLS:
+            raise ValueError(f"Устройство {name}: неизвестный протокол {protocol}")
+
+        self.name = name
+        self.protocol = protocol
+        self.host = host
+        self.port = port or {'snmp': 161, 'http': 80, 'redfish': 443}.get(protocol)
+        self.community = community
+        if protocol == 'http':
+            self.url = url or f"http://{host}:{self.port}/"
+        elif protocol == 'redfish':
+            # Базовый адрес BMC: пути ресурсов Redfish (@odata.id) абсолютные
+            self.url = (url or (f"https://{host}" if self.port == 443 else f"https://{host}:{self.port}")).rstrip('/')
+        else:
+            self.url = None
+        self.username = username
+        self.password = password
+        self.interval = float(interval)
+        self.timeout = float(timeout)
+        self.retries = int(retries)
+
+        # Метрика -> OID (snmp), путь в JSON через точку (http) или имя датчика (ipmi);
+        # вместо строки допускается {"source": ..., "scale": 0.1} для значений в десятых долях и т.п.
+        self.metrics = {}
+        self.scale = {}
+        for metric, source in (metrics or {}).items():
+            if isinstance(source, dict):
+                self.scale[metric] = float(source.get('scale', 1.0))
+                source = source['source']
+            self.metrics[metric] = str(source)
+
+        # Таблица интерфейсов (только snmp): true - все интерфейсы, строка - регулярное выражение по ifName
+        if interfaces and protocol != 'snmp':
+            raise ValueError(f"Устройство {name}: таблица интерфейсов читается только по SNMP")
+        self.interfaces = interfaces
+        self.bulk_repetitions = int(bulk_repetitions)  # Строк таблицы в одном ответе GETBULK
+        # Все датчики BMC (только redfish) с меткой sensor
+        if sensors and protocol != 'redfish':
+            raise ValueError(f"Устройство {name}: список всех датчиков читается только по Redfish")
+        self.sensors = bool(sensors)
+        self.verify_tls = bool(verify_tls)  # false - самоподписанный сертификат BMC
+
+        if not self.metrics and not self.interfaces and not self.sensors:
+            raise ValueError(f"Устройство {name}: не задано ни одной метрики")
+
+        # Метки серий устройства (rack, room, role, ...); метку host задает имя устройства
+        self.labels = {str(key): str(value) for key, value in (labels or {}).items()}
+        if 'host' in self.labels:
+            raise ValueError(f"Устройство {name}: метка host совпадает с именем устройства и не задается")
+
+        self.status = {
+            'polls': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'last_poll': None,
+            'last_success': None,
+            'last_ms': None,
+            'last_error': None
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'protocol': self.protocol,
+            'address': self.url or f"{self.host}:{self.port or ''}".rstrip(':'),
+            'interval': self.interval,
+            'timeout': self.timeout,
+            'metrics': sorted(self.metrics),
+            'interfaces': bool(self.interfaces),
+            'labels': self.labels,
+            **self.status
+        }
+
+
+def load_inventory(path: str, default_interval: float = 10.0, default_timeout: float = 2.0) -> List[Device]:
+    """Инвентарь из JSON: список устройств или {"defaults": {...}, "devices": [...]}"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    defaults = {'interval': default_interval, 'timeout': default_timeout}
+    if isinstance(data, dict):
+        defaults.update(data.get('defaults', {}))
+        data = data.get('devices', [])
+
+    devices = []
+    names = set()
+    for entry in data:
+        # Метки по умолчанию дополняются метками устройства, а не заменяются ими
+        options = dict(defaults, **entry)
+        options['labels'] = dict(defaults.get('labels') or {}, **(entry.get('labels') or {}))
+        device = Device(**options)
+        if device.name in names:
+            raise ValueError(f"Устройство {device.name} описано в инвентаре дважды")
+        names.add(device.name)
+        devices.append(device)
+    return devices
+
+
+def json_path(document, path: str):
+    """Значение по пути через точку: sensors.0.temp - ключ sensors, элемент 0, ключ temp"""
+    value = document
+    for part in path.split('.'):
+        if isinstance(value, list):
+            value = value[int(part)]
+        else:
+            value = value[part]
+    return value
+
+
+def parse_ipmi_sdr(output: str) -> Dict[str, float]:
+    """Показания датчиков из `ipmitool sdr elist full`: имя | id | статус | сущность | 24 degrees C"""
+    readings = {}
+    for line in output.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) < 5:
+            continue
+        reading = parts[4].split()
+        try:
+            readings[parts[0]] = float(reading[0])
+        except (IndexError, ValueError):
+            continue  # "no reading", "disabled" и т.п.
+    return readings
+
+
+class DevicePoller:
+    """Асинхронный опрос парка устройств (SNMP, HTTP, Redfish, IPMI) в отдельном потоке
+
+    У каждого устройства свое расписание со случайным начальным сдвигом и джиттером интервала,
+    поэтому опросы не приходят на устройства и в базу одновременно. Одновременных опросов не больше
+    concurrency, каждый ограничен тайм-аутом устройства. Результаты передаются в sink строками
+    {timestamp, metric, labels, value} из пула потоков, не блокируя цикл событий. Метки строки - host
+    (имя устройства), метки устройства из инвентаря и, для интерфейсов и датчиков BMC, interface или sensor.
+    """
+
+    def __init__(self, devices: List[Device], sink: Callable[[List[Dict]], None], concurrency: int = 64,
+                 jitter: float = 0.1, http_connections: int = 2, inventory_ttl: float = 3600.0):
+        self.devices = devices
+        self.sink = sink
+        self.concurrency = concurrency
+        self.jitter = jitter  # Доля интервала для случайного сдвига очередного опроса
+
+        self.snmp = SnmpClient()
+        self.interface_collector = SnmpInterfaceCollector(self.snmp)
+        self.http = HttpConnectionPool(max_per_host=http_connections)
+        self.redfish = RedfishCollector(self.http, inventory_ttl=inventory_ttl)
+        self.adapters = {
+            'snmp': self._poll_snmp, 'http': self._poll_http, 'ipmi': self._poll_ipmi, 'redfish': self._poll_redfish
+        }
+        self.loop = None
+        self.thread = None
+        self.semaphore = None
+        self.in_flight = 0
+        self.started_at = None
+        self.recent_polls = deque(maxlen=100000)  # Время завершения опросов для расчета скорости
+        self.stats = {
+            'polls': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'samples': 0,
+            'sink_errors': 0,
+            'late_polls': 0,
+            'max_in_flight': 0
+        }
+
+    def start(self):
+        """Запуск цикла событий опроса в фоновом потоке"""
+        if not self.devices or (self.thread and self.thread.is_alive()):
+            return
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            for task in asyncio.all_tasks(loop):
+                loop.call_soon_threadsafe(task.cancel)
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            print(f"❌ Ошибка цикла опроса устройств: {e}")
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.gather(*(self._device_loop(device) for device in self.devices))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.snmp.close()
+            self.http.close()
+
+    async def _device_loop(self, device: Device):
+        """Расписание одного устройства: сетка с интервалом устройства плюс случайный сдвиг"""
+        # Первые опросы равномерно распределены по интервалу, а не приходятся на момент запуска
+        await asyncio.sleep(random.uniform(0, device.interval))
+        next_due = self.loop.time()
+
+        while True:
+            await self.poll_device(device)
+
+            next_due += device.interval
+            delay = next_due - self.loop.time()
+            if delay < 0:
+                # Опрос не уложился в интервал - пропущенные тики не догоняем
+                self.stats['late_polls'] += 1
+                next_due = self.loop.time()
+                delay = 0
+            await asyncio.sleep(max(0.0, delay + random.uniform(-self.jitter, self.jitter) * device.interval))
+
+    async def poll_device(self, device: Device) -> List[Dict]:
+        """Один опрос устройства с ограничением параллельности и тайм-аутом"""
+        async with self.semaphore:
+            self.in_flight += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+            started = time.perf_counter()
+            device.status['polls'] += 1
+            device.status['last_poll'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.stats['polls'] += 1
+            try:
+                readings = await asyncio.wait_for(self.adapters[device.protocol](device), device.timeout)
+            except asyncio.TimeoutError:
+                device.status['timeouts'] += 1
+                device.status['last_error'] = f"Нет ответа за {device.timeout} с"
+                self.stats['timeouts'] += 1
+                return []
+            except Exception as e:
+                device.status['failures'] += 1
+                device.status['last_error'] = str(e) or type(e).__name__
+                self.stats['failures'] += 1
+                return []
+            finally:
+                self.in_flight -= 1
+                device.status['last_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                self.recent_polls.append(time.monotonic())
+
+        timestamp = datetime.now()
+        rows = [
+            {'timestamp': timestamp, 'metric': metric, 'labels': dict(device.labels, host=device.name, **source),
+             'value': value}
+            for source, metric, value in readings
+        ]
+
+        device.status['last_success'] = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        device.status['last_error'] = None
+        if rows:
+            self.stats['samples'] += len(rows)
+            try:
+                # Запись и проверка порогов работают с базой - вне цикла событий
+                await self.loop.run_in_executor(None, self.sink, rows)
+            except Exception as e:
+                self.stats['sink_errors'] += 1
+                print(f"Ошибка обработки показаний {device.name}: {e}")
+        return rows
+
+    async def _poll_snmp(self, device: Device) -> List[Tuple[Dict, str, float]]:
+        # Тайм-аут устройства делится между попытками одного запроса
+        request_timeout = device.timeout / (device.retries + 1)
+        readings = []
+        if device.metrics:
+            values = await self.snmp.get(
+                device.host, device.port, device.community, list(device.metrics.values()),
+                timeout=request_timeout, retries=device.retries
+            )
+            readings = device_readings(device, {
+                metric: _to_number(values.get(oid.strip('.'))) for metric, oid in device.metrics.items()
+            })
+
+        if device.interfaces:
+            readings.extend(await self.interface_collector.collect(
+                device.name, device.host, device.port, device.community, request_timeout, device.retries,
+                match=device.interfaces if isinstance(device.interfaces, str) else None,
+                max_repetitions=device.bulk_repetitions
+            ))
+        return readings
+
+    async def _poll_http(self, device: Device) -> List[Tuple[Dict, str, float]]:
+        document = await self.http.get_json(
+            device.url, basic_auth(device.username, device.password), device.timeout, device.verify_tls
+        )
+        result = {}
+        for metric, path in device.metrics.items():
+            try:
+                result[metric] = _to_number(json_path(document, path))
+            except (KeyError, IndexError, ValueError, TypeError):
+                result[metric] = None
+        return device_readings(device, result)
+
+    async def _poll_redfish(self, device: Device) -> List[Tuple[Dict, str, float]]:
+        values, readings = await self.redfish.collect(
+            device.url, device.username, device.password, device.timeout, device.verify_tls,
+            metrics=device.metrics, all_sensors=device.sensors
+        )
+        return device_readings(device, values) + readings
+
+    async def _poll_ipmi(self, device: Device) -> List[Tuple[Dict, str, float]]:
+        command = ['ipmitool', '-I', 'lanplus', '-H', device.host, '-U', device.username or '',
+                   '-P', device.password or '', 'sdr', 'elist', 'full']
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            # Тайм-аут опроса: зависший ipmitool не должен оставаться после отмены
+            process.kill()
+            raise
+        if process.returncode != 0:
+            raise ConnectionError(stderr.decode(errors='replace').strip() or f"ipmitool: код {process.returncode}")
+
+        readings = parse_ipmi_sdr(stdout.decode(errors='replace'))
+        return device_readings(device, {metric: readings.get(sensor) for metric, sensor in device.metrics.items()})
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        window = 60.0
+        recent = sum(1 for moment in self.recent_polls if now - moment <= window)
+        elapsed = min(window, now - self.started_at) if self.started_at else 0.0
+
+        return {
+            'running': bool(self.thread and self.thread.is_alive()),
+            'devices': len(self.devices),
+            'concurrency': self.concurrency,
+            'jitter': self.jitter,
+            'in_flight': self.in_flight,
+            'polls_per_second': round(recent / elapsed, 2) if elapsed else 0.0,
+            'snmp': self.snmp.get_stats(),
+            'interfaces': self.interface_collector.get_stats(),
+            'http': self.http.get_stats(),
+            'redfish': self.redfish.get_stats(),
+            **self.stats
+        }
+
+    def get_devices(self) -> List[Dict]:
+        return [device.to_dict() for device in self.devices]
+
+
+def device_readings(device: Device, values: Dict[str, Optional[float]]) -> List[Tuple[Dict, str, float]]:
+    """Показания (метки источника, метрика, значение) с учетом масштаба; отсутствующие значения пропускаются"""
+    readings = []
+    for metric, value in values.items():
+        if value is None:
+            continue
+        if metric in device.scale:
+            # Округление убирает хвосты двоичной арифметики при масштабе 0.1 (219 * 0.1 = 21.900000000000002)
+            value = round(float(value) * device.scale[metric], 6)
+        readings.append(({}, metric, float(value)))
+    return readings
+
+
+def _to_number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, bytes):
+        value = value.decode(errors='replace')
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
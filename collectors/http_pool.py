@@ -0,0 +1,187 @@
+import asyncio
+import base64
+import json
+import ssl
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class HttpResponse:
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def basic_auth(username: Optional[str], password: Optional[str]) -> Dict[str, str]:
+    """Заголовок Basic-авторизации (пустой, если пользователь не задан)"""
+    if not username:
+        return {}
+    token = base64.b64encode(f"{username}:{password or ''}".encode()).decode()
+    return {'Authorization': f"Basic {token}"}
+
+
+class HttpConnectionPool:
+    """Постоянные соединения HTTP/1.1 (keep-alive) к устройствам, не больше max_per_host на хост
+
+    Новое TLS-соединение с BMC стоит дороже самого запроса датчиков, поэтому соединение после
+    ответа возвращается в пул и используется следующим опросом. Закрытое устройством соединение
+    обнаруживается при повторном использовании, и запрос один раз повторяется по новому.
+    """
+
+    def __init__(self, max_per_host: int = 2, idle_timeout: float = 60.0, keep_alive: bool = True):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout  # Секунд простоя, после которых соединение не используется
+        self.keep_alive = keep_alive
+        self.idle = {}  # (scheme, host, port) -> [(reader, writer, время возврата)]
+        self.limits = {}  # (scheme, host, port) -> Semaphore одновременных запросов к хосту
+        self.ssl_contexts = {}
+        self.stats = {'requests': 0, 'connections_opened': 0, 'connections_reused': 0, 'stale_retries': 0,
+                      'errors': 0}
+
+    def _ssl_context(self, verify: bool) -> ssl.SSLContext:
+        context = self.ssl_contexts.get(verify)
+        if context is None:
+            context = ssl.create_default_context()
+            if not verify:
+                # Самоподписанные сертификаты BMC: проверка отключается только явно в инвентаре
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            self.ssl_contexts[verify] = context
+        return context
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      body: Optional[bytes] = None, timeout: float = 5.0, verify_tls: bool = True) -> HttpResponse:
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        key = (parts.scheme, parts.hostname, parts.port or (443 if secure else 80))
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", 'Accept: application/json',
+                 f"Connection: {'keep-alive' if self.keep_alive else 'close'}"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b'')
+
+        limit = self.limits.get(key)
+        if limit is None:
+            limit = self.limits[key] = asyncio.Semaphore(self.max_per_host)
+
+        self.stats['requests'] += 1
+        async with limit:
+            try:
+                return await asyncio.wait_for(self._exchange(key, payload, secure, verify_tls), timeout)
+            except Exception:
+                self.stats['errors'] += 1
+                raise
+
+    async def get_json(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 5.0,
+                       verify_tls: bool = True):
+        response = await self.request('GET', url, headers, timeout=timeout, verify_tls=verify_tls)
+        if response.status != 200:
+            raise ConnectionError(f"HTTP {response.status} от {url}")
+        return response.json()
+
+    async def _exchange(self, key: Tuple, payload: bytes, secure: bool, verify_tls: bool) -> HttpResponse:
+        connection = self._take_idle(key)
+        if connection is not None:
+            try:
+                return await self._send(key, connection, payload)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Устройство закрыло простаивавшее соединение - повтор по новому
+                self.stats['stale_retries'] += 1
+
+        reader, writer = await asyncio.open_connection(
+            key[1], key[2], ssl=self._ssl_context(verify_tls) if secure else None
+        )
+        self.stats['connections_opened'] += 1
+        return await self._send(key, (reader, writer), payload)
+
+    def _take_idle(self, key: Tuple):
+        connections = self.idle.get(key)
+        now = time.monotonic()
+        while connections:
+            reader, writer, returned = connections.pop()
+            if now - returned <= self.idle_timeout and not reader.at_eof() and not writer.is_closing():
+                self.stats['connections_reused'] += 1
+                return reader, writer
+            writer.close()
+        return None
+
+    async def _send(self, key: Tuple, connection, payload: bytes) -> HttpResponse:
+        reader, writer = connection
+        try:
+            writer.write(payload)
+            await writer.drain()
+            response, reusable = await self._read_response(reader)
+        except BaseException:
+            # Ответ не дочитан (ошибка, тайм-аут, отмена) - соединение в неизвестном состоянии
+            writer.close()
+            raise
+
+        if reusable and self.keep_alive:
+            self.idle.setdefault(key, []).append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+        return response
+
+    @staticmethod
+    async def _read_response(reader) -> Tuple[HttpResponse, bool]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Соединение закрыто устройством")
+        try:
+            version, status = status_line.split()[:2]
+            status = int(status)
+        except ValueError:
+            raise ConnectionError(f"Некорректный ответ HTTP: {status_line[:80]!r}")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        reusable = connection != 'close' and (version == b'HTTP/1.1' or connection == 'keep-alive')
+
+        if status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Завершающие заголовки (trailers) до пустой строки
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.extend((await reader.readexactly(size + 2))[:-2])  # Данные и завершающий CRLF
+            body = bytes(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            # Длина не указана - ответ до закрытия соединения
+            body = await reader.read()
+            reusable = False
+
+        return HttpResponse(status, headers, body), reusable
+
+    def close(self):
+        for connections in self.idle.values():
+            for _, writer, _ in connections:
+                writer.close()
+        self.idle.clear()
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, idle=sum(len(connections) for connections in self.idle.values()),
+                    hosts=len(self.limits))
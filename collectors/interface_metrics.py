@@ -0,0 +1,275 @@
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from collectors.snmp import SnmpClient
+
+SYS_UPTIME = '1.3.6.1.2.1.1.3.0'
+IF_TABLE = '1.3.6.1.2.1.2.2.1'
+IF_X_TABLE = '1.3.6.1.2.1.31.1.1.1'
+
+# Колонки ifTable/ifXTable с 64-битными счетчиками (ошибки и отбрасывания есть только 32-битные);
+# первая колонка - счетчик октетов: по времени ее ответа считается момент замера строки
+INTERFACE_COLUMNS = {
+    'in_octets': IF_X_TABLE + '.6',
+    'name': IF_X_TABLE + '.1',  # ifName
+    'oper_status': IF_TABLE + '.8',
+    'high_speed': IF_X_TABLE + '.15',  # Мбит/с
+    'discontinuity': IF_X_TABLE + '.19',  # ifCounterDiscontinuityTime
+    'in_ucast': IF_X_TABLE + '.7',
+    'in_mcast': IF_X_TABLE + '.8',
+    'in_bcast': IF_X_TABLE + '.9',
+    'out_octets': IF_X_TABLE + '.10',
+    'out_ucast': IF_X_TABLE + '.11',
+    'out_mcast': IF_X_TABLE + '.12',
+    'out_bcast': IF_X_TABLE + '.13',
+    'in_discards': IF_TABLE + '.13',
+    'in_errors': IF_TABLE + '.14',
+    'out_discards': IF_TABLE + '.19',
+    'out_errors': IF_TABLE + '.20'
+}
+
+# Агенты без ifXTable: только 32-битные счетчики ifTable
+LEGACY_COLUMNS = {
+    'in_octets': IF_TABLE + '.10',
+    'name': IF_TABLE + '.2',  # ifDescr
+    'oper_status': IF_TABLE + '.8',
+    'speed': IF_TABLE + '.5',  # бит/с
+    'in_ucast': IF_TABLE + '.11',
+    'in_nucast': IF_TABLE + '.12',
+    'in_discards': IF_TABLE + '.13',
+    'in_errors': IF_TABLE + '.14',
+    'out_octets': IF_TABLE + '.16',
+    'out_ucast': IF_TABLE + '.17',
+    'out_nucast': IF_TABLE + '.18',
+    'out_discards': IF_TABLE + '.19',
+    'out_errors': IF_TABLE + '.20'
+}
+
+COUNTERS_64 = ('in_octets', 'in_ucast', 'in_mcast', 'in_bcast', 'out_octets', 'out_ucast', 'out_mcast', 'out_bcast')
+COUNTERS_32 = ('in_discards', 'in_errors', 'out_discards', 'out_errors')
+LEGACY_COUNTERS = ('in_octets', 'in_ucast', 'in_nucast', 'in_discards', 'in_errors',
+                   'out_octets', 'out_ucast', 'out_nucast', 'out_discards', 'out_errors')
+
+# Метрика интерфейса -> (счетчики, сумма которых дает метрику, множитель)
+INTERFACE_RATES = {
+    'if_in_bps': (('in_octets',), 8),
+    'if_out_bps': (('out_octets',), 8),
+    'if_in_pps': (('in_ucast', 'in_mcast', 'in_bcast', 'in_nucast'), 1),
+    'if_out_pps': (('out_ucast', 'out_mcast', 'out_bcast', 'out_nucast'), 1),
+    'if_in_errors': (('in_errors',), 1),
+    'if_out_errors': (('out_errors',), 1),
+    'if_in_discards': (('in_discards',), 1),
+    'if_out_discards': (('out_discards',), 1)
+}
+
+MIN_FRAME_BITS = 64 * 8  # Минимальный кадр Ethernet: предел пакетов в секунду для скорости порта
+
+
+class InterfaceSnapshot:
+    """Значения счетчиков всех интерфейсов устройства (массивы по возрастанию ifIndex)
+
+    Обход большой таблицы занимает заметное время, поэтому момент замера хранится для каждой строки:
+    время ответа, в котором пришли ее счетчики.
+    """
+
+    __slots__ = ('time', 'uptime', 'index', 'names', 'oper_status', 'speed_bps', 'discontinuity',
+                 'counters', 'present', 'widths')
+
+    def __init__(self, table: Dict[str, Dict[str, object]], moment: float, uptime: Optional[int] = None,
+                 times: Optional[Dict[str, float]] = None):
+        self.uptime = uptime  # sysUpTime, сотые доли секунды
+
+        legacy = 'speed' in table
+        keys = sorted({int(key) for column in table.values() for key in column if key.isdigit()})
+        self.index = np.array(keys, dtype=np.int64)
+        str_keys = [str(key) for key in keys]
+        times = times or {}
+        self.time = np.fromiter((times.get(key, moment) for key in str_keys), dtype=np.float64, count=len(str_keys))
+
+        names = table.get('name', {})
+        self.names = [_text(names.get(key)) or key for key in str_keys]
+        self.oper_status = _column(table.get('oper_status', {}), str_keys, np.float64)
+
+        speed = _column(table['speed'], str_keys, np.float64) if legacy \
+            else _column(table.get('high_speed', {}), str_keys, np.float64) * 1e6
+        speed[speed <= 0] = np.nan  # Скорость неизвестна (виртуальные интерфейсы)
+        self.speed_bps = speed
+        self.discontinuity = None if legacy else _column(table.get('discontinuity', {}), str_keys, np.float64)
+
+        self.counters = {}
+        self.present = {}
+        self.widths = {}
+        for name in (LEGACY_COUNTERS if legacy else COUNTERS_64 + COUNTERS_32):
+            column = table.get(name, {})
+            self.counters[name] = np.fromiter(
+                (_counter(column.get(key)) for key in str_keys), dtype=np.uint64, count=len(str_keys)
+            )
+            self.present[name] = np.fromiter(
+                (isinstance(column.get(key), int) for key in str_keys), dtype=bool, count=len(str_keys)
+            )
+            self.widths[name] = 32 if legacy or name in COUNTERS_32 else 64
+
+    def rate_limit(self, name: str) -> np.ndarray:
+        """Предельная правдоподобная скорость счетчика в секунду по скорости порта (NaN - неизвестна)"""
+        if name.endswith('octets'):
+            return self.speed_bps / 8
+        return self.speed_bps / MIN_FRAME_BITS
+
+
+class CounterDeltaEngine:
+    """Скорости по дельтам счетчиков интерфейсов с учетом переполнения, сброса и перезапуска агента
+
+    Как и SamplingEngine для локального интерфейса, сброс счетчика дает пропуск, а не отрицательную
+    скорость. Переход через максимум (wrap) принимается, только если получившаяся скорость
+    правдоподобна для скорости порта; без известной скорости - для 32-битных счетчиков
+    при дельте меньше половины диапазона. Все интерфейсы устройства считаются векторно.
+    """
+
+    def __init__(self, tolerance: float = 1.1):
+        self.tolerance = tolerance  # Допуск сверх скорости порта
+        self.previous = {}  # устройство -> последний InterfaceSnapshot
+        self.stats = {'snapshots': 0, 'wraps': 0, 'resets': 0, 'agent_restarts': 0, 'new_interfaces': 0}
+
+    def update(self, device: str, snapshot: InterfaceSnapshot) -> Dict[str, np.ndarray]:
+        """Скорости счетчиков в секунду для интерфейсов snapshot.index (NaN - нет базы для расчета)"""
+        previous = self.previous.get(device)
+        self.previous[device] = snapshot
+        self.stats['snapshots'] += 1
+        empty = {name: np.full(len(snapshot.index), np.nan) for name in snapshot.counters}
+
+        if previous is None or not len(previous.index):
+            return empty
+        if snapshot.uptime is not None and previous.uptime is not None and snapshot.uptime < previous.uptime:
+            # Агент перезапущен: все счетчики начались заново
+            self.stats['agent_restarts'] += 1
+            return empty
+
+        positions = np.minimum(np.searchsorted(previous.index, snapshot.index), len(previous.index) - 1)
+        stable = previous.index[positions] == snapshot.index
+        self.stats['new_interfaces'] += int(np.count_nonzero(~stable))
+        if snapshot.discontinuity is not None and previous.discontinuity is not None:
+            # ifCounterDiscontinuityTime меняется при сбросе счетчиков интерфейса
+            before = previous.discontinuity[positions]
+            stable &= (before == snapshot.discontinuity) | (np.isnan(before) & np.isnan(snapshot.discontinuity))
+
+        elapsed = snapshot.time - previous.time[positions]
+        stable &= elapsed > 0
+        elapsed = np.where(stable, elapsed, 1.0)
+
+        rates = {}
+        for name, current in snapshot.counters.items():
+            if previous.widths.get(name) != snapshot.widths[name]:
+                rates[name] = empty[name]
+                continue
+
+            before = previous.counters[name][positions]
+            delta = current - before  # uint64: разность по модулю 2^64
+            if snapshot.widths[name] == 32:
+                delta &= np.uint64(0xFFFFFFFF)
+            wrapped = current < before
+            rate = delta.astype(np.float64) / elapsed
+
+            limit = snapshot.rate_limit(name) * self.tolerance
+            unknown = np.isnan(limit)
+            plausible = np.where(
+                unknown, ~wrapped | ((snapshot.widths[name] == 32) & (delta < np.uint64(1 << 31))), rate <= limit
+            )
+
+            base = stable & snapshot.present[name] & previous.present[name][positions]
+            valid = base & plausible
+            self.stats['wraps'] += int(np.count_nonzero(valid & wrapped))
+            self.stats['resets'] += int(np.count_nonzero(base & ~plausible))
+            rates[name] = np.where(valid, rate, np.nan)
+
+        return rates
+
+    def forget(self, device: str):
+        self.previous.pop(device, None)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, devices=len(self.previous))
+
+
+class SnmpInterfaceCollector:
+    """Таблица интерфейсов устройства через GETBULK и скорости трафика, пакетов и ошибок"""
+
+    def __init__(self, client: SnmpClient, engine: Optional[CounterDeltaEngine] = None, max_repetitions: int = 25):
+        self.client = client
+        self.engine = engine or CounterDeltaEngine()
+        self.max_repetitions = max_repetitions
+        self.stats = {'walks': 0, 'interfaces': 0, 'last_walk_ms': 0.0, 'max_walk_ms': 0.0}
+
+    async def read_snapshot(self, host: str, port: int, community: str, timeout: float = 1.0, retries: int = 1,
+                            max_repetitions: Optional[int] = None) -> InterfaceSnapshot:
+        """Обход ifTable/ifXTable; агенты без 64-битных счетчиков обходятся повторно по ifTable"""
+        repetitions = max_repetitions or self.max_repetitions
+        started = time.perf_counter()
+
+        uptime = (await self.client.get(host, port, community, [SYS_UPTIME], timeout, retries)).get(SYS_UPTIME)
+        times = {}
+        table = await self.client.walk(
+            host, port, community, INTERFACE_COLUMNS, repetitions, timeout, retries, times=times
+        )
+        if not table['in_octets']:
+            table = await self.client.walk(
+                host, port, community, LEGACY_COLUMNS, repetitions, timeout, retries, times=times
+            )
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats['walks'] += 1
+        self.stats['last_walk_ms'] = round(elapsed_ms, 2)
+        self.stats['max_walk_ms'] = round(max(self.stats['max_walk_ms'], elapsed_ms), 2)
+        return InterfaceSnapshot(table, time.monotonic(), uptime if isinstance(uptime, int) else None, times)
+
+    def interface_rates(self, device: str, snapshot: InterfaceSnapshot,
+                        match: Optional[str] = None) -> List[Tuple[Dict, str, float]]:
+        """Показания (метка interface, метрика, значение) по новому снимку"""
+        rates = self.engine.update(device, snapshot)
+        self.stats['interfaces'] = len(snapshot.index)
+
+        metrics = {}
+        for metric, (counters, factor) in INTERFACE_RATES.items():
+            counters = [rates[name] for name in counters if name in rates]
+            if counters:
+                metrics[metric] = np.sum(counters, axis=0) * factor  # NaN в любом слагаемом - пропуск
+        with np.errstate(invalid='ignore', divide='ignore'):
+            metrics['if_in_util'] = metrics['if_in_bps'] / snapshot.speed_bps * 100
+            metrics['if_out_util'] = metrics['if_out_bps'] / snapshot.speed_bps * 100
+        metrics['if_oper_status'] = snapshot.oper_status
+
+        pattern = re.compile(match) if match else None
+        readings = []
+        for position, name in enumerate(snapshot.names):
+            if pattern is not None and not pattern.search(name):
+                continue
+            source = {'interface': name}
+            for metric, values in metrics.items():
+                value = values[position]
+                if not np.isnan(value):
+                    readings.append((source, metric, round(float(value), 3)))
+        return readings
+
+    async def collect(self, device: str, host: str, port: int, community: str, timeout: float = 1.0,
+                      retries: int = 1, match: Optional[str] = None,
+                      max_repetitions: Optional[int] = None) -> List[Tuple[Dict, str, float]]:
+        snapshot = await self.read_snapshot(host, port, community, timeout, retries, max_repetitions)
+        return self.interface_rates(device, snapshot, match)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, counters=self.engine.get_stats())
+
+
+def _column(column: Dict[str, object], keys: List[str], dtype) -> np.ndarray:
+    return np.array([value if isinstance(value, (int, float)) else np.nan
+                     for value in (column.get(key) for key in keys)], dtype=dtype)
+
+
+def _counter(value) -> int:
+    return value if isinstance(value, int) else 0
+
+
+def _text(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode(errors='replace').strip() or None
+    return value
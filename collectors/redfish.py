@@ -0,0 +1,199 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from collectors.http_pool import HttpConnectionPool, basic_auth
+
+SERVICE_ROOT = '/redfish/v1/'
+
+# Тип показания Redfish -> метрика датчика
+SENSOR_METRICS = {
+    'Temperature': 'temperature_c',
+    'Rotational': 'fan_rpm',
+    'Percent': 'fan_percent',
+    'Power': 'power_watts',
+    'EnergykWh': 'energy_kwh',
+    'Voltage': 'voltage',
+    'Current': 'current_a',
+    'Humidity': 'humidity'
+}
+
+
+class RedfishInventory:
+    """Статическая опись BMC: адреса, по которым опрос читает показания, и способ их чтения"""
+
+    __slots__ = ('mode', 'urls', 'chassis', 'discovered_at')
+
+    def __init__(self, mode: str, urls: List[str], chassis: List[str]):
+        self.mode = mode  # expand - коллекция Sensors одним запросом, members - датчики по одному, legacy - Thermal/Power
+        self.urls = urls
+        self.chassis = chassis
+        self.discovered_at = time.monotonic()
+
+
+def expand_query(features: Dict) -> Optional[str]:
+    """Параметр $expand для коллекции датчиков по ProtocolFeaturesSupported.ExpandQuery (None - не поддерживается)"""
+    expand = features.get('ExpandQuery') or {}
+    levels = '($levels=1)' if expand.get('Levels') else ''
+    if expand.get('NoLinks'):
+        return f"?$expand=.{levels}"
+    if expand.get('ExpandAll'):
+        return f"?$expand=*{levels}"
+    return None
+
+
+def parse_sensor(document: Dict) -> Optional[Tuple[str, str, str, float]]:
+    """Ресурс Sensor: (идентификатор, имя, тип показания, значение)"""
+    reading = document.get('Reading')
+    if not isinstance(reading, (int, float)) or isinstance(reading, bool):
+        return None
+    reading_type = document.get('ReadingType') or ''
+    if reading_type == 'Rotational' and document.get('ReadingUnits') == '%':
+        reading_type = 'Percent'
+    sensor_id = document.get('Id') or document.get('Name')
+    return sensor_id, document.get('Name') or sensor_id, reading_type, float(reading)
+
+
+def parse_legacy(document: Dict) -> List[Tuple[str, str, str, float]]:
+    """Ресурсы Thermal и Power (Redfish до 2020.4): температуры, вентиляторы, блоки питания"""
+    sensors = []
+
+    def add(item, key, reading_type):
+        value = item.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = item.get('Name') or item.get('MemberId')
+            sensors.append((name, name, reading_type, float(value)))
+
+    for item in document.get('Temperatures', []):
+        add(item, 'ReadingCelsius', 'Temperature')
+    for item in document.get('Fans', []):
+        add(item, 'Reading', 'Percent' if item.get('ReadingUnits') == 'Percent' else 'Rotational')
+    for item in document.get('PowerSupplies', []):
+        add(item, 'PowerInputWatts' if 'PowerInputWatts' in item else 'LastPowerOutputWatts', 'Power')
+    for item in document.get('PowerControl', []):
+        add(item, 'PowerConsumedWatts', 'Power')
+    return sensors
+
+
+class RedfishCollector:
+    """Показания датчиков BMC по Redfish
+
+    Опись (шасси, адреса датчиков, поддержка $expand) определяется при первом опросе и хранится
+    inventory_ttl секунд, поэтому каждый опрос читает только значения: одним запросом коллекции
+    Sensors с $expand, иначе запросами датчиков или ресурсов Thermal/Power. Запросы идут через
+    постоянные соединения пула.
+    """
+
+    def __init__(self, pool: HttpConnectionPool, inventory_ttl: float = 3600.0, use_expand: bool = True):
+        self.pool = pool
+        self.inventory_ttl = inventory_ttl  # 0 - опись заново при каждом опросе
+        self.use_expand = use_expand
+        self.inventories = {}  # базовый адрес BMC -> RedfishInventory
+        self.no_expand = set()  # BMC, объявившие $expand, но вернувшие только ссылки
+        self.stats = {'polls': 0, 'discoveries': 0, 'requests': 0, 'sensors': 0, 'expand_fallbacks': 0}
+
+    async def _get(self, url: str, headers: Dict, timeout: float, verify_tls: bool):
+        self.stats['requests'] += 1
+        return await self.pool.get_json(url, headers, timeout, verify_tls)
+
+    async def discover(self, base_url: str, headers: Dict, timeout: float = 5.0,
+                       verify_tls: bool = True) -> RedfishInventory:
+        """Обход дерева ресурсов от корня службы до коллекций датчиков"""
+        self.stats['discoveries'] += 1
+        root = await self._get(base_url + SERVICE_ROOT, headers, timeout, verify_tls)
+        expand = expand_query(root.get('ProtocolFeaturesSupported') or {})
+        if not self.use_expand or base_url in self.no_expand:
+            expand = None
+
+        chassis_collection = await self._get(base_url + root['Chassis']['@odata.id'], headers, timeout, verify_tls)
+        chassis_urls = [member['@odata.id'] for member in chassis_collection.get('Members', [])]
+        chassis_documents = await asyncio.gather(
+            *(self._get(base_url + url, headers, timeout, verify_tls) for url in chassis_urls)
+        )
+
+        modes, urls = set(), []
+        for chassis in chassis_documents:
+            if 'Sensors' in chassis:
+                sensors_url = chassis['Sensors']['@odata.id']
+                if expand:
+                    modes.add('expand')
+                    urls.append(sensors_url + expand)
+                else:
+                    modes.add('members')
+                    collection = await self._get(base_url + sensors_url, headers, timeout, verify_tls)
+                    urls.extend(member['@odata.id'] for member in collection.get('Members', []))
+            else:
+                modes.add('legacy')
+                urls.extend(chassis[name]['@odata.id'] for name in ('Thermal', 'Power') if name in chassis)
+
+        mode = modes.pop() if len(modes) == 1 else 'mixed'
+        inventory = RedfishInventory(mode, urls, chassis_urls)
+        self.inventories[base_url] = inventory
+        return inventory
+
+    async def read_sensors(self, base_url: str, username: Optional[str] = None, password: Optional[str] = None,
+                           timeout: float = 5.0, verify_tls: bool = True) -> List[Tuple[str, str, str, float]]:
+        """Показания всех датчиков BMC: (идентификатор, имя, тип, значение)"""
+        headers = basic_auth(username, password)
+        inventory = self.inventories.get(base_url)
+        if inventory is None or time.monotonic() - inventory.discovered_at >= self.inventory_ttl:
+            inventory = await self.discover(base_url, headers, timeout, verify_tls)
+
+        try:
+            documents = await asyncio.gather(
+                *(self._get(base_url + url, headers, timeout, verify_tls) for url in inventory.urls)
+            )
+        except ConnectionError:
+            # Состав оборудования изменился (404 и т.п.) - следующий опрос заново построит опись
+            self.inventories.pop(base_url, None)
+            raise
+
+        sensors = []
+        for url, document in zip(inventory.urls, documents):
+            if '?$expand=' in url:
+                members = document.get('Members', [])
+                if members and all(set(member) <= {'@odata.id'} for member in members):
+                    # Служба объявила $expand, но вернула только ссылки - переходим на чтение по одному
+                    self.stats['expand_fallbacks'] += 1
+                    self.no_expand.add(base_url)
+                    self.inventories.pop(base_url, None)
+                    return await self.read_sensors(base_url, username, password, timeout, verify_tls)
+                sensors.extend(sensor for sensor in map(parse_sensor, members) if sensor)
+            elif 'Temperatures' in document or 'Fans' in document or 'PowerSupplies' in document \
+                    or 'PowerControl' in document:
+                sensors.extend(parse_legacy(document))
+            else:
+                sensor = parse_sensor(document)
+                if sensor:
+                    sensors.append(sensor)
+
+        self.stats['polls'] += 1
+        self.stats['sensors'] = len(sensors)
+        return sensors
+
+    async def collect(self, base_url: str, username: Optional[str] = None,
+                      password: Optional[str] = None, timeout: float = 5.0, verify_tls: bool = True,
+                      metrics: Optional[Dict[str, str]] = None,
+                      all_sensors: bool = False) -> Tuple[Dict[str, float], List[Tuple[Dict, str, float]]]:
+        """Метрики устройства по соответствию metric -> Id или имя датчика и, при all_sensors,
+        показания всех датчиков с меткой sensor
+        """
+        sensors = await self.read_sensors(base_url, username, password, timeout, verify_tls)
+        by_key = {}
+        for sensor_id, name, _, value in sensors:
+            by_key[sensor_id] = value
+            by_key.setdefault(name, value)
+
+        values = {metric: by_key.get(sensor) for metric, sensor in (metrics or {}).items()}
+        readings = []
+        if all_sensors:
+            readings = [
+                ({'sensor': sensor_id}, SENSOR_METRICS.get(reading_type, 'reading'), value)
+                for sensor_id, _, reading_type, value in sensors
+            ]
+        return values, readings
+
+    def get_stats(self) -> Dict:
+        modes = {}
+        for inventory in self.inventories.values():
+            modes[inventory.mode] = modes.get(inventory.mode, 0) + 1
+        return dict(self.stats, bmcs=len(self.inventories), modes=modes)
@@ -0,0 +1,90 @@
+import time
+from typing import Dict, Optional
+
+import psutil
+
+
+class SamplingEngine:
+    """Неблокирующий сбор счетчиков: скорости считаются по разнице между тиками"""
+
+    def __init__(self):
+        self.boot_time = psutil.boot_time()
+        # Первичный снимок, чтобы уже первый тик имел базу для расчета
+        self.previous = self.take_snapshot()
+
+    def take_snapshot(self) -> Dict:
+        """Снимок накопительных счетчиков без ожидания внутри psutil"""
+        return {
+            'time': time.monotonic(),
+            'cpu_times': psutil.cpu_times(),
+            'net': psutil.net_io_counters(),
+            'disk_io': psutil.disk_io_counters()
+        }
+
+    def tick(self) -> Dict:
+        """Новый снимок и скорости относительно предыдущего"""
+        snapshot = self.take_snapshot()
+        rates = self._compute_rates(self.previous, snapshot)
+        self.previous = snapshot
+        rates['snapshot'] = snapshot
+        return rates
+
+    def _compute_rates(self, previous: Optional[Dict], current: Dict) -> Dict:
+        """Расчет загрузки CPU, скоростей сети и диска по дельтам счетчиков"""
+        rates = {
+            'cpu_percent': 0.0,
+            'net_sent_bps': 0.0,
+            'net_recv_bps': 0.0,
+            'disk_read_bps': 0.0,
+            'disk_write_bps': 0.0,
+            'interval': 0.0
+        }
+
+        if previous is None:
+            return rates
+
+        elapsed = current['time'] - previous['time']
+        if elapsed <= 0:
+            return rates
+        rates['interval'] = elapsed
+
+        rates['cpu_percent'] = self._cpu_percent(previous['cpu_times'], current['cpu_times'])
+
+        rates['net_sent_bps'] = self._rate(previous['net'].bytes_sent, current['net'].bytes_sent, elapsed)
+        rates['net_recv_bps'] = self._rate(previous['net'].bytes_recv, current['net'].bytes_recv, elapsed)
+
+        # На некоторых системах (контейнеры) дисковые счетчики недоступны
+        if previous['disk_io'] is not None and current['disk_io'] is not None:
+            rates['disk_read_bps'] = self._rate(previous['disk_io'].read_bytes, current['disk_io'].read_bytes, elapsed)
+            rates['disk_write_bps'] = self._rate(previous['disk_io'].write_bytes, current['disk_io'].write_bytes, elapsed)
+
+        return rates
+
+    @staticmethod
+    def _rate(previous_value: int, current_value: int, elapsed: float) -> float:
+        """Скорость изменения счетчика; сброс счетчика дает 0, а не отрицательное значение"""
+        delta = current_value - previous_value
+        if delta < 0:
+            return 0.0
+        return delta / elapsed
+
+    @staticmethod
+    def _cpu_percent(previous_times, current_times) -> float:
+        """Загрузка CPU по дельте cpu_times (та же формула, что у psutil.cpu_percent)"""
+
+        def busy_and_total(times):
+            total = sum(times)
+            # guest-время уже учтено в user/nice на Linux
+            total -= getattr(times, 'guest', 0) + getattr(times, 'guest_nice', 0)
+            idle = times.idle + getattr(times, 'iowait', 0)
+            return total - idle, total
+
+        busy_prev, total_prev = busy_and_total(previous_times)
+        busy_curr, total_curr = busy_and_total(current_times)
+
+        total_delta = total_curr - total_prev
+        if total_delta <= 0:
+            return 0.0
+
+        busy_delta = max(0.0, busy_curr - busy_prev)
+        return min(100.0, busy_delta / total_delta * 100)
@@ -0,0 +1,342 @@
+import asyncio
+import itertools
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Теги BER, используемые SNMPv2c
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+# Типы PDU
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+GET_RESPONSE = 0xA2
+SET_REQUEST = 0xA3
+GET_BULK_REQUEST = 0xA5
+
+SNMP_VERSION_2C = 1
+TOO_BIG = 1  # error-status: ответ не помещается в сообщение агента
+UNSIGNED_TYPES = (COUNTER32, GAUGE32, TIMETICKS, COUNTER64)
+EXCEPTION_TYPES = (NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW)
+
+
+class SnmpError(Exception):
+    """Ошибка ответа агента (error-status) или разбора пакета"""
+
+    def __init__(self, message: str, status: int = 0):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes([length])
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(encoded)]) + encoded
+
+
+def encode_tlv(tag: int, payload: bytes) -> bytes:
+    return bytes([tag]) + encode_length(len(payload)) + payload
+
+
+def encode_integer(value: int, tag: int = INTEGER) -> bytes:
+    """Целое в дополнительном коде; беззнаковые типы получают ведущий ноль при старшем бите"""
+    return encode_tlv(tag, value.to_bytes(value.bit_length() // 8 + 1, 'big', signed=True))
+
+
+def encode_oid(oid: str) -> bytes:
+    arcs = [int(arc) for arc in oid.strip('.').split('.')]
+    if len(arcs) < 2:
+        raise SnmpError(f"Некорректный OID: {oid}")
+
+    payload = bytearray([arcs[0] * 40 + arcs[1]])
+    for arc in arcs[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        payload.extend(reversed(chunk))
+    return encode_tlv(OBJECT_IDENTIFIER, bytes(payload))
+
+
+def encode_value(value) -> bytes:
+    """Значение varbind: None - NULL, (тег, значение) - явный тип SNMP"""
+    if value is None:
+        return encode_tlv(NULL, b'')
+    if isinstance(value, tuple):
+        tag, raw = value
+        if tag in EXCEPTION_TYPES or tag == NULL:
+            return encode_tlv(tag, b'')
+        if tag == OBJECT_IDENTIFIER:
+            return encode_oid(raw)
+        if tag == IP_ADDRESS:
+            return encode_tlv(tag, bytes(int(part) for part in raw.split('.')))
+        if tag in (OCTET_STRING, OPAQUE):
+            return encode_tlv(tag, raw.encode() if isinstance(raw, str) else raw)
+        return encode_integer(int(raw), tag)
+    if isinstance(value, bool) or isinstance(value, int):
+        return encode_integer(int(value))
+    if isinstance(value, str):
+        return encode_tlv(OCTET_STRING, value.encode())
+    return encode_tlv(OCTET_STRING, bytes(value))
+
+
+def encode_message(community: str, pdu_type: int, request_id: int, varbinds: List[Tuple[str, object]],
+                   error_status: int = 0, error_index: int = 0) -> bytes:
+    """Сообщение SNMPv2c; для GETBULK error_status/error_index - non-repeaters/max-repetitions"""
+    encoded_varbinds = b''.join(
+        encode_tlv(SEQUENCE, encode_oid(oid) + encode_value(value)) for oid, value in varbinds
+    )
+    pdu = encode_tlv(pdu_type, (
+        encode_integer(request_id) + encode_integer(error_status) + encode_integer(error_index)
+        + encode_tlv(SEQUENCE, encoded_varbinds)
+    ))
+    return encode_tlv(SEQUENCE, (
+        encode_integer(SNMP_VERSION_2C) + encode_tlv(OCTET_STRING, community.encode()) + pdu
+    ))
+
+
+def decode_tlv(data: bytes, offset: int = 0) -> Tuple[int, bytes, int]:
+    """Тег, содержимое и смещение следующего элемента"""
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+        offset += 2
+        if length & 0x80:
+            size = length & 0x7F
+            length = int.from_bytes(data[offset:offset + size], 'big')
+            offset += size
+    except IndexError:
+        raise SnmpError("Обрезанный пакет")
+
+    end = offset + length
+    if end > len(data):
+        raise SnmpError("Обрезанный пакет")
+    return tag, data[offset:end], end
+
+
+def decode_oid(payload: bytes) -> str:
+    if not payload:
+        return ''
+    first = payload[0]
+    arcs = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    arc = 0
+    for byte in payload[1:]:
+        arc = (arc << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    return '.'.join(str(arc) for arc in arcs)
+
+
+def decode_value(tag: int, payload: bytes):
+    """Значение varbind в типы Python: числа, bytes, OID строкой; NULL и исключения - None"""
+    if tag == INTEGER:
+        return int.from_bytes(payload, 'big', signed=True)
+    if tag in UNSIGNED_TYPES:
+        return int.from_bytes(payload, 'big', signed=False)
+    if tag == OBJECT_IDENTIFIER:
+        return decode_oid(payload)
+    if tag == IP_ADDRESS:
+        return '.'.join(str(byte) for byte in payload)
+    if tag == NULL or tag in EXCEPTION_TYPES:
+        return None
+    return payload
+
+
+def decode_message(data: bytes) -> Dict:
+    """Разбор сообщения SNMPv2c: community, тип PDU, request-id, ошибки и список (OID, тег, значение)"""
+    tag, message, _ = decode_tlv(data)
+    if tag != SEQUENCE:
+        raise SnmpError("Пакет не является сообщением SNMP")
+
+    _, version, offset = decode_tlv(message)
+    _, community, offset = decode_tlv(message, offset)
+    pdu_type, pdu, _ = decode_tlv(message, offset)
+
+    _, request_id, offset = decode_tlv(pdu)
+    _, error_status, offset = decode_tlv(pdu, offset)
+    _, error_index, offset = decode_tlv(pdu, offset)
+    _, varbind_list, _ = decode_tlv(pdu, offset)
+
+    varbinds = []
+    offset = 0
+    while offset < len(varbind_list):
+        _, varbind, offset = decode_tlv(varbind_list, offset)
+        _, oid, value_offset = decode_tlv(varbind)
+        value_tag, value, _ = decode_tlv(varbind, value_offset)
+        varbinds.append((decode_oid(oid), value_tag, decode_value(value_tag, value)))
+
+    return {
+        'version': int.from_bytes(version, 'big'),
+        'community': community.decode(errors='replace'),
+        'pdu_type': pdu_type,
+        'request_id': int.from_bytes(request_id, 'big', signed=True),
+        'error_status': int.from_bytes(error_status, 'big', signed=True),
+        'error_index': int.from_bytes(error_index, 'big', signed=True),
+        'varbinds': varbinds
+    }
+
+
+class _ClientProtocol(asyncio.DatagramProtocol):
+    """Один UDP-сокет на все запросы: ответы сопоставляются с ожидающими по request-id"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def datagram_received(self, data, addr):
+        try:
+            message = decode_message(data)
+        except SnmpError:
+            self.client.stats['malformed'] += 1
+            return
+        future = self.client.pending.pop(message['request_id'], None)
+        if future is not None and not future.done():
+            future.set_result(message)
+
+    def error_received(self, exc):
+        # ICMP port unreachable и т.п. - ожидающий запрос завершится по тайм-ауту
+        self.client.stats['socket_errors'] += 1
+
+
+class SnmpClient:
+    """Асинхронный клиент SNMPv2c (GET, GETBULK, обход таблиц) поверх одного UDP-сокета"""
+
+    def __init__(self):
+        self.transport = None
+        self.pending = {}  # request-id -> Future ответа
+        self.request_ids = itertools.count(random.randint(1, 1 << 30))
+        self.stats = {'requests': 0, 'retries': 0, 'timeouts': 0, 'malformed': 0, 'socket_errors': 0}
+
+    async def open(self):
+        if self.transport is None:
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: _ClientProtocol(self), local_addr=('0.0.0.0', 0)
+            )
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    async def request(self, host: str, port: int, community: str, pdu_type: int, varbinds: List[Tuple[str, object]],
+                      timeout: float = 1.0, retries: int = 1, error_status: int = 0, error_index: int = 0) -> Dict:
+        """Запрос с повторами: каждая попытка ждет timeout секунд"""
+        await self.open()
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(retries + 1):
+            request_id = next(self.request_ids) & 0x7FFFFFFF
+            future = loop.create_future()
+            self.pending[request_id] = future
+            self.transport.sendto(
+                encode_message(community, pdu_type, request_id, varbinds, error_status, error_index), (host, port)
+            )
+            self.stats['requests'] += 1
+            if attempt:
+                self.stats['retries'] += 1
+
+            try:
+                message = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                self.pending.pop(request_id, None)
+
+            if message['error_status']:
+                raise SnmpError(f"Агент {host} вернул ошибку {message['error_status']} "
+                                f"(varbind {message['error_index']})", status=message['error_status'])
+            return message
+
+        self.stats['timeouts'] += 1
+        raise asyncio.TimeoutError(f"Нет ответа от {host}:{port}")
+
+    async def get(self, host: str, port: int, community: str, oids: List[str],
+                  timeout: float = 1.0, retries: int = 1) -> Dict[str, Optional[object]]:
+        """Значения OID одним GET; отсутствующие у агента объекты - None"""
+        message = await self.request(
+            host, port, community, GET_REQUEST, [(oid, None) for oid in oids], timeout, retries
+        )
+        return {oid: value for oid, _, value in message['varbinds']}
+
+    async def get_bulk(self, host: str, port: int, community: str, oids: List[str], max_repetitions: int = 25,
+                       non_repeaters: int = 0, timeout: float = 1.0, retries: int = 1) -> List[Tuple[str, int, object]]:
+        """GETBULK: до max_repetitions следующих объектов для каждого OID (порядок - по строкам)"""
+        message = await self.request(
+            host, port, community, GET_BULK_REQUEST, [(oid, None) for oid in oids], timeout, retries,
+            error_status=non_repeaters, error_index=max_repetitions
+        )
+        return message['varbinds']
+
+    async def walk(self, host: str, port: int, community: str, columns: Dict[str, str], max_repetitions: int = 25,
+                   timeout: float = 1.0, retries: int = 1,
+                   times: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, object]]:
+        """Обход колонок таблицы GETBULK: имя колонки -> {индекс строки (хвост OID): значение}
+
+        Все незавершенные колонки запрашиваются одним сообщением, поэтому таблица из N строк
+        и K колонок читается за N / max_repetitions запросов, а не за N * K запросов GET.
+        В times записывается момент получения ответа (time.monotonic) для каждой строки первой колонки.
+        """
+        prefixes = {name: oid.strip('.') + '.' for name, oid in columns.items()}
+        cursor = {name: oid.strip('.') for name, oid in columns.items()}
+        result = {name: {} for name in columns}
+        active = list(columns)
+        repetitions = max_repetitions
+
+        while active:
+            try:
+                varbinds = await self.get_bulk(
+                    host, port, community, [cursor[name] for name in active], repetitions,
+                    timeout=timeout, retries=retries
+                )
+            except SnmpError as e:
+                if e.status == TOO_BIG and repetitions > 1:
+                    # Ответ не помещается в сообщение агента - уменьшаем число строк в запросе
+                    repetitions = max(1, repetitions // 2)
+                    continue
+                raise
+
+            received = time.monotonic()
+            first_column = next(iter(columns))
+            finished = set()
+            advanced = set()
+            width = len(active)
+            for position, (oid, tag, value) in enumerate(varbinds):
+                name = active[position % width]
+                if name in finished:
+                    continue
+                if tag == END_OF_MIB_VIEW or not oid.startswith(prefixes[name]):
+                    finished.add(name)
+                    continue
+                suffix = oid[len(prefixes[name]):]
+                result[name][suffix] = value
+                cursor[name] = oid
+                if times is not None and name == first_column:
+                    times[suffix] = received
+                advanced.add(name)
+
+            # Колонка без продвижения завершается: защита от агентов, возвращающих пустой или тот же ответ
+            active = [name for name in active if name in advanced and name not in finished]
+
+        return result
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, pending=len(self.pending))
@@ -1,16 +1,29 @@
 import psutil
+import re
+import threading
 import time
 import random
+import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List
-from models.monitoring import db, SystemMetrics, AlertLog
-from models.settings import AlertSettings
+from typing import Dict, List, Optional
+from collectors.sampling import SamplingEngine
+from storage.metrics_store import METRIC_COLUMNS, SqlMetricsStore, columns_to_records
+from models.metric_catalog import alert_metric, alert_type_for, metrics_in_group
+from models.monitoring import db
+from services.alert_state import ThresholdSnapshot
+from services.downsampling import downsample_columns
+
+HISTORY_CURSOR = re.compile(r'([0-9a-f]+):(\d+)')
+
+# Метрики, по форме которых прореживается история для графиков
+CHART_METRICS = tuple(metrics_in_group('chart'))
 
 
 class EnhancedSystemMetricsCollector:
     """Расширенный класс для сбора системных метрик и датчиков ЦОД"""
 
-    def __init__(self):
+    def __init__(self, ingest_buffer=None, rollup_service=None, store=None, thresholds=None,
+                 series_ingest=None, host_labels: Optional[Dict[str, str]] = None):
         self.data_history = {
             'timestamps': [],
             'cpu_percent': [],
@@ -23,30 +36,48 @@ class EnhancedSystemMetricsCollector:
             'pressure': []
         }
         self.max_points = 50
-        self.last_network_stats = None
+        self.history_seq = 0  # Номер последней точки истории - курсор инкрементальных запросов
+        # Эпоха окна истории: номера точек после перезапуска начинаются заново, курсор "<эпоха>:<номер>"
+        self.history_epoch = format(time.time_ns() // 1000, 'x')
+        self.history_lock = threading.Lock()
+        self.sampler = SamplingEngine()
+        self.ingest_buffer = ingest_buffer  # Буфер пакетной записи (IngestBuffer)
+        self.rollups = rollup_service  # Агрегаты для длинных диапазонов (RollupService)
+        self.store = store or SqlMetricsStore()  # Хранилище сырых строк
+        self.thresholds = thresholds or ThresholdSnapshot()  # Пороги оповещений в памяти
+        # Буфер записи серий: дублирование метрик сервера сериями с метками host, rack, room (SERIES_LOCAL_METRICS)
+        self.series_ingest = series_ingest
+        self.host_labels = host_labels or {}
+        self.last_collection_ms = 0.0  # Длительность последнего сбора
         self.baseline_pressure = random.uniform(1010, 1020)  # Базовое давление
 
     def get_current_metrics(self) -> Dict:
         """Получить расширенные текущие метрики системы"""
+        started = time.perf_counter()
+
+        # Скорости считаются по разнице счетчиков между циклами, без sleep внутри psutil
+        rates = self.sampler.tick()
+        network = rates['snapshot']['net']
+        cpu_percent = rates['cpu_percent']
+
         # Базовые системные метрики
-        cpu_percent = psutil.cpu_percent(interval=1)
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
 
         # Расширенные сетевые метрики
-        network = psutil.net_io_counters()
-        network_detailed = self._get_network_detailed()
+        network_detailed = self._get_network_detailed(rates)
 
         # Симуляция датчиков ЦОД
-        datacenter_sensors = self._simulate_datacenter_sensors()
+        datacenter_sensors = self._simulate_datacenter_sensors(cpu_percent)
 
         # Дополнительные системные данные
         processes_count = len(psutil.pids())
-        uptime_seconds = time.time() - psutil.boot_time()
+        uptime_seconds = time.time() - self.sampler.boot_time
 
+        now = datetime.now()
         metrics = {
-            'timestamp': datetime.now().strftime('%H:%M:%S'),
-            'datetime': datetime.now(),
+            'timestamp': now.strftime('%H:%M:%S'),
+            'datetime': now,
 
             # Системные метрики
             'cpu_percent': round(cpu_percent, 1),
@@ -56,6 +87,8 @@ class EnhancedSystemMetricsCollector:
             'disk_percent': round((disk.used / disk.total) * 100, 1),
             'disk_used_gb': round(disk.used / (1024 ** 3), 1),
             'disk_total_gb': round(disk.total / (1024 ** 3), 1),
+            'disk_read_speed': round(rates['disk_read_bps'] / 1024, 1),  # KB/s
+            'disk_write_speed': round(rates['disk_write_bps'] / 1024, 1),  # KB/s
 
             # Сетевые метрики
             'network_sent_mb': round(network.bytes_sent / (1024 ** 2), 1),
@@ -78,42 +111,22 @@ class EnhancedSystemMetricsCollector:
             'processes_count': processes_count
         }
 
+        self.last_collection_ms = round((time.perf_counter() - started) * 1000, 2)
+        metrics['collection_ms'] = self.last_collection_ms
+
         return metrics
 
-    def _get_network_detailed(self) -> Dict:
+    def _get_network_detailed(self, rates: Dict) -> Dict:
         """Получить детальную сетевую статистику"""
-        current_stats = psutil.net_io_counters()
-
-        if self.last_network_stats is None:
-            self.last_network_stats = {
-                'bytes_sent': current_stats.bytes_sent,
-                'bytes_recv': current_stats.bytes_recv,
-                'timestamp': time.time()
-            }
-            return {'speed_up': 0, 'speed_down': 0}
-
-        time_diff = time.time() - self.last_network_stats['timestamp']
-        if time_diff > 0:
-            speed_up = (current_stats.bytes_sent - self.last_network_stats['bytes_sent']) / time_diff / 1024  # KB/s
-            speed_down = (current_stats.bytes_recv - self.last_network_stats['bytes_recv']) / time_diff / 1024  # KB/s
-        else:
-            speed_up = speed_down = 0
-
-        self.last_network_stats = {
-            'bytes_sent': current_stats.bytes_sent,
-            'bytes_recv': current_stats.bytes_recv,
-            'timestamp': time.time()
-        }
-
         return {
-            'speed_up': round(max(0, speed_up), 1),
-            'speed_down': round(max(0, speed_down), 1)
+            'speed_up': round(rates['net_sent_bps'] / 1024, 1),  # KB/s
+            'speed_down': round(rates['net_recv_bps'] / 1024, 1)  # KB/s
         }
 
-    def _simulate_datacenter_sensors(self) -> Dict:
+    def _simulate_datacenter_sensors(self, cpu_percent: float) -> Dict:
         """Симуляция датчиков ЦОД для демонстрации"""
         # Температура зависит от загрузки CPU
-        base_temp = 25 + (psutil.cpu_percent() * 0.3)  # 25°C + нагрузка
+        base_temp = 25 + (cpu_percent * 0.3)  # 25°C + нагрузка
         temperature = base_temp + random.uniform(-2, 3)
 
         # Влажность с небольшими колебаниями
@@ -141,146 +154,170 @@ class EnhancedSystemMetricsCollector:
         else:
             return f"{hours}ч {minutes}м"
 
+    def build_row(self, metrics: Dict) -> Dict:
+        """Строка таблицы system_metrics из словаря метрик"""
+        return {
+            'timestamp': metrics.get('datetime') or datetime.now(),
+            'cpu_percent': metrics['cpu_percent'],
+            'memory_percent': metrics['memory_percent'],
+            'memory_used_gb': metrics['memory_used_gb'],
+            'memory_total_gb': metrics['memory_total_gb'],
+            'disk_percent': metrics['disk_percent'],
+            'disk_used_gb': metrics['disk_used_gb'],
+            'disk_total_gb': metrics['disk_total_gb'],
+            'network_sent_mb': metrics['network_sent_mb'],
+            'network_recv_mb': metrics['network_recv_mb'],
+            'network_packets_sent': metrics['network_packets_sent'],
+            'network_packets_recv': metrics['network_packets_recv'],
+            'network_errors_in': metrics['network_errors_in'],
+            'network_errors_out': metrics['network_errors_out'],
+            'temperature': metrics['temperature'],
+            'humidity': metrics['humidity'],
+            'pressure': metrics['pressure'],
+            'uptime_seconds': metrics['uptime_seconds'],
+            'processes_count': metrics['processes_count']
+        }
+
+    def build_series_rows(self, row: Dict) -> List[Dict]:
+        """Строка system_metrics в значения серий локального сервера (пустые значения пропускаются)"""
+        return [
+            {'timestamp': row['timestamp'], 'metric': metric, 'labels': self.host_labels, 'value': float(row[metric])}
+            for metric in METRIC_COLUMNS if row.get(metric) is not None
+        ]
+
     def save_to_database(self, metrics: Dict):
         """Сохранение метрик в базу данных"""
         try:
-            metric_record = SystemMetrics(
-                timestamp=datetime.now(),
-                cpu_percent=metrics['cpu_percent'],
-                memory_percent=metrics['memory_percent'],
-                memory_used_gb=metrics['memory_used_gb'],
-                memory_total_gb=metrics['memory_total_gb'],
-                disk_percent=metrics['disk_percent'],
-                disk_used_gb=metrics['disk_used_gb'],
-                disk_total_gb=metrics['disk_total_gb'],
-                network_sent_mb=metrics['network_sent_mb'],
-                network_recv_mb=metrics['network_recv_mb'],
-                network_packets_sent=metrics['network_packets_sent'],
-                network_packets_recv=metrics['network_packets_recv'],
-                network_errors_in=metrics['network_errors_in'],
-                network_errors_out=metrics['network_errors_out'],
-                temperature=metrics['temperature'],
-                humidity=metrics['humidity'],
-                pressure=metrics['pressure'],
-                uptime_seconds=metrics['uptime_seconds'],
-                processes_count=metrics['processes_count']
-            )
-
-            db.session.add(metric_record)
-            db.session.commit()
+            row = self.build_row(metrics)
+            if self.series_ingest is not None:
+                self.series_ingest.submit_many(self.build_series_rows(row))
+
+            # При наличии буфера запись выполняется пакетами в фоне
+            if self.ingest_buffer is not None:
+                self.ingest_buffer.submit(row)
+                return
+
+            with db.engine.begin() as connection:
+                self.store.write_rows([row], connection)
+                if self.rollups is not None:
+                    self.rollups.apply(connection, [row])
 
         except Exception as e:
             print(f"Ошибка сохранения в БД: {e}")
             db.session.rollback()
 
-    def get_historical_data(self, hours: int = 24) -> List[Dict]:
-        """Получение исторических данных из БД"""
+    def get_historical_data(self, hours: float = 24, max_points: int = 100) -> List[Dict]:
+        """Получение исторических данных из БД (GET /api/history?hours=)"""
         try:
-            since = datetime.now() - timedelta(hours=hours)
-            records = SystemMetrics.query.filter(
-                SystemMetrics.timestamp >= since
-            ).order_by(SystemMetrics.timestamp.desc()).limit(200).all()
+            end = datetime.now()
+            since = end - timedelta(hours=hours)
 
-            return [record.to_dict() for record in reversed(records)]
+            # Сырые точки прореживаются LTTB по метрикам графиков, чтобы не терять выбросы
+            data = self.store.read_range(METRIC_COLUMNS, since, end)
+            indices = downsample_columns(data['timestamp'].astype(np.int64), data, max_points, CHART_METRICS)
+            return columns_to_records({name: values[indices] for name, values in data.items()})
         except Exception as e:
             print(f"Ошибка получения данных из БД: {e}")
             return []
 
     def add_to_history(self, metrics: Dict):
         """Добавить метрики в историю для графиков"""
-        self.data_history['timestamps'].append(metrics['timestamp'])
-        self.data_history['cpu_percent'].append(metrics['cpu_percent'])
-        self.data_history['memory_percent'].append(metrics['memory_percent'])
-        self.data_history['disk_percent'].append(metrics['disk_percent'])
-        self.data_history['network_sent'].append(metrics.get('network_speed_up', 0))
-        self.data_history['network_recv'].append(metrics.get('network_speed_down', 0))
-        self.data_history['temperature'].append(metrics['temperature'])
-        self.data_history['humidity'].append(metrics['humidity'])
-        self.data_history['pressure'].append(metrics['pressure'])
-
-        # Ограничиваем количество точек
-        for key in self.data_history:
-            if len(self.data_history[key]) > self.max_points:
-                self.data_history[key] = self.data_history[key][-self.max_points:]
+        with self.history_lock:
+            self.data_history['timestamps'].append(metrics['timestamp'])
+            self.data_history['cpu_percent'].append(metrics['cpu_percent'])
+            self.data_history['memory_percent'].append(metrics['memory_percent'])
+            self.data_history['disk_percent'].append(metrics['disk_percent'])
+            self.data_history['network_sent'].append(metrics.get('network_speed_up', 0))
+            self.data_history['network_recv'].append(metrics.get('network_speed_down', 0))
+            self.data_history['temperature'].append(metrics['temperature'])
+            self.data_history['humidity'].append(metrics['humidity'])
+            self.data_history['pressure'].append(metrics['pressure'])
+            self.history_seq += 1
+
+            # Ограничиваем количество точек
+            for key in self.data_history:
+                if len(self.data_history[key]) > self.max_points:
+                    self.data_history[key] = self.data_history[key][-self.max_points:]
 
     def get_history(self) -> Dict:
         """Получить историю метрик для графиков"""
         return self.data_history
 
+    def export_history(self) -> tuple:
+        """Копия окна истории, номер последней точки и эпоха (для передачи веб-процессам)"""
+        with self.history_lock:
+            history = {key: list(values) for key, values in self.data_history.items()}
+            return history, self.history_seq, self.history_epoch
+
+    def load_history(self, history: Dict, history_seq: int, history_epoch: str):
+        """Замена окна истории опубликованным процессом фоновых служб"""
+        with self.history_lock:
+            self.data_history = history
+            self.history_seq = history_seq
+            self.history_epoch = history_epoch
+
+    def get_history_since(self, since: Optional[str]) -> Dict:
+        """Точки истории после курсора клиента ("<эпоха>:<номер>" из прошлого ответа или метка времени точки)
+
+        reset=True означает, что курсор устарел, выдан до перезапуска сервера или неизвестен,
+        и в points все окно целиком.
+        """
+        with self.history_lock:
+            count = len(self.data_history['timestamps'])
+            first_seq = self.history_seq - count + 1
+
+            cursor = -1
+            match = HISTORY_CURSOR.fullmatch(since or '')
+            if match:
+                # Номер из другой эпохи относится к чужому окну истории
+                if match.group(1) == self.history_epoch:
+                    cursor = int(match.group(2))
+            else:
+                # Метка времени: ищем последнюю точку с ней в окне
+                timestamps = self.data_history['timestamps']
+                for index in range(count - 1, -1, -1):
+                    if timestamps[index] == since:
+                        cursor = first_seq + index
+                        break
+
+            reset = cursor < first_seq - 1 or cursor > self.history_seq
+            start = 0 if reset else cursor - first_seq + 1
+            return {
+                'cursor': f"{self.history_epoch}:{self.history_seq}",
+                'reset': reset,
+                'points': {key: values[start:] for key, values in self.data_history.items()}
+            }
+
     def check_alerts(self, metrics: Dict, alert_manager):
         """Проверка пороговых значений и создание оповещений"""
         try:
-            alert_settings = {s.metric_type: s for s in AlertSettings.query.all()}
-
-            # Проверяем каждую метрику
-            checks = [
-                ('cpu', metrics['cpu_percent']),
-                ('memory', metrics['memory_percent']),
-                ('disk', metrics['disk_percent']),
-                ('temperature', metrics['temperature']),
-                ('humidity', metrics['humidity'])
-            ]
+            # Проверяем каждую метрику каталога с порогами
+            checks = [(alert_type_for(metric), metrics[metric]) for metric in metrics_in_group('alerts')]
 
             for metric_type, value in checks:
-                setting = alert_settings.get(metric_type)
-                if not setting:
-                    continue
-
-                # Определяем уровень предупреждения
-                severity = None
-                threshold = None
-
-                if value >= setting.critical_threshold:
-                    severity = 'critical'
-                    threshold = setting.critical_threshold
-                elif value >= setting.warning_threshold:
-                    severity = 'warning'
-                    threshold = setting.warning_threshold
-
-                if severity:
-                    # Проверяем, не было ли недавно такого же оповещения
-                    recent_cutoff = datetime.utcnow() - timedelta(minutes=5)
-                    recent_alert = AlertLog.query.filter(
-                        AlertLog.alert_type == metric_type,
-                        AlertLog.severity == severity,
-                        AlertLog.timestamp >= recent_cutoff,
-                        AlertLog.resolved == False
-                    ).first()
-
-                    if not recent_alert:
-                        # Создаем новое оповещение
-                        message = self._generate_alert_message(metric_type, value, severity)
-                        alert_manager.process_alert(
-                            alert_type=metric_type,
-                            severity=severity,
-                            value=value,
-                            threshold=threshold,
-                            message=message
-                        )
+                # Уровень предупреждения по снимку порогов, без запроса к базе
+                severity, threshold = self.thresholds.classify(metric_type, value)
+
+                # Не было ли недавно такого же оповещения - по индексу открытых инцидентов
+                if severity and not alert_manager.incidents.has_recent(metric_type, severity):
+                    # Создаем новое оповещение
+                    message = self._generate_alert_message(metric_type, value, severity)
+                    alert_manager.process_alert(
+                        alert_type=metric_type,
+                        severity=severity,
+                        value=value,
+                        threshold=threshold,
+                        message=message
+                    )
 
         except Exception as e:
             print(f"Ошибка проверки оповещений: {e}")
 
     def _generate_alert_message(self, metric_type: str, value: float, severity: str) -> str:
         """Генерация сообщения для оповещения"""
-        metric_names = {
-            'cpu': 'Загрузка процессора',
-            'memory': 'Использование памяти',
-            'disk': 'Заполненность диска',
-            'temperature': 'Температура в ЦОД',
-            'humidity': 'Влажность в ЦОД'
-        }
-
-        units = {
-            'cpu': '%',
-            'memory': '%',
-            'disk': '%',
-            'temperature': '°C',
-            'humidity': '%'
-        }
-
-        metric_name = metric_names.get(metric_type, metric_type)
-        unit = units.get(metric_type, '')
+        info = alert_metric(metric_type)
+        metric_name = info.title if info else metric_type
+        unit = info.unit if info else ''
 
         severity_text = {
             'warning': 'превышает предупредительный уровень',
@@ -292,16 +329,7 @@ class EnhancedSystemMetricsCollector:
     def get_status_color(self, metric_type: str, value: float) -> str:
         """Получить цвет статуса для метрики"""
         try:
-            setting = AlertSettings.query.filter_by(metric_type=metric_type).first()
-            if not setting:
-                return 'success'  # По умолчанию зеленый
-
-            if value >= setting.critical_threshold:
-                return 'danger'  # Красный
-            elif value >= setting.warning_threshold:
-                return 'warning'  # Желтый
-            else:
-                return 'success'  # Зеленый
+            return self.thresholds.status_color(metric_type, value)
 
         except Exception as e:
             print(f"Ошибка определения статуса: {e}")
@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 class Config:
@@ -10,9 +11,74 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     # Настройки мониторинга
-    MONITORING_INTERVAL = 5  # секунд
+    MONITORING_INTERVAL = float(os.environ.get('MONITORING_INTERVAL') or 5)  # секунд, допустимо от 1
     MAX_DATA_POINTS = 100  # максимум точек на графике
     DATA_RETENTION_DAYS = 30  # дней хранения данных
+    ANALYTICS_TRAINING_MAX_POINTS = 20000  # максимум сырых строк для обучения (больше - равномерное прореживание)
+    ANALYTICS_WORKER_PROCESSES = int(os.environ.get('ANALYTICS_WORKER_PROCESSES') or 1)  # 0 - в потоке веб-процесса
+    ANALYTICS_MODEL_DIR = os.environ.get('ANALYTICS_MODEL_DIR') or os.path.join('data', 'models')
+    ANALYTICS_MODEL_MAX_AGE_HOURS = 24  # кэш моделей старше этого окна не используется
+    ANALYTICS_INCREMENTAL_ESTIMATORS = 20  # деревьев, добавляемых при дообучении на новых данных
+    ANALYTICS_MAX_ESTIMATORS = 300  # после этого размера леса выполняется полное переобучение
+    ANALYTICS_RETRAIN_SAMPLES = 720  # замеров между переобучениями IsolationForest
+    ANALYTICS_RETRAIN_EVENTS = 10  # потоковых аномалий, после которых модель переобучается раньше
+    ANALYTICS_RETRAIN_MIN_INTERVAL = 300  # секунд между переобучениями
+    ANOMALY_STREAM_WARNING_Z = 4.0  # отклонение (в σ) для предупреждения потокового детектора
+    ANOMALY_STREAM_CRITICAL_Z = 6.0  # отклонение (в σ) для критической аномалии
+    ANOMALY_STREAM_SEED_ROWS = 1000  # последних сырых замеров для начальных статистик потокового детектора
+    QUERY_MAX_POINTS = 11000  # максимум интервалов в ответе /api/query
+    QUERY_DEFAULT_POINTS = 500  # интервалов в ответе, если step не задан
+
+    # Хранилище сырых метрик: sqlite (таблица system_metrics), columnar (чанки .npy)
+    # или partitioned (файл SQLite на каждые сутки)
+    METRICS_BACKEND = os.environ.get('METRICS_BACKEND') or 'sqlite'
+    COLUMNAR_DATA_DIR = os.environ.get('COLUMNAR_DATA_DIR') or os.path.join('data', 'tsdb')
+    COLUMNAR_CHUNK_SECONDS = 3600  # длина раздела времени одного чанка
+    COLUMNAR_CHUNK_CAPACITY = 4096  # строк в чанке (размер файлов фиксирован)
+    COLUMNAR_REFRESH_SECONDS = 1.0  # как часто веб-процессы подхватывают новые чанки владельца
+    PARTITIONED_DATA_DIR = os.environ.get('PARTITIONED_DATA_DIR') or os.path.join('data', 'partitions')
+
+    # Очистка устаревших данных
+    RETENTION_DELETE_BATCH = 5000  # строк в одной транзакции удаления
+    RETENTION_VACUUM_PAGES = 2000  # страниц, возвращаемых за один incremental_vacuum
+
+    # Пакетная запись метрик
+    INGEST_BATCH_SIZE = 500  # строк в одной вставке
+    INGEST_FLUSH_INTERVAL = 2.0  # секунд до принудительного сброса
+    INGEST_MAX_QUEUE = 100000  # максимум строк в очереди
+
+    # Опрос оборудования по SNMP, IPMI и HTTP
+    DEVICE_INVENTORY = os.environ.get('DEVICE_INVENTORY')  # JSON-файл инвентаря; не задан - опрос выключен
+    DEVICE_POLL_CONCURRENCY = int(os.environ.get('DEVICE_POLL_CONCURRENCY') or 64)  # одновременных опросов
+    DEVICE_POLL_INTERVAL = 10.0  # секунд между опросами устройства, если в инвентаре не указано
+    DEVICE_POLL_TIMEOUT = 2.0  # секунд на опрос устройства, если в инвентаре не указано
+    DEVICE_POLL_JITTER = 0.1  # доля интервала, на которую случайно сдвигается очередной опрос
+    DEVICE_HTTP_CONNECTIONS = 2  # постоянных HTTP-соединений на устройство (BMC держат мало сессий)
+    DEVICE_INVENTORY_TTL = 3600.0  # секунд хранения описи BMC (шасси, адреса датчиков) между обходами
+
+    # Метки серий локального сервера: host и дополнительные пары "rack=A3,room=1"
+    HOST_NAME = os.environ.get('HOST_NAME') or socket.gethostname()
+    HOST_LABELS = os.environ.get('HOST_LABELS') or ''
+    SERIES_MAX_RESULTS = 1000  # максимум серий в ответе /api/series
+    # Дублировать метрики локального сервера сериями (по умолчанию они хранятся только в METRICS_BACKEND)
+    SERIES_LOCAL_METRICS = os.environ.get('SERIES_LOCAL_METRICS', 'false').lower() in ['true', 'on', '1']
+
+    # Фоновые службы при нескольких веб-процессах
+    BACKGROUND_SERVICES = os.environ.get('BACKGROUND_SERVICES') or 'auto'  # auto - запускает процесс-лидер, off - только веб
+    SHARED_STATE_DIR = os.environ.get('SHARED_STATE_DIR') or os.path.join('data', 'shared')  # общее состояние и блокировка
+    SHARED_STATE_POLL_INTERVAL = 1.0  # секунд между проверками общего состояния в веб-процессе
+
+    # Поток обновлений панели (Server-Sent Events)
+    STREAM_BUFFER_SIZE = 64  # сообщений для продолжения после переподключения
+    STREAM_HEARTBEAT = 15.0  # секунд между пингами открытого соединения
+
+    # Очередь исходящих уведомлений
+    NOTIFY_WORKERS = 2  # потоков отправки
+    NOTIFY_MAX_QUEUE = 1000  # максимум уведомлений в очереди
+    NOTIFY_MAX_ATTEMPTS = 5  # попыток до переноса в dead-letter
+    NOTIFY_BACKOFF_BASE = 5.0  # секунд до первого повтора, далее удваивается
+    NOTIFY_BACKOFF_MAX = 600.0  # секунд, предел задержки повтора
+    NOTIFY_EMAIL_CONCURRENCY = 1  # одновременных SMTP-отправок
 
     # Настройки Mail
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -21,6 +87,12 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_POOL_SIZE = 2  # постоянных SMTP-сессий
+    MAIL_POOL_IDLE_TIMEOUT = 60.0  # секунд простоя до закрытия сессии
+    MAIL_DIGEST_WINDOW = 60.0  # секунд, в течение которых некритичные оповещения объединяются
+    MAIL_DIGEST_MAX_ITEMS = 200  # оповещений в дайджесте до досрочной отправки
+    # Отправлять ли предупреждения (warning) по почте дайджестом; по умолчанию письма только о критичных
+    MAIL_DIGEST_WARNINGS = os.environ.get('MAIL_DIGEST_WARNINGS', 'false').lower() in ['true', 'on', '1']
 
     # Пороговые значения для оповещений (будут переопределены из БД)
     CPU_WARNING_THRESHOLD = 70  # %
@@ -38,4 +110,3 @@ class Config:
 
     # Настройки уведомлений
     ALERT_COOLDOWN_MINUTES = 5  # минут между повторными уведомлениями
-    ESCALATION_CHECK_INTERVAL = 300  # секунд (5 минут)
\ No newline at end of file
@@ -8,7 +8,8 @@ import time
 from datetime import datetime, timedelta
 from models.monitoring import db, SystemMetrics, AlertLog
 from models.users import AuditLog, User
-from app import app
+from services.rollup_service import RollupService
+from app import app, init_database
 import math
 
 
@@ -16,7 +17,8 @@ def generate_demo_metrics(days=7, points_per_day=288):
     """Генерация демо-метрик за указанное количество дней"""
     print(f"Генерация демо-данных за {days} дней...")
 
-    start_time = datetime.now() - timedelta(days=days)
+    generation_started = datetime.now()
+    start_time = generation_started - timedelta(days=days)
     interval_minutes = (24 * 60) // points_per_day  # интервал в минутах
 
     generated_count = 0
@@ -117,6 +119,10 @@ def generate_demo_metrics(days=7, points_per_day=288):
     try:
         db.session.commit()
         print(f"✅ Успешно сгенерировано {generated_count} записей метрик")
+
+        # Записи добавлены в обход буфера, поэтому агрегаты строим отдельно
+        RollupService().backfill(since=start_time, until=generation_started)
+        print("✅ Агрегаты метрик обновлены")
         return True
     except Exception as e:
         print(f"❌ Ошибка финального сохранения: {e}")
@@ -253,6 +259,7 @@ def generate_demo_audit_logs():
 
 def main():
     """Главная функция генерации демо-данных"""
+    init_database()
     with app.app_context():
         print("🚀 Запуск генерации демо-данных для системы мониторинга ЦОД")
         print("=" * 60)
@@ -0,0 +1,17 @@
+"""
+Настройки gunicorn для веб-процессов: gunicorn 'app:create_app()' (файл подхватывается автоматически)
+
+Поток событий /api/stream держит соединение открытым все время работы панели. Синхронный рабочий
+процесс обслуживает одно соединение и через timeout перезапускается, поэтому используются рабочие
+процессы gthread: каждое соединение занимает поток, а не процесс, и timeout к долгим ответам
+не применяется. Потоков на процесс нужно не меньше, чем открытых панелей плюс обычные запросы.
+"""
+
+import os
+
+bind = os.environ.get('WEB_BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_WORKERS') or 4)
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS') or 32)  # на процесс: панели с /api/stream и запросы API
+timeout = 60  # для gthread - контроль зависания процесса, а не длительности ответа
+keepalive = 5
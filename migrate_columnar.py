@@ -0,0 +1,89 @@
+"""
+Перенос метрик из SQLite в колоночное хранилище или в посуточные файлы SQLite
+Запускать: python migrate_columnar.py [--since 2024-01-01] [--backend partitioned]
+После переноса установите METRICS_BACKEND=columnar (или partitioned)
+"""
+
+import argparse
+import time
+from datetime import datetime
+from sqlalchemy import select
+from models.monitoring import db, SystemMetrics
+from storage.columnar_store import ColumnarMetricsStore
+from storage.partitioned_store import PartitionedMetricsStore
+from storage.metrics_store import METRIC_COLUMNS
+from app import app
+
+
+def migrate(store, since: datetime = None, chunk_size: int = 10000) -> int:
+    """Копирование строк system_metrics в хранилище порциями по возрастанию времени"""
+    table = SystemMetrics.__table__
+    columns = [table.c.timestamp] + [table.c[column] for column in METRIC_COLUMNS]
+
+    migrated = 0
+    last_timestamp, last_id = None, 0
+    started = time.time()
+
+    while True:
+        stmt = select(table.c.id, *columns)
+        if last_timestamp is not None:
+            # Постраничное чтение по (timestamp, id) без OFFSET
+            stmt = stmt.where(
+                (table.c.timestamp > last_timestamp) |
+                ((table.c.timestamp == last_timestamp) & (table.c.id > last_id))
+            )
+        elif since is not None:
+            stmt = stmt.where(table.c.timestamp >= since)
+        stmt = stmt.order_by(table.c.timestamp, table.c.id).limit(chunk_size)
+
+        rows = [dict(row._mapping) for row in db.session.execute(stmt)]
+        if not rows:
+            break
+
+        last_timestamp, last_id = rows[-1]['timestamp'], rows[-1]['id']
+        store.write_rows(rows)
+        migrated += len(rows)
+
+        rate = migrated / max(time.time() - started, 1e-6)
+        print(f"Перенесено {migrated} записей ({rate:.0f} строк/с)...")
+
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Перенос метрик в колоночное хранилище')
+    parser.add_argument('--since', help='Переносить данные начиная с даты (YYYY-MM-DD)')
+    parser.add_argument('--backend', choices=['columnar', 'partitioned'], default='columnar',
+                        help='Целевое хранилище')
+    parser.add_argument('--data-dir', help='Каталог хранилища (по умолчанию COLUMNAR_DATA_DIR '
+                                           'или PARTITIONED_DATA_DIR)')
+    args = parser.parse_args()
+
+    since = datetime.strptime(args.since, '%Y-%m-%d') if args.since else None
+
+    with app.app_context():
+        if args.backend == 'partitioned':
+            store = PartitionedMetricsStore(args.data_dir or app.config['PARTITIONED_DATA_DIR'])
+        else:
+            store = ColumnarMetricsStore(
+                args.data_dir or app.config['COLUMNAR_DATA_DIR'],
+                chunk_seconds=app.config['COLUMNAR_CHUNK_SECONDS'],
+                chunk_capacity=app.config['COLUMNAR_CHUNK_CAPACITY']
+            )
+
+        if store.count():
+            print("⚠️ Хранилище уже содержит данные, повторный перенос создаст дубликаты")
+            return
+
+        print(f"🚀 Перенос метрик в хранилище {args.backend}")
+        migrated = migrate(store, since)
+        if args.backend == 'columnar':
+            sealed = store.seal_completed()
+            print(f"✅ Перенесено {migrated} записей в {store.root} (сжато чанков: {sealed})")
+        else:
+            print(f"✅ Перенесено {migrated} записей в {store.root}")
+        print(f"🔄 Установите METRICS_BACKEND={args.backend} и перезапустите приложение")
+
+
+if __name__ == "__main__":
+    main()
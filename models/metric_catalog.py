@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Tuple
+
+
+class MetricInfo:
+    """Описание метрики: название для сообщений, единица, тип порога оповещений и группы использования"""
+
+    __slots__ = ('name', 'title', 'unit', 'alert_type', 'groups')
+
+    def __init__(self, name: str, title: str, unit: str = '', alert_type: Optional[str] = None,
+                 groups: Tuple[str, ...] = ()):
+        self.name = name
+        self.title = title
+        self.unit = unit
+        self.alert_type = alert_type  # metric_type в AlertSettings; None - порогов нет
+        # alerts - проверка порогов локального сервера, analysis - модели аномалий и трендов,
+        # profile - профиль метрик детектора, correlation - корреляционный анализ, chart - прореживание графиков
+        self.groups = groups
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'title': self.title,
+            'unit': self.unit,
+            'alert_type': self.alert_type,
+            'groups': list(self.groups)
+        }
+
+
+_ANALYZED = ('alerts', 'analysis', 'profile', 'correlation', 'chart')
+
+# Известные метрики: локальный сервер (колонки system_metrics), датчики и интерфейсы опрашиваемых устройств.
+# Метрики вне каталога записываются в серии так же, только без названия и единицы
+METRIC_CATALOG: Dict[str, MetricInfo] = {info.name: info for info in (
+    MetricInfo('cpu_percent', 'Загрузка процессора', '%', 'cpu', _ANALYZED),
+    MetricInfo('memory_percent', 'Использование памяти', '%', 'memory', _ANALYZED),
+    MetricInfo('memory_used_gb', 'Занято памяти', 'GB'),
+    MetricInfo('memory_total_gb', 'Объем памяти', 'GB'),
+    MetricInfo('disk_percent', 'Заполненность диска', '%', 'disk', _ANALYZED),
+    MetricInfo('disk_used_gb', 'Занято на диске', 'GB'),
+    MetricInfo('disk_total_gb', 'Объем диска', 'GB'),
+    MetricInfo('network_sent_mb', 'Отправлено по сети', 'MB', groups=('profile', 'correlation')),
+    MetricInfo('network_recv_mb', 'Получено по сети', 'MB', groups=('profile', 'correlation')),
+    MetricInfo('network_packets_sent', 'Отправлено пакетов'),
+    MetricInfo('network_packets_recv', 'Получено пакетов'),
+    MetricInfo('network_errors_in', 'Ошибки приема'),
+    MetricInfo('network_errors_out', 'Ошибки передачи'),
+    MetricInfo('temperature', 'Температура в ЦОД', '°C', 'temperature', _ANALYZED),
+    MetricInfo('humidity', 'Влажность в ЦОД', '%', 'humidity', _ANALYZED),
+    MetricInfo('pressure', 'Атмосферное давление', 'гПа', groups=('profile',)),
+    MetricInfo('uptime_seconds', 'Время работы', 's'),
+    MetricInfo('processes_count', 'Количество процессов', groups=('profile',)),
+
+    MetricInfo('temperature_c', 'Температура датчика', '°C'),
+    MetricInfo('fan_rpm', 'Обороты вентилятора', 'RPM'),
+    MetricInfo('fan_percent', 'Скорость вентилятора', '%'),
+    MetricInfo('power_watts', 'Потребляемая мощность', 'W'),
+    MetricInfo('energy_kwh', 'Потребленная энергия', 'kWh'),
+    MetricInfo('voltage', 'Напряжение', 'V'),
+    MetricInfo('current_a', 'Ток', 'A'),
+
+    MetricInfo('if_in_bps', 'Входящий трафик', 'bit/s'),
+    MetricInfo('if_out_bps', 'Исходящий трафик', 'bit/s'),
+    MetricInfo('if_in_pps', 'Входящие пакеты', 'pkt/s'),
+    MetricInfo('if_out_pps', 'Исходящие пакеты', 'pkt/s'),
+    MetricInfo('if_in_errors', 'Ошибки приема', 'err/s'),
+    MetricInfo('if_out_errors', 'Ошибки передачи', 'err/s'),
+    MetricInfo('if_in_discards', 'Отброшено при приеме', 'pkt/s'),
+    MetricInfo('if_out_discards', 'Отброшено при передаче', 'pkt/s'),
+    MetricInfo('if_in_util', 'Загрузка порта на прием', '%'),
+    MetricInfo('if_out_util', 'Загрузка порта на передачу', '%'),
+    MetricInfo('if_oper_status', 'Состояние порта')
+)}
+
+# Тип порога -> метрика локального сервера
+_BY_ALERT_TYPE = {info.alert_type: info for info in METRIC_CATALOG.values() if info.alert_type}
+
+
+def metrics_in_group(group: str) -> List[str]:
+    """Имена метрик группы в порядке каталога"""
+    return [name for name, info in METRIC_CATALOG.items() if group in info.groups]
+
+
+def metric_unit(metric: str) -> str:
+    info = METRIC_CATALOG.get(metric)
+    return info.unit if info else ''
+
+
+def alert_type_for(metric: str) -> str:
+    """Тип порога оповещений для метрики (для метрик вне каталога - ее имя)"""
+    info = METRIC_CATALOG.get(metric)
+    return info.alert_type if info and info.alert_type else metric
+
+
+def alert_metric(alert_type: str) -> Optional[MetricInfo]:
+    """Описание метрики по типу порога (cpu -> cpu_percent)"""
+    return _BY_ALERT_TYPE.get(alert_type) or METRIC_CATALOG.get(alert_type)
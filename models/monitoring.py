@@ -1,8 +1,71 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# Таблицы прежних версий, данные которых перенесены в другие таблицы
+DROPPED_TABLES = ('device_metrics',)  # Показания устройств хранятся сериями (samples)
+
+
+def configure_sqlite(engine):
+    """Режим WAL для SQLite: чтение API не блокируется пакетной записью метрик"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Для новой базы: освободившиеся страницы возвращаются через incremental_vacuum
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    # Соединения, открытые до регистрации обработчика, не получили настройки
+    engine.dispose()
+
+
+def upgrade_schema(engine):
+    """Добавление колонок, появившихся в моделях после создания таблиц (create_all их не добавляет),
+    перенос значений серий в компактную таблицу и удаление таблиц, которые больше не используются"""
+    inspector = inspect(engine)
+    if inspector.has_table('samples') and 'id' in {column['name'] for column in inspector.get_columns('samples')}:
+        with engine.begin() as connection:
+            upgrade_samples(connection)
+        inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for name in DROPPED_TABLES:
+            if inspector.has_table(name):
+                connection.execute(text(f'DROP TABLE {name}'))
+                print(f"🔧 Удалена неиспользуемая таблица {name}")
+
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"🔧 Добавлена колонка {table.name}.{column.name}")
+
+
+def upgrade_samples(connection):
+    """Перенос значений серий из прежней таблицы (id, DateTime, два индекса) в компактную без rowid"""
+    connection.execute(text('ALTER TABLE samples RENAME TO samples_legacy'))
+    Sample.__table__.create(connection)
+    # Повторы (серия, секунда) после округления до секунд схлопываются в последнее значение
+    moved = connection.execute(text(
+        "INSERT OR REPLACE INTO samples (series_id, ts, value) "
+        "SELECT series_id, CAST(strftime('%s', timestamp) AS INTEGER), value FROM samples_legacy ORDER BY id"
+    )).rowcount
+    connection.execute(text('DROP TABLE samples_legacy'))
+    print(f"🔧 Значения серий перенесены в компактную таблицу samples: {moved}")
+
 
 class SystemMetrics(db.Model):
     """Модель для хранения системных метрик"""
@@ -75,15 +138,133 @@ class AlertLog(db.Model):
     value = db.Column(db.Float)
     threshold = db.Column(db.Float)
     resolved = db.Column(db.Boolean, default=False)
+    host = db.Column(db.String(100))  # Источник метрики (NULL - локальный сервер)
+    escalated_at = db.Column(db.DateTime)  # Время эскалации (NULL - не эскалирован)
 
     def to_dict(self):
         return {
             'id': self.id,
             'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
             'alert_type': self.alert_type,
+            'host': self.host,
             'severity': self.severity,
             'message': self.message,
             'value': self.value,
             'threshold': self.threshold,
-            'resolved': self.resolved
-        }
\ No newline at end of file
+            'resolved': self.resolved,
+            'escalated_at': self.escalated_at.strftime('%Y-%m-%d %H:%M:%S') if self.escalated_at else None
+        }
+
+class NotificationDeadLetter(db.Model):
+    """Уведомления, не доставленные после всех попыток"""
+    __tablename__ = 'notification_dead_letters'
+
+    id = db.Column(db.Integer, primary_key=True)
+    failed_at = db.Column(db.DateTime, default=datetime.now, index=True)
+    enqueued_at = db.Column(db.DateTime)
+    channel = db.Column(db.String(50))  # email и т.п.
+    alert_id = db.Column(db.Integer)
+    payload = db.Column(db.Text)  # JSON данных уведомления
+    attempts = db.Column(db.Integer)
+    last_error = db.Column(db.Text)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'failed_at': self.failed_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'enqueued_at': self.enqueued_at.strftime('%Y-%m-%d %H:%M:%S') if self.enqueued_at else None,
+            'channel': self.channel,
+            'alert_id': self.alert_id,
+            'payload': self.payload,
+            'attempts': self.attempts,
+            'last_error': self.last_error
+        }
+
+
+class MetricRollup(db.Model):
+    """Модель агрегатов метрик по интервалам (1 мин, 5 мин, 1 час)"""
+    __tablename__ = 'metric_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.Integer, nullable=False)  # длина интервала, секунд
+    bucket = db.Column(db.DateTime, nullable=False)  # начало интервала
+    metric = db.Column(db.String(50), nullable=False)
+
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    avg_value = db.Column(db.Float)
+    count = db.Column(db.Integer, default=0)
+    last_value = db.Column(db.Float)
+    last_timestamp = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('resolution', 'metric', 'bucket', name='uq_metric_rollup_bucket'),
+    )
+
+    def to_dict(self):
+        return {
+            'resolution': self.resolution,
+            'bucket': self.bucket.strftime('%Y-%m-%d %H:%M:%S'),
+            'metric': self.metric,
+            'min': self.min_value,
+            'max': self.max_value,
+            'avg': self.avg_value,
+            'count': self.count,
+            'last': self.last_value
+        }
+
+
+class LabelPair(db.Model):
+    """Интернированная пара метки name=value: серии ссылаются на пару по идентификатору"""
+    __tablename__ = 'label_pairs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)  # host, rack, room, interface, sensor, ...
+    value = db.Column(db.String(200), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('name', 'value', name='uq_label_pair'),
+    )
+
+
+class Series(db.Model):
+    """Временной ряд: метрика и набор меток (устройство, стойка, зал, интерфейс, ...)"""
+    __tablename__ = 'series'
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(100), nullable=False)
+    unit = db.Column(db.String(20))
+    labels = db.Column(db.String(500), nullable=False, default='')  # пары name=value по алфавиту через запятую
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'labels', name='uq_series_metric_labels'),
+    )
+
+
+class SeriesLabel(db.Model):
+    """Связь серии с парами меток; индекс по паре - выборка серий по значению метки"""
+    __tablename__ = 'series_labels'
+
+    series_id = db.Column(db.Integer, db.ForeignKey('series.id'), primary_key=True)
+    label_id = db.Column(db.Integer, db.ForeignKey('label_pairs.id'), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_series_labels_label', 'label_id', 'series_id'),
+    )
+
+
+class Sample(db.Model):
+    """Значения серий: одна строка - (серия, время, значение)
+
+    Таблица без rowid: строки лежат прямо в B-дереве первичного ключа (серия, время), время - целые
+    секунды от эпохи (локальное время), поэтому строка занимает десятки байт, а выборка и удаление
+    диапазона серии идут по ключу без дополнительных индексов.
+    """
+    __tablename__ = 'samples'
+
+    series_id = db.Column(db.Integer, db.ForeignKey('series.id'), primary_key=True, autoincrement=False)
+    ts = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    value = db.Column(db.Float)
+
+    __table_args__ = {'sqlite_with_rowid': False}
@@ -0,0 +1,31 @@
+"""
+Процесс фоновых служб мониторинга ЦОД: сбор метрик, оповещения, эскалация, очистка и аналитика
+Запускать: python scheduler.py, веб-процессы: BACKGROUND_SERVICES=off gunicorn 'app:create_app()' (gunicorn.conf.py)
+Второй экземпляр ждет освобождения блокировки лидера и подхватывает работу при остановке первого.
+"""
+
+import time
+from app import init_database, leader_lock, start_background_services
+
+
+def main():
+    init_database()
+
+    if not leader_lock.acquire():
+        print(f"⏳ Лидер уже работает ({leader_lock.holder()}), ожидание освобождения блокировки...")
+        leader_lock.acquire(blocking=True)
+
+    print("👑 Процесс выбран лидером фоновых служб")
+    start_background_services()
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("🛑 Остановка фоновых служб")
+    finally:
+        leader_lock.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,12 +10,19 @@ from models.settings import AlertSettings, NotificationSettings
 from models.users import User, AuditLog, SystemSettings, db
 import sqlite3
 from sqlalchemy import text
+from services.alert_state import ThresholdSnapshot
+from services.retention_service import RetentionService
+from storage.metrics_store import SqlMetricsStore
 
 
 class AdminService:
     """Сервис администрирования системы"""
 
-    def __init__(self):
+    def __init__(self, metrics_store=None, retention_service: RetentionService = None,
+                 alert_thresholds: ThresholdSnapshot = None):
+        self.metrics_store = metrics_store or SqlMetricsStore()  # Хранилище сырых метрик
+        self.retention_service = retention_service or RetentionService(self.metrics_store)
+        self.alert_thresholds = alert_thresholds  # Снимок порогов, сбрасываемый после импорта настроек
         self.backup_dir = 'backups'
         if not os.path.exists(self.backup_dir):
             os.makedirs(self.backup_dir)
@@ -131,6 +138,8 @@ class AdminService:
                         result['errors'].append(f"Ошибка импорта системных настроек: {e}")
 
             db.session.commit()
+            if self.alert_thresholds is not None:
+                self.alert_thresholds.invalidate()
             self.log_action('import_configuration', 'system',
                             f"Импорт конфигурации: {len(result['imported'])} элементов", user_id)
 
@@ -218,7 +227,7 @@ class AdminService:
 
             # Статистика базы данных
             stats['database'] = {
-                'total_metrics': SystemMetrics.query.count(),
+                'total_metrics': self.metrics_store.count(),
                 'total_alerts': AlertLog.query.count(),
                 'active_alerts': AlertLog.query.filter_by(resolved=False).count(),
                 'total_users': User.query.count(),
@@ -228,7 +237,7 @@ class AdminService:
             # Статистика за последние 24 часа
             last_24h = datetime.now() - timedelta(hours=24)
             stats['last_24h'] = {
-                'metrics_collected': SystemMetrics.query.filter(SystemMetrics.timestamp >= last_24h).count(),
+                'metrics_collected': self.metrics_store.count(since=last_24h),
                 'alerts_generated': AlertLog.query.filter(AlertLog.timestamp >= last_24h).count(),
                 'user_logins': AuditLog.query.filter(
                     AuditLog.timestamp >= last_24h,
@@ -258,33 +267,27 @@ class AdminService:
         try:
             cutoff_date = datetime.now() - timedelta(days=retention_days)
 
-            # Очистка старых метрик
-            old_metrics = SystemMetrics.query.filter(SystemMetrics.timestamp < cutoff_date)
-            metrics_count = old_metrics.count()
-            old_metrics.delete()
+            # Очистка старых метрик и агрегатов
+            dropped = self.retention_service.drop_metrics(cutoff_date)
 
             # Очистка старых логов аудита
-            old_audit_logs = AuditLog.query.filter(AuditLog.timestamp < cutoff_date)
-            audit_count = old_audit_logs.count()
-            old_audit_logs.delete()
+            audit_count = self.retention_service.delete_audit_logs(cutoff_date)
 
             # Очистка разрешенных оповещений старше 7 дней
             alert_cutoff = datetime.now() - timedelta(days=7)
-            old_alerts = AlertLog.query.filter(
-                AlertLog.timestamp < alert_cutoff,
-                AlertLog.resolved == True
-            )
-            alerts_count = old_alerts.count()
-            old_alerts.delete()
+            alerts_count = self.retention_service.delete_alerts(alert_cutoff, resolved_only=True)
 
-            db.session.commit()
+            freed_pages = self.retention_service.incremental_vacuum()
 
             return {
                 'success': True,
                 'cleaned': {
-                    'metrics': metrics_count,
+                    'metrics': dropped['metrics'],
+                    'rollups': dropped['rollups'],
+                    'samples': dropped['samples'],
                     'audit_logs': audit_count,
-                    'resolved_alerts': alerts_count
+                    'resolved_alerts': alerts_count,
+                    'freed_pages': freed_pages
                 }
             }
 
@@ -317,7 +320,7 @@ class AdminService:
 
             # Проверка количества данных
             try:
-                metrics_count = SystemMetrics.query.count()
+                metrics_count = self.metrics_store.count()
                 if metrics_count > 0:
                     health_checks.append({
                         'name': 'Данные метрик',
@@ -409,9 +412,7 @@ class AdminService:
             # Проверка работы фоновых процессов (упрощенная)
             try:
                 from datetime import datetime, timedelta
-                recent_data = SystemMetrics.query.filter(
-                    SystemMetrics.timestamp >= datetime.utcnow() - timedelta(minutes=5)
-                ).count()
+                recent_data = self.metrics_store.count(since=datetime.utcnow() - timedelta(minutes=5))
 
                 if recent_data > 0:
                     health_checks.append({
@@ -421,9 +422,9 @@ class AdminService:
                     })
                 else:
                     # Проверяем последнюю запись
-                    last_record = SystemMetrics.query.order_by(SystemMetrics.timestamp.desc()).first()
-                    if last_record:
-                        time_diff = datetime.utcnow() - last_record.timestamp
+                    last_timestamp = self.metrics_store.last_timestamp()
+                    if last_timestamp:
+                        time_diff = datetime.utcnow() - last_timestamp
                         minutes_ago = int(time_diff.total_seconds() / 60)
                         health_checks.append({
                             'name': 'Сбор данных',
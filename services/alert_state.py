@@ -0,0 +1,115 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func, select
+from models.monitoring import db, AlertLog
+from models.settings import AlertSettings
+
+
+class ThresholdSnapshot:
+    """Снимок порогов оповещений в памяти процесса; сбрасывается при сохранении настроек"""
+
+    def __init__(self):
+        self.settings = None  # metric_type -> пороги; None - снимок не загружен
+        self.lock = threading.Lock()
+        self.loaded_at = None
+
+    def get(self) -> Dict[str, Dict]:
+        """Пороги по типу метрики (загружаются одним запросом при первом обращении)"""
+        settings = self.settings
+        if settings is not None:
+            return settings
+
+        with self.lock:
+            if self.settings is None:
+                # Простые словари вместо объектов ORM: снимок читают разные потоки и сессии
+                self.settings = {
+                    setting.metric_type: {
+                        'warning': setting.warning_threshold,
+                        'critical': setting.critical_threshold,
+                        'email_enabled': setting.email_enabled,
+                        'escalation_minutes': setting.escalation_minutes
+                    }
+                    for setting in AlertSettings.query.all()
+                }
+                self.loaded_at = datetime.now()
+            return self.settings
+
+    def invalidate(self):
+        """Сброс снимка: следующее обращение перечитает настройки"""
+        with self.lock:
+            self.settings = None
+
+    def classify(self, metric_type: str, value: float) -> Tuple[Optional[str], Optional[float]]:
+        """Уровень оповещения и сработавший порог (None, None - в пределах нормы)"""
+        setting = self.get().get(metric_type)
+        if not setting:
+            return None, None
+        if value >= setting['critical']:
+            return 'critical', setting['critical']
+        if value >= setting['warning']:
+            return 'warning', setting['warning']
+        return None, None
+
+    def status_color(self, metric_type: str, value: float) -> str:
+        """Цвет статуса метрики по порогам"""
+        severity, _ = self.classify(metric_type, value)
+        return {'critical': 'danger', 'warning': 'warning'}.get(severity, 'success')
+
+
+class OpenIncidentIndex:
+    """Индекс открытых инцидентов в памяти: последний неразрешенный по (метрика, уровень, хост)"""
+
+    def __init__(self, cooldown_minutes: float = 5):
+        self.cooldown = timedelta(minutes=cooldown_minutes)  # Окно подавления повторных оповещений
+        self.incidents = None  # (alert_type, severity, host) -> (id, timestamp)
+        self.lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self.incidents is not None:
+            return
+
+        table = AlertLog.__table__
+        stmt = select(
+            table.c.alert_type, table.c.severity, table.c.host, func.max(table.c.id), func.max(table.c.timestamp)
+        ).where(table.c.resolved == False).group_by(table.c.alert_type, table.c.severity, table.c.host)
+
+        self.incidents = {
+            (alert_type, severity, host): (alert_id, timestamp)
+            for alert_type, severity, host, alert_id, timestamp in db.session.execute(stmt)
+        }
+
+    def has_recent(self, alert_type: str, severity: str, host: Optional[str] = None,
+                   now: Optional[datetime] = None) -> bool:
+        """Есть ли открытый инцидент, созданный в пределах окна подавления"""
+        now = now or datetime.utcnow()
+        with self.lock:
+            self._ensure_loaded()
+            incident = self.incidents.get((alert_type, severity, host))
+        return incident is not None and incident[1] >= now - self.cooldown
+
+    def add(self, alert: AlertLog):
+        """Учет нового инцидента"""
+        with self.lock:
+            self._ensure_loaded()
+            self.incidents[(alert.alert_type, alert.severity, alert.host)] = (alert.id, alert.timestamp)
+
+    def resolve(self, alert: AlertLog):
+        """Исключение разрешенного инцидента"""
+        with self.lock:
+            self._ensure_loaded()
+            key = (alert.alert_type, alert.severity, alert.host)
+            incident = self.incidents.get(key)
+            if incident is not None and incident[0] == alert.id:
+                del self.incidents[key]
+
+    def reset(self):
+        """Сброс индекса: следующее обращение перечитает открытые инциденты из базы"""
+        with self.lock:
+            self.incidents = None
+
+    def get_open(self) -> Dict[Tuple, Tuple]:
+        """Копия индекса открытых инцидентов"""
+        with self.lock:
+            self._ensure_loaded()
+            return dict(self.incidents)
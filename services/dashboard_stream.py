@@ -0,0 +1,139 @@
+import hashlib
+import json
+import threading
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+# Поля текущих метрик, не нужные панели (объект datetime дублирует timestamp)
+SKIPPED_METRIC_FIELDS = ('datetime',)
+
+
+def serialize(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def format_event(event: str, seq: int, data: Dict, payload: Optional[str] = None) -> bytes:
+    """Сообщение Server-Sent Events, сериализованное один раз для всех подписчиков"""
+    if payload is None:
+        payload = serialize(data)
+    return f"id: {seq}\nevent: {event}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class DashboardBroadcaster:
+    """Поток обновлений панели: цикл мониторинга публикует изменения, подписчики получают готовые байты"""
+
+    def __init__(self, buffer_size: int = 64, heartbeat: float = 15.0):
+        self.seq = 0
+        self.state = {'metrics': {}, 'status': {}, 'alerts': [], 'history': {}}
+        self.messages = deque(maxlen=buffer_size)  # (seq, байты) для продолжения после переподключения
+        self.snapshot_cache = None  # (seq, байты) полного состояния для новых подписчиков
+        self.body_cache = {}  # с историей или без -> (seq, JSON состояния, он же в байтах, ETag)
+        self.heartbeat = heartbeat  # Секунд между комментариями-пингами, чтобы прокси не закрывали соединение
+        self.condition = threading.Condition()
+        self.subscribers = 0
+        self.stats = {'published': 0, 'bytes_published': 0, 'snapshots_built': 0, 'bodies_built': 0}
+
+    def publish(self, metrics: Dict, status: Dict, history: Dict, alerts: List[Dict], seq: Optional[int] = None):
+        """Публикация цикла мониторинга: в сообщение попадают только изменившиеся значения
+
+        seq - номер цикла процесса фоновых служб: с ним номера событий совпадают во всех
+        веб-процессах, и Last-Event-ID действителен при переподключении к другому процессу.
+        """
+        metrics = {key: value for key, value in metrics.items() if key not in SKIPPED_METRIC_FIELDS}
+        history = {key: list(values) for key, values in history.items()}
+
+        with self.condition:
+            delta = {}
+            changed = {key: value for key, value in metrics.items() if self.state['metrics'].get(key) != value}
+            if changed:
+                delta['metrics'] = changed
+            changed = {key: value for key, value in status.items() if self.state['status'].get(key) != value}
+            if changed:
+                delta['status'] = changed
+            if alerts != self.state['alerts']:
+                delta['alerts'] = alerts
+
+            # Новая точка истории добавляется к графикам на клиенте вместо пересылки всего окна
+            timestamps = history.get('timestamps') or []
+            if timestamps and timestamps[-1] != (self.state['history'].get('timestamps') or [None])[-1]:
+                delta['point'] = {key: values[-1] for key, values in history.items() if values}
+
+            self.state = {'metrics': metrics, 'status': status, 'alerts': alerts, 'history': history}
+            if not delta:
+                return
+
+            self.seq = seq if seq is not None and seq > self.seq else self.seq + 1
+            message = format_event('delta', self.seq, delta)
+            self.messages.append((self.seq, message))
+            self.stats['published'] += 1
+            self.stats['bytes_published'] += len(message)
+            self.condition.notify_all()
+
+    def _state_body(self, include_history: bool = True) -> tuple:
+        """JSON состояния и его ETag; каждый вариант сериализуется не чаще раза за цикл"""
+        cached = self.body_cache.get(include_history)
+        if cached is None or cached[0] != self.seq:
+            state = self.state if include_history else {k: v for k, v in self.state.items() if k != 'history'}
+            payload = serialize(state)
+            body = payload.encode('utf-8')
+            # Сильный ETag по содержимому: совпадает между перезапусками при тех же данных
+            etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+            cached = self.body_cache[include_history] = (self.seq, payload, body, etag)
+            self.stats['bodies_built'] += 1
+        return cached
+
+    def _snapshot(self) -> bytes:
+        """Полное состояние для нового подписчика; строится не чаще раза за цикл"""
+        if self.snapshot_cache is None or self.snapshot_cache[0] != self.seq:
+            seq, payload, _, _ = self._state_body()
+            self.snapshot_cache = (seq, format_event('snapshot', seq, self.state, payload))
+            self.stats['snapshots_built'] += 1
+        return self.snapshot_cache[1]
+
+    def snapshot_body(self, include_history: bool = True) -> tuple:
+        """(ETag, байты JSON) состояния панели для /api/dashboard/snapshot"""
+        with self.condition:
+            _, _, body, etag = self._state_body(include_history)
+            return etag, body
+
+    def _backlog(self, last_seq: Optional[int]) -> List[bytes]:
+        """Сообщения после last_seq; если их уже нет в буфере - полный снимок"""
+        if last_seq is not None and last_seq <= self.seq and (
+                last_seq == self.seq or (self.messages and self.messages[0][0] <= last_seq + 1)):
+            return [message for seq, message in self.messages if seq > last_seq]
+        return [self._snapshot()]
+
+    def stream(self, last_event_id: Optional[str] = None) -> Iterator[bytes]:
+        """Генератор ответа text/event-stream для одного подписчика"""
+        try:
+            last_seq = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_seq = None
+
+        with self.condition:
+            self.subscribers += 1
+            pending = self._backlog(last_seq)
+            last_seq = self.seq
+
+        try:
+            # Клиент переподключается через 3 секунды после обрыва
+            yield b'retry: 3000\n\n'
+            while True:
+                for message in pending:
+                    yield message
+
+                with self.condition:
+                    if self.seq == last_seq:
+                        self.condition.wait(timeout=self.heartbeat)
+                    pending = self._backlog(last_seq)
+                    last_seq = self.seq
+
+                if not pending:
+                    yield b': ping\n\n'
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+
+    def get_stats(self) -> Dict:
+        with self.condition:
+            return {'subscribers': self.subscribers, 'seq': self.seq, **self.stats}
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+# Методы прореживания длинных рядов для графиков
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Номера точек, отобранных Largest-Triangle-Three-Buckets (первая и последняя всегда входят)
+
+    Выбор точки внутри корзины и средние корзин считаются векторно; переход между корзинами
+    последователен по определению алгоритма (треугольник строится от уже выбранной точки).
+    """
+    n = len(x)
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1])[:max(threshold, 0)]
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Внутренние точки делятся на threshold - 2 корзины почти равного размера
+    buckets = threshold - 2
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Средние всех корзин одной операцией через накопленные суммы; для последней - последняя точка
+    sum_x = np.concatenate([[0.0], np.cumsum(x)])
+    sum_y = np.concatenate([[0.0], np.cumsum(y)])
+    sizes = ends - starts
+    next_x = np.append(((sum_x[ends] - sum_x[starts]) / sizes)[1:], x[-1])
+    next_y = np.append(((sum_y[ends] - sum_y[starts]) / sizes)[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for bucket in range(buckets):
+        lo, hi = starts[bucket], ends[bucket]
+        ax, ay = x[anchor], y[anchor]
+        # Удвоенная площадь треугольника (выбранная точка, кандидат, среднее следующей корзины)
+        area = np.abs((ax - next_x[bucket]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[bucket] - ay))
+        anchor = lo + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+    return selected
+
+
+def envelope_index(size: int, buckets: int) -> np.ndarray:
+    """Номер выходного интервала для каждой из size точек при равном делении на buckets"""
+    return np.arange(size, dtype=np.int64) * buckets // size
+
+
+def downsample_columns(x: np.ndarray, columns: Dict[str, np.ndarray], points: int,
+                       guide: Optional[Iterable[str]] = None) -> np.ndarray:
+    """Общие номера точек для нескольких рядов с одной осью времени: объединение LTTB по каждому ряду
+
+    Бюджет points делится между рядами guide (по умолчанию все), поэтому объединение не длиннее points
+    и урезать его не нужно. Пропуски (NaN) в выборе не участвуют: крайними становятся первая и последняя
+    точки ряда со значением.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if len(x) <= points:
+        return np.arange(len(x))
+
+    # Точки со значением по каждому ряду; ряды без значений бюджет не получают
+    guide = [name for name in (guide or columns) if name in columns]
+    valid = {name: np.flatnonzero(~np.isnan(np.asarray(columns[name], dtype=np.float64))) for name in guide}
+    guide = [name for name in guide if len(valid[name])]
+
+    selected = [np.empty(0, dtype=np.int64)]
+    for position, name in enumerate(guide):
+        # Остаток деления достается первым рядам: сумма бюджетов равна points
+        budget = points // len(guide) + (1 if position < points % len(guide) else 0)
+        if budget:
+            rows = valid[name]
+            values = np.asarray(columns[name], dtype=np.float64)[rows]
+            selected.append(rows[lttb_indices(x[rows], values, budget)])
+
+    return np.unique(np.concatenate(selected))
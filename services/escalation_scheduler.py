@@ -0,0 +1,210 @@
+import atexit
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import select, update
+from models.monitoring import db, AlertLog
+from services.alert_state import ThresholdSnapshot
+
+# Время AlertLog хранится в UTC без часового пояса
+EPOCH = datetime(1970, 1, 1)
+RETRY_SECONDS = 60  # Повтор эскалации, уведомление которой не удалось поставить в отправку
+
+
+class EscalationScheduler:
+    """Эскалация критических инцидентов по куче сроков: поток спит до ближайшего срока, без обхода инцидентов"""
+
+    def __init__(self, app, notification_service, thresholds: ThresholdSnapshot = None):
+        self.app = app
+        self.notification_service = notification_service
+        self.thresholds = thresholds or ThresholdSnapshot()  # Источник escalation_minutes
+        self.heap = []  # (срок, номер, alert_id); отмененные записи удаляются лениво
+        self.deadlines = {}  # alert_id -> действующий срок
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {'scheduled': 0, 'cancelled': 0, 'escalated': 0, 'retried': 0, 'skipped': 0,
+                      'last_lag_ms': 0.0, 'max_lag_ms': 0.0}
+
+    def start(self):
+        """Загрузка открытых неэскалированных инцидентов и запуск потока"""
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.reload()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def reload(self):
+        """Пересчет сроков по базе (при запуске и после изменения escalation_minutes)"""
+        table = AlertLog.__table__
+        stmt = select(table.c.id, table.c.alert_type, table.c.timestamp).where(
+            table.c.severity == 'critical',
+            table.c.resolved == False,
+            table.c.escalated_at.is_(None)
+        )
+
+        with self.app.app_context():
+            rows = db.session.execute(stmt).all()
+            with self.condition:
+                self.heap.clear()
+                self.deadlines.clear()
+                for alert_id, alert_type, timestamp in rows:
+                    self._push(alert_id, alert_type, timestamp)
+                self.condition.notify()
+
+        if rows:
+            print(f"⏰ Запланирована эскалация {len(rows)} открытых критических инцидентов")
+
+    def _deadline(self, alert_type: str, timestamp: datetime) -> Optional[float]:
+        setting = self.thresholds.get().get(alert_type)
+        if not setting or timestamp is None:
+            return None
+        return (timestamp - EPOCH).total_seconds() + setting['escalation_minutes'] * 60
+
+    def _push(self, alert_id: int, alert_type: str, timestamp: datetime):
+        deadline = self._deadline(alert_type, timestamp)
+        if deadline is None:
+            return
+        self.deadlines[alert_id] = deadline
+        heapq.heappush(self.heap, (deadline, next(self.sequence), alert_id))
+        self.stats['scheduled'] += 1
+
+    def schedule(self, alert: AlertLog):
+        """Постановка срока эскалации нового инцидента, O(log n)"""
+        if alert.severity != 'critical' or alert.escalated_at is not None:
+            return
+        with self.condition:
+            self._push(alert.id, alert.alert_type, alert.timestamp)
+            # Новый срок мог оказаться ближайшим - поток пересчитывает время сна
+            self.condition.notify()
+
+    def cancel(self, alert_id: int):
+        """Отмена эскалации разрешенного инцидента; запись в куче станет недействительной"""
+        with self.condition:
+            if self.deadlines.pop(alert_id, None) is not None:
+                self.stats['cancelled'] += 1
+            # Отмененных записей слишком много - перестраиваем кучу
+            if len(self.heap) > 2 * len(self.deadlines) + 64:
+                self.heap = [entry for entry in self.heap if self.deadlines.get(entry[2]) == entry[0]]
+                heapq.heapify(self.heap)
+
+    def _pop_due(self) -> Optional[tuple]:
+        """Наступивший срок под блокировкой или None (с ожиданием до ближайшего срока)"""
+        while self.heap:
+            deadline, _, alert_id = self.heap[0]
+            if self.deadlines.get(alert_id) != deadline:
+                heapq.heappop(self.heap)
+                continue
+
+            delay = deadline - time.time()
+            if delay > 0:
+                self.condition.wait(timeout=delay)
+                return None
+
+            heapq.heappop(self.heap)
+            del self.deadlines[alert_id]
+            return alert_id, deadline
+
+        self.condition.wait(timeout=60)
+        return None
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                due = self._pop_due()
+            if due is None:
+                continue
+
+            alert_id, deadline = due
+            lag_ms = max(time.time() - deadline, 0.0) * 1000
+            try:
+                # Сессия откатывается и закрывается при выходе из контекста приложения
+                with self.app.app_context():
+                    escalated = self._escalate(alert_id)
+            except Exception as e:
+                print(f"Ошибка эскалации инцидента #{alert_id}: {e}")
+                self._retry(alert_id)
+                continue
+            if not escalated:
+                continue
+
+            with self.condition:
+                self.stats['escalated'] += 1
+                self.stats['last_lag_ms'] = round(lag_ms, 1)
+                self.stats['max_lag_ms'] = round(max(self.stats['max_lag_ms'], lag_ms), 1)
+
+    def _retry(self, alert_id: int):
+        """Повторная постановка срока через RETRY_SECONDS (если срок не назначен заново)"""
+        with self.condition:
+            if alert_id not in self.deadlines:
+                self.deadlines[alert_id] = time.time() + RETRY_SECONDS
+                heapq.heappush(self.heap, (self.deadlines[alert_id], next(self.sequence), alert_id))
+                self.stats['retried'] += 1
+
+    def _escalate(self, alert_id: int) -> bool:
+        """Отметка эскалации в базе (один раз на инцидент) и отправка уведомления администраторам
+
+        Отметка ставится до отправки, чтобы инцидент не эскалировали два процесса, и снимается,
+        если уведомление не удалось поставить в отправку; срок тогда переносится на RETRY_SECONDS.
+        Без адресов администраторов отметка остается и повтора нет.
+        """
+        table = AlertLog.__table__
+        escalated_at = datetime.utcnow()
+        # Условное обновление: инцидент, разрешенный или эскалированный другим процессом, пропускается
+        result = db.session.execute(
+            update(table).where(
+                table.c.id == alert_id,
+                table.c.resolved == False,
+                table.c.escalated_at.is_(None)
+            ).values(escalated_at=escalated_at)
+        )
+        db.session.commit()
+        if result.rowcount == 0:
+            return False
+
+        alert = db.session.get(AlertLog, alert_id)
+        if not self.notification_service.escalation_recipients():
+            print(f"⚠️ Эскалация инцидента #{alert_id} без уведомления: не указаны адреса администраторов")
+            with self.condition:
+                self.stats['skipped'] += 1
+            return False
+
+        if self.notification_service.send_alert_email(alert, escalated=True):
+            print(f"Эскалация инцидента: {alert.message}")
+            return True
+
+        # Уведомление не ушло в отправку - снимаем отметку и повторяем позже
+        db.session.execute(
+            update(table).where(
+                table.c.id == alert_id,
+                table.c.escalated_at == escalated_at
+            ).values(escalated_at=None)
+        )
+        db.session.commit()
+        print(f"⚠️ Уведомление об эскалации инцидента #{alert_id} не отправлено, повтор через {RETRY_SECONDS} с")
+        self._retry(alert_id)
+        return False
+
+    def get_stats(self) -> Dict:
+        with self.condition:
+            pending = list(self.deadlines.values())
+            return {
+                'pending': len(pending),
+                'heap_size': len(self.heap),
+                'next_in_s': round(min(pending) - time.time(), 1) if pending else None,
+                **self.stats
+            }
@@ -0,0 +1,185 @@
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+from models.monitoring import db
+from storage.metrics_store import SqlMetricsStore
+
+
+class IngestBuffer:
+    """Буфер отложенной записи метрик: пакетная вставка по размеру или возрасту"""
+
+    def __init__(self, app=None, batch_size: int = 500, flush_interval: float = 2.0, max_queue: int = 100000,
+                 rollup_service=None, store=None):
+        self.app = app
+        self.store = store or SqlMetricsStore()  # Хранилище сырых строк
+        self.rollup_service = rollup_service  # Агрегаты обновляются в той же транзакции
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # Одновременно выполняется только один сброс
+        self.flush_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.max_attempts = 3  # Попыток записи пакета до отбрасывания
+        self.failed_attempts = 0
+
+        self.started_at = time.monotonic()
+        self.recent_flushes = deque(maxlen=600)  # (время, строк) для расчета скорости
+        self.stats = {
+            'rows_enqueued': 0,
+            'rows_written': 0,
+            'rows_dropped': 0,
+            'flush_count': 0,
+            'flush_errors': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+            'last_error': None
+        }
+
+    def start(self):
+        """Запуск фонового потока сброса"""
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        # При завершении процесса дописываем все, что осталось в очереди
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0):
+        """Остановка с дозаписью очереди"""
+        self.stop_event.set()
+        self.flush_event.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        self.flush()
+
+    def submit(self, row: Dict):
+        """Постановка строки в очередь на запись"""
+        self.submit_many([row])
+
+    def submit_many(self, rows: List[Dict]):
+        """Постановка нескольких строк в очередь на запись"""
+        with self.lock:
+            self.queue.extend(rows)
+            self.stats['rows_enqueued'] += len(rows)
+            self._trim_overflow()
+            queue_depth = len(self.queue)
+
+        if queue_depth >= self.batch_size:
+            self.flush_event.set()
+
+    def _trim_overflow(self):
+        """При переполнении отбрасываем самые старые строки, а не блокируем сборщик (под self.lock)"""
+        overflow = len(self.queue) - self.max_queue
+        for _ in range(max(0, overflow)):
+            self.queue.popleft()
+        if overflow > 0:
+            self.stats['rows_dropped'] += overflow
+
+    def flush(self) -> int:
+        """Запись всех накопленных строк пакетами, возвращает число записанных строк"""
+        written = 0
+        with self.flush_lock:
+            while True:
+                with self.lock:
+                    if not self.queue:
+                        break
+                    count = min(self.batch_size, len(self.queue))
+                    batch = [self.queue.popleft() for _ in range(count)]
+
+                if not self._write_batch(batch):
+                    self.failed_attempts += 1
+                    if self.failed_attempts >= self.max_attempts:
+                        # Пакет, который стабильно не записывается, не должен блокировать очередь
+                        self.stats['rows_dropped'] += len(batch)
+                        self.failed_attempts = 0
+                        continue
+
+                    # Возвращаем пакет в начало очереди до следующей попытки
+                    with self.lock:
+                        self.queue.extendleft(reversed(batch))
+                        self._trim_overflow()
+                    break
+
+                self.failed_attempts = 0
+                written += len(batch)
+
+        return written
+
+    def _write_batch(self, batch: List[Dict]) -> bool:
+        """Многострочная вставка одного пакета через Core insert (executemany)"""
+        started = time.perf_counter()
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    self._execute_insert(batch)
+            else:
+                self._execute_insert(batch)
+        except Exception as e:
+            self.stats['flush_errors'] += 1
+            self.stats['last_error'] = str(e)
+            print(f"Ошибка пакетной записи метрик: {e}")
+            return False
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats['flush_count'] += 1
+        self.stats['rows_written'] += len(batch)
+        self.stats['last_flush_ms'] = round(elapsed_ms, 2)
+        self.stats['max_flush_ms'] = round(max(self.stats['max_flush_ms'], elapsed_ms), 2)
+        self.stats['total_flush_ms'] += elapsed_ms
+        self.recent_flushes.append((time.monotonic(), len(batch)))
+        return True
+
+    def _execute_insert(self, batch: List[Dict]):
+        """Вставка в одной транзакции: один fsync на пакет вместо одного на строку"""
+        with db.engine.begin() as connection:
+            self.store.write_rows(batch, connection)
+            if self.rollup_service is not None:
+                self.rollup_service.apply(connection, batch)
+
+    def _worker(self):
+        """Фоновый поток: сброс по заполнению пакета или по истечении интервала"""
+        while not self.stop_event.is_set():
+            self.flush_event.wait(timeout=self.flush_interval)
+            self.flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Ошибка в потоке записи метрик: {e}")
+                time.sleep(1)
+
+    def get_stats(self) -> Dict:
+        """Счетчики буфера: глубина очереди, задержка сброса, строк в секунду"""
+        now = time.monotonic()
+        window = 60.0
+        recent_rows = sum(rows for moment, rows in self.recent_flushes if now - moment <= window)
+        elapsed = min(window, now - self.started_at) or 1.0
+
+        with self.lock:
+            queue_depth = len(self.queue)
+
+        flush_count = self.stats['flush_count']
+        return {
+            'queue_depth': queue_depth,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'rows_enqueued': self.stats['rows_enqueued'],
+            'rows_written': self.stats['rows_written'],
+            'rows_dropped': self.stats['rows_dropped'],
+            'flush_count': flush_count,
+            'flush_errors': self.stats['flush_errors'],
+            'last_flush_ms': self.stats['last_flush_ms'],
+            'max_flush_ms': self.stats['max_flush_ms'],
+            'avg_flush_ms': round(self.stats['total_flush_ms'] / flush_count, 2) if flush_count else 0.0,
+            'rows_per_second': round(recent_rows / elapsed, 2),
+            'last_error': self.stats['last_error']
+        }
@@ -0,0 +1,72 @@
+import fcntl
+import os
+import socket
+import time
+from typing import Dict, Optional
+
+
+class LeaderLock:
+    """Выбор единственного процесса фоновых служб по блокировке файла
+
+    Блокировку держит открытый дескриптор: при завершении или падении лидера ядро снимает ее,
+    и ожидающий резервный процесс становится лидером. Работает в пределах одного хоста,
+    как и общий файл SQLite.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.handle = None
+        self.acquired_at = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    @property
+    def is_leader(self) -> bool:
+        return self.handle is not None
+
+    def acquire(self, blocking: bool = False) -> bool:
+        """Захват лидерства; без blocking - одна попытка"""
+        if self.handle is not None:
+            return True
+
+        handle = open(self.path, 'a+')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+
+        # Кто лидер - для диагностики; сама блокировка от содержимого не зависит
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f"{socket.gethostname()} {os.getpid()} {time.time():.0f}\n")
+        handle.flush()
+
+        self.handle = handle
+        self.acquired_at = time.time()
+        return True
+
+    def release(self):
+        if self.handle is None:
+            return
+        try:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            self.handle.close()
+            self.handle = None
+
+    def holder(self) -> Optional[str]:
+        """Запись текущего лидера (хост, pid, время захвата)"""
+        try:
+            with open(self.path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def get_stats(self) -> Dict:
+        return {
+            'is_leader': self.is_leader,
+            'pid': os.getpid(),
+            'leader': self.holder(),
+            'leader_since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.acquired_at))
+            if self.acquired_at else None
+        }
@@ -0,0 +1,196 @@
+import atexit
+import smtplib
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from flask_mail import Message
+
+# Ошибки, после которых SMTP-сессию нужно открыть заново (SMTPException - подкласс OSError, поэтому не OSError)
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+class PooledMailTransport:
+    """Отправка писем через постоянные SMTP-сессии вместо соединения на каждое письмо"""
+
+    def __init__(self, mail, size: int = 2, idle_timeout: float = 60.0):
+        self.mail = mail
+        self.size = size  # Сессий, хранимых между отправками
+        self.idle_timeout = idle_timeout  # Секунд простоя до закрытия сессии
+        self.idle = deque()  # (соединение flask_mail, время последнего использования)
+        self.lock = threading.Lock()
+        self.stats = {'sent': 0, 'connections_opened': 0, 'reconnects': 0}
+        atexit.register(self.close)
+
+    def _open(self):
+        # Соединение flask_mail учитывает MAIL_USE_TLS/SSL, логин и MAIL_SUPPRESS_SEND
+        connection = self.mail.connect()
+        connection.__enter__()
+        with self.lock:
+            self.stats['connections_opened'] += 1
+        return connection
+
+    @staticmethod
+    def _quit(connection):
+        try:
+            connection.__exit__(None, None, None)
+        except Exception:
+            pass
+
+    def _acquire(self):
+        """Свободная сессия из пула или новая; сессии, простоявшие дольше idle_timeout, закрываются"""
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                connection, last_used = self.idle.pop()
+            if now - last_used < self.idle_timeout:
+                return connection
+            self._quit(connection)
+        return self._open()
+
+    def _release(self, connection):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append((connection, time.monotonic()))
+                return
+        self._quit(connection)
+
+    def send(self, message: Message):
+        """Отправка письма; при разрыве сессии - одна повторная попытка через новое соединение"""
+        connection = self._acquire()
+        try:
+            connection.send(message)
+        except RECONNECT_ERRORS:
+            # Сервер мог закрыть простаивающую сессию - повторяем через свежее соединение
+            self._quit(connection)
+            with self.lock:
+                self.stats['reconnects'] += 1
+            connection = self._open()
+            try:
+                connection.send(message)
+            except Exception:
+                self._quit(connection)
+                raise
+        except Exception:
+            self._quit(connection)
+            raise
+
+        self._release(connection)
+        with self.lock:
+            self.stats['sent'] += 1
+
+    def close(self):
+        """Закрытие всех сессий пула"""
+        with self.lock:
+            connections = [connection for connection, _ in self.idle]
+            self.idle.clear()
+        for connection in connections:
+            self._quit(connection)
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {'pool_size': self.size, 'idle_connections': len(self.idle), **self.stats}
+
+
+class DigestBatcher:
+    """Объединение писем одному списку получателей, пришедших в пределах окна, в один дайджест"""
+
+    def __init__(self, emit: Callable[[Dict], None], window_seconds: float = 60.0, max_items: int = 200):
+        self.emit = emit  # Отправка готового письма (например, постановка в очередь уведомлений)
+        self.window_seconds = window_seconds
+        self.max_items = max_items  # Писем в дайджесте до досрочной отправки
+        self.groups = {}  # (sender, recipients) -> {'deadline', 'items'}
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {'items_batched': 0, 'digests_sent': 0}
+
+    def start(self):
+        """Запуск потока отправки дайджестов по истечении окна"""
+        if self.thread and self.thread.is_alive():
+            return
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0):
+        """Остановка с отправкой накопленных дайджестов"""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        self.flush(force=True)
+
+    def add(self, payload: Dict):
+        """Добавление письма (subject, sender, recipients, body) в дайджест его получателей"""
+        key = (payload['sender'], tuple(sorted(payload['recipients'])))
+        with self.condition:
+            group = self.groups.get(key)
+            if group is None:
+                # Окно отсчитывается от первого письма группы
+                group = self.groups[key] = {'deadline': time.monotonic() + self.window_seconds, 'items': []}
+                self.condition.notify()
+            group['items'].append(payload)
+            self.stats['items_batched'] += 1
+            if len(group['items']) >= self.max_items:
+                group['deadline'] = 0
+                self.condition.notify()
+
+    def flush(self, force: bool = False) -> int:
+        """Отправка дайджестов, окно которых истекло (force - всех); возвращает число дайджестов"""
+        now = time.monotonic()
+        with self.condition:
+            due = [key for key, group in self.groups.items() if force or group['deadline'] <= now]
+            batches = [(key, self.groups.pop(key)['items']) for key in due]
+
+        for (sender, recipients), items in batches:
+            try:
+                self.emit(self.compose(sender, list(recipients), items))
+                with self.condition:
+                    self.stats['digests_sent'] += 1
+            except Exception as e:
+                print(f"Ошибка отправки дайджеста: {e}")
+        return len(batches)
+
+    @staticmethod
+    def compose(sender: str, recipients: List[str], items: List[Dict]) -> Dict:
+        """Письмо-дайджест; одно письмо передается без изменений"""
+        if len(items) == 1:
+            return items[0]
+
+        sections = '\n'.join(f"--- {item['subject']} ---\n{item['body'].strip()}\n" for item in items)
+        return {
+            'alert_ids': [item.get('alert_id') for item in items],
+            'subject': f"[ДАЙДЖЕСТ] Инцидентов в ЦОД: {len(items)}",
+            'sender': sender,
+            'recipients': recipients,
+            'body': f"Инциденты в системе мониторинга ЦОД за последние минуты ({len(items)}):\n\n{sections}"
+        }
+
+    def _next_deadline(self) -> Optional[float]:
+        return min((group['deadline'] for group in self.groups.values()), default=None)
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                deadline = self._next_deadline()
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is None or timeout > 0:
+                    self.condition.wait(timeout=1.0 if timeout is None else timeout)
+                    continue
+            self.flush()
+
+    def get_stats(self) -> Dict:
+        with self.condition:
+            pending = sum(len(group['items']) for group in self.groups.values())
+            return {
+                'window_seconds': self.window_seconds,
+                'pending_groups': len(self.groups),
+                'pending_items': pending,
+                **self.stats
+            }
@@ -0,0 +1,252 @@
+import atexit
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from models.monitoring import db, NotificationDeadLetter
+
+
+class NotificationJob:
+    """Уведомление в очереди: канал, данные для отправки и история попыток"""
+
+    __slots__ = ('channel', 'payload', 'enqueued_at', 'attempts', 'last_error')
+
+    def __init__(self, channel: str, payload: Dict):
+        self.channel = channel
+        self.payload = payload
+        self.enqueued_at = time.time()
+        self.attempts = 0
+        self.last_error = None
+
+
+class NotificationQueue:
+    """Очередь исходящих уведомлений: пул потоков, повторы с задержкой, лимиты каналов, dead-letter"""
+
+    def __init__(self, app=None, workers: int = 2, max_queue: int = 1000, max_attempts: int = 5,
+                 backoff_base: float = 5.0, backoff_max: float = 600.0):
+        self.app = app
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts  # Попыток до переноса в dead-letter
+        self.backoff_base = backoff_base  # Задержка перед первым повтором, секунд
+        self.backoff_max = backoff_max
+
+        self.handlers = {}  # channel -> функция отправки (исключение - неудача)
+        self.limits = {}  # channel -> одновременных отправок
+        self.ready = {}  # channel -> deque заданий, готовых к отправке
+        self.active = {}  # channel -> отправок в работе
+        self.delayed = []  # куча (время повтора, номер, задание)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.threads = []
+
+        self.latencies = deque(maxlen=500)  # Секунд от постановки в очередь до успешной отправки
+        self.stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'retries': 0,
+            'dead_lettered': 0,
+            'dropped': 0,
+            'last_error': None
+        }
+        self.channel_stats = {}
+
+    def register_channel(self, channel: str, handler: Callable[[Dict], None], concurrency: int = 1):
+        """Регистрация канала доставки с ограничением одновременных отправок"""
+        with self.condition:
+            self.handlers[channel] = handler
+            self.limits[channel] = max(1, concurrency)
+            self.ready.setdefault(channel, deque())
+            self.active.setdefault(channel, 0)
+            self.channel_stats.setdefault(channel, {'sent': 0, 'failed': 0, 'dead_lettered': 0})
+
+    def start(self):
+        """Запуск пула рабочих потоков"""
+        if any(thread.is_alive() for thread in self.threads):
+            return
+
+        self.stop_event.clear()
+        self.threads = [
+            threading.Thread(target=self._worker, name=f'notify-{index}', daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0):
+        """Остановка пула; неотправленные уведомления остаются в очереди процесса"""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        for thread in self.threads:
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def enqueue(self, channel: str, payload: Dict) -> bool:
+        """Постановка уведомления в очередь без ожидания отправки"""
+        with self.condition:
+            if channel not in self.handlers:
+                print(f"Неизвестный канал уведомлений: {channel}")
+                return False
+
+            if self._pending() >= self.max_queue:
+                # Переполнение: сборщик метрик не блокируется, новое уведомление отбрасывается
+                self.stats['dropped'] += 1
+                print(f"⚠️ Очередь уведомлений переполнена, уведомление {channel} отброшено")
+                return False
+
+            self.ready[channel].append(NotificationJob(channel, payload))
+            self.stats['enqueued'] += 1
+            self.condition.notify()
+        return True
+
+    def _pending(self) -> int:
+        return sum(len(jobs) for jobs in self.ready.values()) + len(self.delayed)
+
+    def _next_job(self) -> Optional[NotificationJob]:
+        """Выбор задания под блокировкой: сначала наступившие повторы, затем канал со свободным слотом"""
+        now = time.time()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, _, job = heapq.heappop(self.delayed)
+            self.ready[job.channel].append(job)
+
+        # Самое старое готовое задание среди каналов, не достигших лимита
+        candidates = [
+            channel for channel, jobs in self.ready.items()
+            if jobs and self.active[channel] < self.limits[channel]
+        ]
+        if not candidates:
+            return None
+
+        channel = min(candidates, key=lambda name: self.ready[name][0].enqueued_at)
+        self.active[channel] += 1
+        return self.ready[channel].popleft()
+
+    def _worker(self):
+        """Рабочий поток: ожидание задания, отправка, повтор или перенос в dead-letter"""
+        while not self.stop_event.is_set():
+            with self.condition:
+                job = self._next_job()
+                if job is None:
+                    timeout = self.delayed[0][0] - time.time() if self.delayed else None
+                    self.condition.wait(timeout=max(timeout, 0.01) if timeout is not None else 1.0)
+                    continue
+
+            try:
+                self._deliver(job)
+            finally:
+                with self.condition:
+                    self.active[job.channel] -= 1
+                    # Освободился слот канала - задание могут взять другие потоки
+                    self.condition.notify_all()
+
+    def _deliver(self, job: NotificationJob):
+        job.attempts += 1
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    self.handlers[job.channel](job.payload)
+            else:
+                self.handlers[job.channel](job.payload)
+        except Exception as e:
+            job.last_error = str(e)
+            self._on_failure(job)
+            return
+
+        with self.condition:
+            self.stats['sent'] += 1
+            self.channel_stats[job.channel]['sent'] += 1
+            self.latencies.append(time.time() - job.enqueued_at)
+
+    def _on_failure(self, job: NotificationJob):
+        """Повтор с экспоненциальной задержкой или перенос в dead-letter после max_attempts"""
+        with self.condition:
+            self.stats['last_error'] = job.last_error
+            self.channel_stats[job.channel]['failed'] += 1
+
+            if job.attempts < self.max_attempts:
+                # Случайный разброс, чтобы повторы разных уведомлений не приходили на сервер одновременно
+                delay = min(self.backoff_base * 2 ** (job.attempts - 1), self.backoff_max)
+                delay *= random.uniform(0.8, 1.2)
+                heapq.heappush(self.delayed, (time.time() + delay, next(self.sequence), job))
+                self.stats['retries'] += 1
+                print(f"⚠️ Ошибка отправки уведомления {job.channel} (попытка {job.attempts}), "
+                      f"повтор через {delay:.0f} с: {job.last_error}")
+                return
+
+            self.stats['dead_lettered'] += 1
+            self.channel_stats[job.channel]['dead_lettered'] += 1
+
+        print(f"❌ Уведомление {job.channel} не отправлено за {job.attempts} попыток: {job.last_error}")
+        self._save_dead_letter(job)
+
+    def _save_dead_letter(self, job: NotificationJob):
+        try:
+            row = {
+                'channel': job.channel,
+                'payload': json.dumps(job.payload, ensure_ascii=False, default=str),
+                'attempts': job.attempts,
+                'last_error': job.last_error,
+                'alert_id': job.payload.get('alert_id'),
+                'enqueued_at': datetime.fromtimestamp(job.enqueued_at)
+            }
+            if self.app is not None:
+                with self.app.app_context():
+                    self._insert_dead_letter(row)
+            else:
+                self._insert_dead_letter(row)
+        except Exception as e:
+            print(f"Ошибка сохранения в dead-letter: {e}")
+
+    @staticmethod
+    def _insert_dead_letter(row: Dict):
+        with db.engine.begin() as connection:
+            connection.execute(NotificationDeadLetter.__table__.insert(), row)
+
+    def get_dead_letters(self, limit: int = 50) -> List[Dict]:
+        """Последние недоставленные уведомления"""
+        try:
+            rows = NotificationDeadLetter.query.order_by(NotificationDeadLetter.id.desc()).limit(limit).all()
+            return [row.to_dict() for row in rows]
+        except Exception as e:
+            print(f"Ошибка чтения dead-letter: {e}")
+            return []
+
+    def get_stats(self) -> Dict:
+        """Глубина очереди, задержка доставки и счетчики по каналам"""
+        now = time.time()
+        with self.condition:
+            waiting = [job.enqueued_at for jobs in self.ready.values() for job in jobs]
+            waiting += [job.enqueued_at for _, _, job in self.delayed]
+            latencies = np.array(self.latencies, dtype=np.float64)
+            channels = {
+                channel: {
+                    'ready': len(self.ready[channel]),
+                    'in_flight': self.active[channel],
+                    'concurrency': self.limits[channel],
+                    **self.channel_stats[channel]
+                }
+                for channel in self.handlers
+            }
+            stats = dict(self.stats)
+            delayed = len(self.delayed)
+
+        return {
+            'workers': self.workers,
+            'queue_depth': len(waiting),
+            'retry_pending': delayed,
+            'oldest_pending_s': round(now - min(waiting), 1) if waiting else 0.0,
+            'latency_avg_s': round(float(latencies.mean()), 3) if len(latencies) else 0.0,
+            'latency_p95_s': round(float(np.percentile(latencies, 95)), 3) if len(latencies) else 0.0,
+            'latency_max_s': round(float(latencies.max()), 3) if len(latencies) else 0.0,
+            'channels': channels,
+            **stats
+        }
@@ -1,21 +1,32 @@
 from flask_mail import Mail, Message
-from models.settings import NotificationSettings, AlertSettings
+from models.settings import NotificationSettings
 from models.monitoring import AlertLog
 import json
 import time
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
+from services.alert_state import OpenIncidentIndex
 
 
 class NotificationService:
     """Сервис для отправки уведомлений"""
 
-    def __init__(self, app=None, mail=None):
+    def __init__(self, app=None, mail=None, queue=None, transport=None, digest=None):
         self.app = app
         self.mail = mail
+        self.queue = queue  # NotificationQueue: отправка в пуле потоков (None - синхронно)
+        self.transport = transport  # PooledMailTransport: постоянные SMTP-сессии (None - flask_mail)
+        self.digest = digest  # DigestBatcher для некритичных оповещений (None - без объединения)
         self.last_notifications = {}  # Для предотвращения спама
         self.cooldown_minutes = 5  # Минут между повторными уведомлениями
 
+    def escalation_recipients(self) -> List[str]:
+        """Адреса администраторов для эскалации (пусто - настройки или адреса не заданы)"""
+        notification_settings = NotificationSettings.query.first()
+        if not notification_settings:
+            return []
+        return json.loads(notification_settings.admin_emails or '[]')
+
     def send_alert_email(self, alert: AlertLog, escalated: bool = False):
         """Отправка email уведомления об инциденте"""
         try:
@@ -25,10 +36,13 @@ class NotificationService:
                 return False
 
             # Проверяем cooldown для предотвращения спама
-            cooldown_key = f"{alert.alert_type}_{alert.severity}"
+            # Эскалация отправляется один раз на инцидент (отметка в базе) и cooldown не подчиняется
+            # Оповещения разных устройств подавляются независимо
+            cooldown_key = f"{alert.alert_type}_{alert.severity}" + (f"_{alert.host}" if alert.host else '') \
+                + ('_escalated' if escalated else '')
             now = datetime.now()
 
-            if cooldown_key in self.last_notifications:
+            if not escalated and cooldown_key in self.last_notifications:
                 last_sent = self.last_notifications[cooldown_key]
                 if (now - last_sent).total_seconds() < (self.cooldown_minutes * 60):
                     return False  # Слишком рано для повторного уведомления
@@ -46,11 +60,13 @@ class NotificationService:
                 return False
 
             # Формируем сообщение
-            subject = f"{subject_prefix} Инцидент в ЦОД: {alert.alert_type}"
+            source = alert.host or 'локальный сервер'
+            subject = f"{subject_prefix} Инцидент в ЦОД: {alert.alert_type}" + (f" ({alert.host})" if alert.host else '')
 
             body = f"""
 Обнаружен инцидент в системе мониторинга ЦОД:
 
+Источник: {source}
 Тип: {alert.alert_type}
 Уровень: {alert.severity}
 Сообщение: {alert.message}
@@ -63,52 +79,48 @@ class NotificationService:
 Проверьте панель мониторинга для получения подробной информации.
             """
 
-            # Отправляем email
-            msg = Message(
-                subject=subject,
-                sender=notification_settings.from_email,
-                recipients=email_list,
-                body=body
-            )
+            payload = {
+                'alert_id': alert.id,
+                'subject': subject,
+                'sender': notification_settings.from_email,
+                'recipients': email_list,
+                'body': body
+            }
 
-            self.mail.send(msg)
-            self.last_notifications[cooldown_key] = now
+            if self.digest is not None and alert.severity != 'critical' and not escalated:
+                # Некритичные оповещения объединяются в дайджест; критичные и эскалации уходят сразу
+                self.digest.add(payload)
+                self.last_notifications[cooldown_key] = now
+                return True
+
+            if self.queue is not None:
+                # SMTP выполняется в пуле очереди: цикл мониторинга не ждет почтовый сервер
+                if not self.queue.enqueue('email', payload):
+                    return False
+                self.last_notifications[cooldown_key] = now
+                return True
 
-            print(f"Email уведомление отправлено: {subject}")
+            self.deliver_email(payload)
+            self.last_notifications[cooldown_key] = now
             return True
 
         except Exception as e:
             print(f"Ошибка отправки email: {e}")
             return False
 
-    def check_escalation(self):
-        """Проверка инцидентов для эскалации"""
-        try:
-            # Получаем настройки эскалации
-            alert_settings = {s.metric_type: s for s in AlertSettings.query.all()}
-
-            # Ищем неразрешенные критические инциденты
-            critical_alerts = AlertLog.query.filter_by(
-                severity='critical',
-                resolved=False
-            ).all()
-
-            for alert in critical_alerts:
-                setting = alert_settings.get(alert.alert_type)
-                if not setting:
-                    continue
-
-                # Проверяем время с момента создания инцидента
-                time_diff = datetime.now() - alert.timestamp
-                if time_diff.total_seconds() > (setting.escalation_minutes * 60):
-                    # Время для эскалации истекло
-                    self.send_alert_email(alert, escalated=True)
-
-                    # Отмечаем как эскалированный (можно добавить поле в модель)
-                    print(f"Эскалация инцидента: {alert.message}")
-
-        except Exception as e:
-            print(f"Ошибка проверки эскалации: {e}")
+    def deliver_email(self, payload: Dict):
+        """Отправка подготовленного письма (исключение - для повтора очередью)"""
+        msg = Message(
+            subject=payload['subject'],
+            sender=payload['sender'],
+            recipients=payload['recipients'],
+            body=payload['body']
+        )
+        if self.transport is not None:
+            self.transport.send(msg)
+        else:
+            self.mail.send(msg)
+        print(f"Email уведомление отправлено: {payload['subject']}")
 
     def get_notification_stats(self) -> Dict:
         """Получение статистики уведомлений"""
@@ -139,10 +151,15 @@ class NotificationService:
 class AlertManager:
     """Менеджер для работы с оповещениями"""
 
-    def __init__(self, notification_service: NotificationService):
+    def __init__(self, notification_service: NotificationService, incidents: OpenIncidentIndex = None,
+                 email_warnings: bool = False, escalations=None):
         self.notification_service = notification_service
+        self.incidents = incidents or OpenIncidentIndex()  # Открытые инциденты для дедупликации
+        self.email_warnings = email_warnings  # Отправлять ли предупреждения (дайджестом)
+        self.escalations = escalations  # EscalationScheduler: сроки эскалации критических инцидентов
 
-    def process_alert(self, alert_type: str, severity: str, value: float, threshold: float, message: str):
+    def process_alert(self, alert_type: str, severity: str, value: float, threshold: float, message: str,
+                      host: Optional[str] = None):
         """Обработка нового оповещения"""
         try:
             # Создаем запись в журнале
@@ -151,15 +168,19 @@ class AlertManager:
                 severity=severity,
                 message=message,
                 value=value,
-                threshold=threshold
+                threshold=threshold,
+                host=host
             )
 
             from models.monitoring import db
             db.session.add(alert)
             db.session.commit()
+            self.incidents.add(alert)
+            if self.escalations is not None:
+                self.escalations.schedule(alert)
 
-            # Отправляем уведомление для критических инцидентов
-            if severity == 'critical':
+            # Отправляем уведомление для критических инцидентов (предупреждения - если включены)
+            if severity == 'critical' or self.email_warnings:
                 self.notification_service.send_alert_email(alert)
 
             return alert
@@ -176,6 +197,9 @@ class AlertManager:
                 alert.resolved = True
                 from models.monitoring import db
                 db.session.commit()
+                self.incidents.resolve(alert)
+                if self.escalations is not None:
+                    self.escalations.cancel(alert.id)
                 return True
             return False
         except Exception as e:
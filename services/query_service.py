@@ -0,0 +1,312 @@
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from models.monitoring import db, MetricRollup
+from services.downsampling import DOWNSAMPLE_METHODS, downsample_columns, envelope_index
+from services.rollup_service import RollupService, EPOCH
+from storage.metrics_store import raw_datetime
+
+# Функции агрегации, которые можно вычислить по готовым агрегатам
+ROLLUP_AGGREGATIONS = ('avg', 'min', 'max', 'last')
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value: str) -> float:
+    """Длительность: число секунд или строка вида 30s, 5m, 1h, 7d"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', str(value))
+    if not match:
+        raise ValueError(f'Неверная длительность: {value}')
+    return float(match.group(1)) * DURATION_UNITS.get(match.group(2) or 's')
+
+
+def parse_time(value: Optional[str], default: datetime) -> datetime:
+    """Время: ISO 8601, секунды от эпохи или смещение от текущего момента (-24h)"""
+    if value is None or value == '':
+        return default
+    if value.startswith('-'):
+        return datetime.now() - timedelta(seconds=parse_duration(value[1:]))
+    if re.fullmatch(r'\d+(\.\d+)?', value):
+        return datetime.fromtimestamp(float(value))
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Неверное время: {value}')
+    # Метрики хранятся в локальном времени без часового пояса
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def parse_aggregation(value: Optional[str]) -> Tuple[str, Optional[float]]:
+    """Функция агрегации: avg, min, max, last или перцентиль p50, p95, p99.9"""
+    value = (value or 'avg').lower()
+    if value in ROLLUP_AGGREGATIONS:
+        return value, None
+
+    match = re.fullmatch(r'p(\d+(?:\.\d+)?)', value)
+    if match and 0 <= float(match.group(1)) <= 100:
+        return 'percentile', float(match.group(1)) / 100
+
+    raise ValueError(f'Неизвестная функция агрегации: {value}')
+
+
+def reduce_buckets(index: np.ndarray, values: np.ndarray, size: int, agg: str,
+                   quantile: Optional[float] = None, weights: Optional[np.ndarray] = None,
+                   order: Optional[np.ndarray] = None) -> np.ndarray:
+    """Свертка значений по номерам интервалов; index должен быть неубывающим (кроме перцентиля)"""
+    result = np.full(size, np.nan)
+
+    valid = ~np.isnan(values)
+    index, values = index[valid], values[valid]
+    if weights is not None:
+        weights = weights[valid]
+    if order is not None:
+        order = order[valid]
+    if len(values) == 0:
+        return result
+
+    if agg == 'avg':
+        if weights is None:
+            weights = np.ones(len(values))
+        sums = np.bincount(index, weights=values * weights, minlength=size)
+        counts = np.bincount(index, weights=weights, minlength=size)
+        np.divide(sums, counts, out=result, where=counts > 0)
+        return result
+
+    if agg == 'percentile':
+        # Сортировка по (интервал, значение), затем линейная интерполяция внутри интервала
+        sort = np.lexsort((values, index))
+        index, values = index[sort], values[sort]
+        counts = np.bincount(index, minlength=size)
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        present = np.flatnonzero(counts)
+        position = quantile * (counts[present] - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        low_values = values[offsets[present] + lower]
+        high_values = values[offsets[present] + upper]
+        result[present] = low_values + (high_values - low_values) * (position - lower)
+        return result
+
+    if agg == 'last' and order is not None:
+        sort = np.lexsort((order, index))
+        index, values = index[sort], values[sort]
+
+    starts = np.flatnonzero(np.concatenate([[True], index[1:] != index[:-1]]))
+    if agg == 'min':
+        result[index[starts]] = np.minimum.reduceat(values, starts)
+    elif agg == 'max':
+        result[index[starts]] = np.maximum.reduceat(values, starts)
+    elif agg == 'last':
+        ends = np.concatenate([starts[1:], [len(values)]]) - 1
+        result[index[ends]] = values[ends]
+    return result
+
+
+def to_json_values(values: np.ndarray) -> List[Optional[float]]:
+    """Значения ряда для JSON: пропуски (NaN) - null"""
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+class QueryService:
+    """Запросы рядов за диапазон с агрегацией по шагу"""
+
+    def __init__(self, store, rollup_service: RollupService = None, max_points: int = 11000,
+                 default_points: int = 500):
+        self.store = store
+        self.rollups = rollup_service or RollupService()
+        self.max_points = max_points  # Максимум интервалов в ответе
+        self.default_points = default_points  # Интервалов при шаге по умолчанию
+
+    def resolve_step(self, start: datetime, end: datetime, step: Optional[float], raw_interval: float) -> int:
+        """Шаг в секундах: заданный или подобранный под default_points"""
+        span = (end - start).total_seconds()
+        if step is None:
+            step = max(raw_interval, span / self.default_points)
+        step = max(int(np.ceil(step)), 1)
+
+        if span / step > self.max_points:
+            raise ValueError(f'Слишком много точек ({int(span / step)}), увеличьте step')
+        return step
+
+    def rollup_resolution(self, step: int, agg: str, raw_interval: float) -> int:
+        """Самое грубое разрешение агрегатов, кратное шагу (0 - читать сырые данные)"""
+        if agg not in ROLLUP_AGGREGATIONS:
+            return 0
+
+        candidates = [
+            resolution for resolution in self.rollups.resolutions
+            if resolution <= step and step % resolution == 0 and resolution > raw_interval
+        ]
+        return max(candidates) if candidates else 0
+
+    def _validate(self, metrics: Iterable[str], start: datetime, end: datetime) -> List[str]:
+        metrics = list(dict.fromkeys(metrics))
+        unknown = [metric for metric in metrics if metric not in self.rollups.metrics]
+        if not metrics or unknown:
+            raise ValueError(f"Неизвестные метрики: {', '.join(unknown) or 'не указаны'}")
+        if end <= start:
+            raise ValueError('Параметр end должен быть больше start')
+        return metrics
+
+    def query(self, metrics: Iterable[str], start: datetime, end: datetime, step: Optional[float] = None,
+              agg: str = 'avg', raw_interval: float = 5) -> Dict:
+        """Ряды метрик по интервалам [start, end) с шагом step, выровненным по эпохе"""
+        metrics = self._validate(metrics, start, end)
+        agg_name, quantile = parse_aggregation(agg)
+        step = self.resolve_step(start, end, step, raw_interval)
+
+        buckets, series, source = self._series(metrics, start, end, step, agg_name, quantile, raw_interval)
+        return self._response(start, end, step, agg.lower() if agg else 'avg', source, buckets, series)
+
+    def query_downsampled(self, metrics: Iterable[str], start: datetime, end: datetime, points: int,
+                          method: str = 'lttb', raw_interval: float = 5) -> Dict:
+        """Ряды за диапазон, прореженные до points точек с сохранением формы и выбросов
+
+        lttb выбирает визуально значимые точки из сырых строк диапазона (по агрегатам пики были бы
+        усреднены). minmax читает самый детальный шаг, укладывающийся в max_points (сырые данные или
+        агрегаты), и возвращает средние по points / 2 интервалам и огибающую envelope из минимумов
+        и максимумов.
+        """
+        metrics = self._validate(metrics, start, end)
+        if method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"Неизвестный метод прореживания: {method}")
+        points = max(int(points), 3)
+
+        if method == 'lttb':
+            data = self.store.read_range(metrics, start, end)
+            timestamps = data['timestamp'].astype(np.int64)
+            # Правая граница диапазона не включается
+            keep = timestamps < int((end - EPOCH).total_seconds() * 1000)
+            timestamps = timestamps[keep]
+            series = {metric: np.asarray(data[metric], dtype=np.float64)[keep] for metric in metrics}
+
+            indices = downsample_columns(timestamps, series, points)
+            result = self._response(start, end, int(np.ceil(raw_interval)), 'none', 'raw', timestamps[indices],
+                                    {metric: values[indices] for metric, values in series.items()})
+            result['downsample'] = method
+            result['source_points'] = len(timestamps)
+            return result
+
+        resolution = self.rollups.choose_resolution(start, end, self.max_points, raw_interval)
+        step = self.resolve_step(start, end, resolution or raw_interval, raw_interval)
+        buckets, series, source = self._series(metrics, start, end, step, 'avg', None, raw_interval)
+
+        size = len(buckets)
+        count = min(max(points // 2, 1), size)
+        index = envelope_index(size, count)
+
+        # Сырые точки с шагом опроса и есть свои минимум и максимум; агрегаты читаются отдельно
+        if source == 'raw' and step <= raw_interval:
+            lows = highs = series
+        else:
+            lows = self._series(metrics, start, end, step, 'min', None, raw_interval)[1]
+            highs = self._series(metrics, start, end, step, 'max', None, raw_interval)[1]
+
+        firsts = np.searchsorted(index, np.arange(count))
+        result = self._response(start, end, step, 'avg', source, buckets[firsts], {
+            metric: reduce_buckets(index, values, count, 'avg') for metric, values in series.items()
+        })
+        result['envelope'] = {
+            metric: {
+                'min': to_json_values(reduce_buckets(index, lows[metric], count, 'min')),
+                'max': to_json_values(reduce_buckets(index, highs[metric], count, 'max'))
+            }
+            for metric in metrics
+        }
+
+        result['downsample'] = method
+        result['source_points'] = len(buckets)
+        return result
+
+    def _series(self, metrics: List[str], start: datetime, end: datetime, step: int, agg_name: str,
+                quantile: Optional[float], raw_interval: float) -> Tuple[np.ndarray, Dict[str, np.ndarray], str]:
+        """Начала интервалов (мс от эпохи), массивы значений по метрикам и источник данных"""
+        step_ms = step * 1000
+
+        start_ms = int((start - EPOCH).total_seconds() * 1000)
+        end_ms = int((end - EPOCH).total_seconds() * 1000)
+        first_bucket = start_ms - start_ms % step_ms
+        size = int((end_ms - first_bucket - 1) // step_ms) + 1
+
+        resolution = self.rollup_resolution(step, agg_name, raw_interval)
+        series = self._from_rollups(metrics, resolution, first_bucket, end_ms, step_ms, size, agg_name) \
+            if resolution else None
+        source = f'rollup:{resolution}'
+
+        if series is None:
+            series = self._from_raw(metrics, start, end, first_bucket, step_ms, size, agg_name, quantile)
+            source = 'raw'
+
+        buckets = first_bucket + np.arange(size, dtype=np.int64) * step_ms
+        return buckets, series, source
+
+    @staticmethod
+    def _response(start: datetime, end: datetime, step: int, agg: str, source: str, buckets: np.ndarray,
+                  series: Dict[str, np.ndarray]) -> Dict:
+        labels = np.datetime_as_string(buckets.view('datetime64[ms]'), unit='s')
+        return {
+            'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'end': end.strftime('%Y-%m-%d %H:%M:%S'),
+            'step': step,
+            'agg': agg,
+            'source': source,
+            'timestamps': [label.replace('T', ' ') for label in labels],
+            'series': {metric: to_json_values(values) for metric, values in series.items()}
+        }
+
+    def _from_raw(self, metrics: List[str], start: datetime, end: datetime, first_bucket: int, step_ms: int,
+                  size: int, agg: str, quantile: Optional[float]) -> Dict[str, np.ndarray]:
+        """Свертка сырых колонок хранилища за один проход по каждой метрике"""
+        data = self.store.read_range(metrics, start, end)
+        timestamps = data['timestamp'].astype(np.int64)
+        # Правая граница диапазона не включается
+        keep = timestamps < int((end - EPOCH).total_seconds() * 1000)
+        index = (timestamps[keep] - first_bucket) // step_ms
+
+        return {
+            metric: reduce_buckets(index, np.asarray(data[metric], dtype=np.float64)[keep], size, agg, quantile,
+                                   order=timestamps[keep])
+            for metric in metrics
+        }
+
+    def _from_rollups(self, metrics: List[str], resolution: int, first_bucket: int, end_ms: int, step_ms: int,
+                      size: int, agg: str) -> Optional[Dict[str, np.ndarray]]:
+        """Пересвертка агрегатов одним запросом; None - агрегатов за диапазон нет"""
+        table = MetricRollup.__table__
+        value_column = {
+            'avg': table.c.avg_value,
+            'min': table.c.min_value,
+            'max': table.c.max_value,
+            'last': table.c.last_value
+        }[agg]
+
+        stmt = select(raw_datetime(table.c.bucket), table.c.metric, value_column, table.c.count,
+                      raw_datetime(table.c.last_timestamp)).where(
+            table.c.resolution == resolution,
+            table.c.metric.in_(metrics),
+            table.c.bucket >= EPOCH + timedelta(milliseconds=first_bucket),
+            table.c.bucket < EPOCH + timedelta(milliseconds=end_ms)
+        ).order_by(table.c.bucket)
+
+        rows = db.session.execute(stmt).all()
+        if not rows:
+            return None
+
+        buckets = np.array([row[0] for row in rows], dtype='datetime64[ms]').astype(np.int64)
+        names = np.array([row[1] for row in rows])
+        values = np.array([row[2] for row in rows], dtype=np.float64)
+        counts = np.array([row[3] for row in rows], dtype=np.float64)
+        last_times = np.array([row[4] for row in rows], dtype='datetime64[ms]').astype(np.int64)
+        index = (buckets - first_bucket) // step_ms
+
+        series = {}
+        for metric in metrics:
+            mask = names == metric
+            series[metric] = reduce_buckets(
+                index[mask], values[mask], size, agg, weights=counts[mask], order=last_times[mask]
+            )
+        return series
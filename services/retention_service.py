@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import text
+from models.monitoring import db, AlertLog
+from models.users import AuditLog
+from services.rollup_service import RollupService
+from storage.metrics_store import delete_in_batches
+
+
+class RetentionService:
+    """Сервис очистки устаревших данных без длительной блокировки базы"""
+
+    def __init__(self, metrics_store, rollup_service: RollupService = None, batch_size: int = 5000,
+                 vacuum_pages: int = 2000, series_store=None):
+        self.metrics_store = metrics_store
+        self.series_store = series_store  # Значения серий (метрики с метками, показания устройств)
+        self.rollup_service = rollup_service or RollupService()
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages  # Страниц за один проход incremental_vacuum
+        self.vacuum_warning_shown = False
+
+    def drop_metrics(self, cutoff: datetime) -> Dict:
+        """Удаление сырых метрик (для разделенных хранилищ - удаление файлов), их агрегатов и значений серий"""
+        return {
+            'metrics': self.metrics_store.drop_before(cutoff),
+            'rollups': self.rollup_service.drop_before(cutoff, self.batch_size),
+            'samples': self.series_store.drop_before(cutoff) if self.series_store is not None else 0
+        }
+
+    def delete_alerts(self, cutoff: datetime, resolved_only: bool = False) -> int:
+        """Удаление оповещений старше cutoff"""
+        table = AlertLog.__table__
+        condition = table.c.timestamp < cutoff
+        if resolved_only:
+            condition = condition & (table.c.resolved == True)
+        return delete_in_batches(table, condition, self.batch_size)
+
+    def delete_audit_logs(self, cutoff: datetime) -> int:
+        """Удаление записей аудита старше cutoff"""
+        table = AuditLog.__table__
+        return delete_in_batches(table, table.c.timestamp < cutoff, self.batch_size)
+
+    def incremental_vacuum(self) -> int:
+        """Возврат свободных страниц основной базы порцией, без полного VACUUM"""
+        if db.engine.dialect.name != 'sqlite':
+            return 0
+
+        with db.engine.connect() as connection:
+            mode = connection.execute(text('PRAGMA auto_vacuum')).scalar()
+            if mode != 2:
+                if not self.vacuum_warning_shown:
+                    print("⚠️ База создана без auto_vacuum=INCREMENTAL: для перехода однократно выполните "
+                          "PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+                    self.vacuum_warning_shown = True
+                return 0
+
+            free_pages = connection.execute(text('PRAGMA freelist_count')).scalar() or 0
+            if not free_pages:
+                return 0
+
+            # Прагма освобождает по странице за шаг; executescript выполняет ее до конца,
+            # а execute драйвера sqlite3 делает только первый шаг
+            connection.connection.driver_connection.executescript(
+                f'PRAGMA incremental_vacuum({int(self.vacuum_pages)});'
+            )
+            remaining = connection.execute(text('PRAGMA freelist_count')).scalar() or 0
+            # Файл уменьшается при переносе WAL в основную базу
+            connection.execute(text('PRAGMA wal_checkpoint(TRUNCATE)')).fetchall()
+            return free_pages - remaining
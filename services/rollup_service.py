@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.monitoring import db, SystemMetrics, MetricRollup
+from storage.metrics_store import delete_in_batches, raw_datetime
+
+# Разрешения агрегатов, секунд
+ROLLUP_RESOLUTIONS = (60, 300, 3600)
+
+# Агрегируются все числовые колонки system_metrics
+ROLLUP_METRICS = tuple(
+    column.name for column in SystemMetrics.__table__.columns
+    if column.name not in ('id', 'timestamp')
+)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class RollupService:
+    """Сервис агрегатов метрик, обновляемых при записи"""
+
+    def __init__(self, resolutions: Iterable[int] = ROLLUP_RESOLUTIONS, metrics: Iterable[str] = ROLLUP_METRICS):
+        self.resolutions = tuple(sorted(resolutions))
+        self.metrics = tuple(metrics)
+
+    @staticmethod
+    def bucket_start(timestamp: datetime, resolution: int) -> datetime:
+        """Начало интервала, в который попадает отметка времени"""
+        seconds = int((timestamp - EPOCH).total_seconds())
+        return EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+    def aggregate(self, rows: List[Dict]) -> List[Dict]:
+        """Свертка пакета строк в частичные агрегаты по (разрешение, метрика, интервал)"""
+        partials = {}
+
+        for row in rows:
+            timestamp = row['timestamp']
+            buckets = [(resolution, self.bucket_start(timestamp, resolution)) for resolution in self.resolutions]
+
+            for metric in self.metrics:
+                value = row.get(metric)
+                if value is None:
+                    continue
+
+                for resolution, bucket in buckets:
+                    key = (resolution, metric, bucket)
+                    partial = partials.get(key)
+                    if partial is None:
+                        partials[key] = {
+                            'resolution': resolution,
+                            'metric': metric,
+                            'bucket': bucket,
+                            'min_value': value,
+                            'max_value': value,
+                            'sum': value,
+                            'count': 1,
+                            'last_value': value,
+                            'last_timestamp': timestamp
+                        }
+                        continue
+
+                    partial['min_value'] = min(partial['min_value'], value)
+                    partial['max_value'] = max(partial['max_value'], value)
+                    partial['sum'] += value
+                    partial['count'] += 1
+                    if timestamp >= partial['last_timestamp']:
+                        partial['last_value'] = value
+                        partial['last_timestamp'] = timestamp
+
+        result = []
+        for partial in partials.values():
+            partial['avg_value'] = partial.pop('sum') / partial['count']
+            result.append(partial)
+        return result
+
+    def apply(self, connection, rows: List[Dict]):
+        """Инкрементальное обновление агрегатов пакетом строк (в транзакции вызывающего)"""
+        partials = self.aggregate(rows)
+        if not partials:
+            return
+
+        table = MetricRollup.__table__
+        stmt = sqlite_insert(table)
+        excluded = stmt.excluded
+
+        # Выражения SET в SQLite вычисляются по старым значениям строки
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['resolution', 'metric', 'bucket'],
+            set_={
+                'min_value': func.min(table.c.min_value, excluded.min_value),
+                'max_value': func.max(table.c.max_value, excluded.max_value),
+                'avg_value': (table.c.avg_value * table.c.count + excluded.avg_value * excluded.count)
+                             / (table.c.count + excluded.count),
+                'count': table.c.count + excluded.count,
+                'last_value': case(
+                    (excluded.last_timestamp >= table.c.last_timestamp, excluded.last_value),
+                    else_=table.c.last_value
+                ),
+                'last_timestamp': func.max(table.c.last_timestamp, excluded.last_timestamp)
+            }
+        )
+        connection.execute(stmt, partials)
+
+    def choose_resolution(self, start: datetime, end: datetime, max_points: int, raw_interval: float) -> int:
+        """Самое детальное разрешение, укладывающееся в бюджет точек (0 - сырые данные)"""
+        span = max((end - start).total_seconds(), 0)
+
+        if raw_interval > 0 and span / raw_interval <= max_points:
+            return 0
+
+        for resolution in self.resolutions:
+            if span / resolution <= max_points:
+                return resolution
+
+        return self.resolutions[-1]
+
+    def query(self, metrics: Iterable[str], start: datetime, end: datetime, resolution: int,
+              value_column: str = 'avg_value') -> List[Dict]:
+        """Ряд агрегатов в формате строк SystemMetrics.to_dict (метка - начало интервала)"""
+        metrics = [metric for metric in metrics if metric in self.metrics]
+        table = MetricRollup.__table__
+        value = table.c[value_column]
+
+        stmt = select(table.c.bucket, table.c.metric, value).where(
+            table.c.resolution == resolution,
+            table.c.metric.in_(metrics),
+            table.c.bucket >= self.bucket_start(start, resolution),
+            table.c.bucket <= end
+        ).order_by(table.c.bucket)
+
+        rows = {}
+        for bucket, metric, metric_value in db.session.execute(stmt):
+            row = rows.get(bucket)
+            if row is None:
+                row = rows[bucket] = {'timestamp': bucket.strftime('%Y-%m-%d %H:%M:%S')}
+            row[metric] = metric_value
+
+        return list(rows.values())
+
+    def query_columns(self, metrics: Iterable[str], start: datetime, end: datetime, resolution: int,
+                      value_column: str = 'avg_value') -> Dict[str, np.ndarray]:
+        """Ряд агрегатов колонками NumPy: timestamp (datetime64[ms], начало интервала) и float64 по метрикам"""
+        metrics = [metric for metric in metrics if metric in self.metrics]
+        table = MetricRollup.__table__
+
+        stmt = select(raw_datetime(table.c.bucket), table.c.metric, table.c[value_column]).where(
+            table.c.resolution == resolution,
+            table.c.metric.in_(metrics),
+            table.c.bucket >= self.bucket_start(start, resolution),
+            table.c.bucket <= end
+        ).order_by(table.c.bucket)
+
+        rows = db.session.execute(stmt).all()
+        buckets, names, values = zip(*rows) if rows else ((), (), ())
+        buckets = np.array(buckets, dtype='datetime64[ms]')
+        names = np.array(names, dtype=object)
+        values = np.array(values, dtype=np.float64)
+
+        # Разворот (интервал, метрика) в широкие колонки: номер строки - индекс уникального интервала
+        timestamps, index = np.unique(buckets, return_inverse=True)
+        data = {'timestamp': timestamps}
+        for metric in metrics:
+            mask = names == metric
+            column = np.full(len(timestamps), np.nan)
+            column[index[mask]] = values[mask]
+            data[metric] = column
+        return data
+
+    def last_raw_id(self) -> int:
+        """Идентификатор последней сырой строки (граница backfill до запуска буфера записи)"""
+        table = SystemMetrics.__table__
+        return db.session.execute(select(func.max(table.c.id))).scalar() or 0
+
+    def backfill(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 chunk_size: int = 5000, max_id: Optional[int] = None) -> int:
+        """Построение агрегатов по сырым данным, записанным в обход буфера
+
+        max_id ограничивает строки, записанные до запуска буфера: более новые буфер учитывает сам.
+        """
+        table = SystemMetrics.__table__
+        columns = [table.c.timestamp] + [table.c[metric] for metric in self.metrics]
+
+        processed = 0
+        last_id = 0
+        while True:
+            stmt = select(table.c.id, *columns).where(table.c.id > last_id)
+            if since is not None:
+                stmt = stmt.where(table.c.timestamp >= since)
+            if until is not None:
+                stmt = stmt.where(table.c.timestamp < until)
+            if max_id is not None:
+                stmt = stmt.where(table.c.id <= max_id)
+            stmt = stmt.order_by(table.c.id).limit(chunk_size)
+
+            chunk = [dict(row._mapping) for row in db.session.execute(stmt)]
+            if not chunk:
+                break
+
+            last_id = chunk[-1]['id']
+            with db.engine.begin() as connection:
+                self.apply(connection, chunk)
+            processed += len(chunk)
+
+        return processed
+
+    def drop_before(self, cutoff: datetime, batch_size: int = 5000) -> int:
+        """Удаление агрегатов за интервалы старше cutoff"""
+        table = MetricRollup.__table__
+        return delete_in_batches(table, table.c.bucket < cutoff, batch_size)
+
+    def is_empty(self) -> bool:
+        """Нет ни одного агрегата"""
+        return db.session.execute(select(MetricRollup.id).limit(1)).first() is None
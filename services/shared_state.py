@@ -0,0 +1,98 @@
+import os
+import pickle
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class SharedState:
+    """Результаты фоновых служб в файлах, общих для процессов одного хоста
+
+    Процесс фоновых служб публикует именованные разделы (замена файла атомарна),
+    веб-процессы читают их и разбирают файл заново только при изменении.
+    Сигналы (bump/changed) передают изменения настроек из веб-процессов обратно.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.cache = {}  # раздел -> (mtime_ns, данные)
+        self.seen = {}  # сигнал -> последняя обработанная версия
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str, suffix: str = 'pickle') -> str:
+        return os.path.join(self.directory, f"{name}.{suffix}")
+
+    def publish(self, name: str, data: Any):
+        """Запись раздела: читатели видят либо старую, либо новую версию целиком"""
+        path = self._path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def read(self, name: str, default: Any = None) -> Any:
+        """Последняя опубликованная версия раздела; файл перечитывается только после изменения"""
+        path = self._path(name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return default
+
+        with self.lock:
+            cached = self.cache.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            print(f"Ошибка чтения общего состояния {name}: {e}")
+            return default
+
+        with self.lock:
+            self.cache[name] = (mtime, data)
+        return data
+
+    def version(self, name: str) -> Optional[int]:
+        """Версия раздела (время изменения файла) без чтения содержимого"""
+        try:
+            return os.stat(self._path(name)).st_mtime_ns
+        except OSError:
+            return None
+
+    def bump(self, signal: str, data: Any = None):
+        """Сигнал другим процессам: например, изменились настройки оповещений.
+        Параметры сигнала (data) публикуются разделом с тем же именем до самого сигнала"""
+        if data is not None:
+            self.publish(signal, data)
+        path = self._path(signal, 'signal')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, path)
+
+    def changed(self, signal: str) -> bool:
+        """Был ли сигнал после предыдущей проверки в этом процессе (первая проверка запоминает версию)"""
+        try:
+            with open(self._path(signal, 'signal')) as f:
+                version = f.read().strip()
+        except OSError:
+            version = ''  # Сигнала еще не было: первый bump будет замечен
+
+        with self.lock:
+            previous = self.seen.get(signal)
+            self.seen[signal] = version
+        return previous is not None and previous != version
+
+    def get_stats(self) -> Dict:
+        sections = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.endswith('.pickle'):
+                stat = os.stat(os.path.join(self.directory, filename))
+                sections[filename[:-len('.pickle')]] = {
+                    'bytes': stat.st_size,
+                    'age_s': round(time.time() - stat.st_mtime, 1)
+                }
+        return {'directory': self.directory, 'sections': sections}
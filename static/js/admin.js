@@ -1073,10 +1073,8 @@ async function cleanupOldData() {
         if (result.success) {
             showSystemOperationResult(`
                 <div class="alert alert-success">
-                    <h6>Очистка завершена успешно!</h6>
-                    <p>Удалено метрик: ${result.cleaned.metrics}</p>
-                    <p>Удалено логов аудита: ${result.cleaned.audit_logs}</p>
-                    <p>Удалено оповещений: ${result.cleaned.resolved_alerts}</p>
+                    <h6>Очистка запущена</h6>
+                    <p>Данные старше ${result.retention_days} дней удалит процесс фоновых служб в ближайшем цикле мониторинга.</p>
                 </div>
             `);
         } else {
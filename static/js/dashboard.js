@@ -3,28 +3,172 @@ class Dashboard {
         this.charts = {};
         this.updateInterval = 5000; // 5 секунд
         this.isActive = true;
+
+        // Состояние панели, собранное из снимка и изменений потока
+        this.metrics = {};
+        this.status = {};
+        this.alerts = [];
+        this.history = {};
+        this.historyCursor = null; // Курсор /api/history?since= для опроса
+        this.historyKeys = ['timestamps', 'cpu_percent', 'memory_percent', 'disk_percent',
+                            'network_sent', 'network_recv', 'temperature', 'humidity', 'pressure'];
+        this.maxHistoryPoints = 50;
+
+        this.stream = null;
+        this.streamFailures = 0;
+        this.streamRetryDelay = 60000; // Повторная попытка подключения к потоку после перехода на опрос
+        this.updateLoop = null;
         this.init();
     }
 
     init() {
         this.initCharts();
-        this.updateMetrics();
-        this.updateStatus();
-        this.updateCharts();
-        this.updateAlerts();
 
-        // Главный цикл обновления
+        // Обновления приходят потоком с сервера; опрос - запасной вариант
+        if (window.EventSource) {
+            this.connectStream();
+        } else {
+            this.startPolling();
+        }
+
+        // Обработчики кнопок
+        this.setupEventHandlers();
+    }
+
+    connectStream() {
+        const source = new EventSource('/api/stream');
+        this.stream = source;
+
+        source.addEventListener('open', () => {
+            this.streamFailures = 0;
+            this.stopPolling();
+        });
+        source.addEventListener('snapshot', (event) => this.applySnapshot(JSON.parse(event.data)));
+        source.addEventListener('delta', (event) => this.applyDelta(JSON.parse(event.data)));
+
+        source.onerror = () => {
+            this.streamFailures += 1;
+            // EventSource переподключается сам; после нескольких неудач подряд переходим на опрос
+            if (source.readyState === EventSource.CLOSED || this.streamFailures >= 3) {
+                console.warn('Поток обновлений недоступен, переход на периодический опрос');
+                source.close();
+                this.stream = null;
+                this.startPolling();
+                setTimeout(() => this.connectStream(), this.streamRetryDelay);
+            }
+        };
+    }
+
+    applySnapshot(data) {
+        this.metrics = data.metrics || {};
+        this.status = data.status || {};
+        this.alerts = data.alerts || [];
+        this.history = data.history || {};
+        this.render();
+    }
+
+    applyDelta(delta) {
+        if (delta.metrics) {
+            Object.assign(this.metrics, delta.metrics);
+        }
+        if (delta.status) {
+            Object.assign(this.status, delta.status);
+        }
+        if (delta.alerts) {
+            this.alerts = delta.alerts;
+        }
+        if (delta.point) {
+            this.appendHistory(Object.fromEntries(
+                Object.entries(delta.point).map(([key, value]) => [key, [value]])
+            ));
+        }
+
+        if (!this.isActive) return;
+
+        if (delta.metrics) this.renderMetrics(this.metrics);
+        if (delta.status) this.renderStatus(this.status);
+        if (delta.alerts) this.renderAlerts(this.alerts);
+        if (delta.point) this.refreshCharts();
+    }
+
+    appendHistory(points) {
+        // Массивы истории привязаны к наборам данных графиков: новые точки дописываются на месте,
+        // старые за пределами окна отбрасываются - работа за тик не зависит от длины окна
+        Object.entries(points).forEach(([key, values]) => {
+            const series = this.history[key] || (this.history[key] = []);
+            series.push(...values);
+            if (series.length > this.maxHistoryPoints) {
+                series.splice(0, series.length - this.maxHistoryPoints);
+            }
+        });
+    }
+
+    render() {
+        if (!this.isActive) return;
+
+        this.renderMetrics(this.metrics);
+        this.renderStatus(this.status);
+        this.renderAlerts(this.alerts);
+        this.renderHistory(this.history);
+    }
+
+    startPolling() {
+        if (this.updateLoop) return;
+
+        // История из потока могла уйти вперед курсора - первый опрос загружает окно целиком
+        this.historyCursor = null;
+        this.pollAll();
         this.updateLoop = setInterval(() => {
             if (this.isActive) {
-                this.updateMetrics();
-                this.updateStatus();
-                this.updateCharts();
-                this.updateAlerts();
+                this.pollAll();
             }
         }, this.updateInterval);
+    }
 
-        // Обработчики кнопок
-        this.setupEventHandlers();
+    stopPolling() {
+        if (this.updateLoop) {
+            clearInterval(this.updateLoop);
+            this.updateLoop = null;
+        }
+    }
+
+    async pollAll() {
+        try {
+            // Состояние без истории (неизменное браузер получает ответом 304 по ETag)
+            // и только новые точки графиков после курсора
+            const initial = this.historyCursor === null;
+            const since = initial ? 0 : this.historyCursor;
+            const [state, history] = await Promise.all([
+                fetch('/api/dashboard/snapshot?history=0').then(response => response.json()),
+                fetch(`/api/history?since=${encodeURIComponent(since)}`).then(response => response.json())
+            ]);
+
+            this.metrics = state.metrics || {};
+            this.status = state.status || {};
+            this.alerts = state.alerts || [];
+            this.applyHistory(history, initial);
+            if (!this.isActive) return;
+
+            this.renderMetrics(this.metrics);
+            this.renderStatus(this.status);
+            this.renderAlerts(this.alerts);
+
+        } catch (error) {
+            console.error('Ошибка обновления панели:', error);
+        }
+    }
+
+    applyHistory(delta, initial = false) {
+        this.historyCursor = delta.cursor;
+        if (delta.reset || initial) {
+            // Курсор устарел (например, после перезапуска сервера) - пришло все окно
+            this.history = delta.points;
+            if (this.isActive) this.renderHistory(this.history);
+            return;
+        }
+
+        this.appendHistory(delta.points);
+        if (this.isActive) this.refreshCharts();
     }
 
     setupEventHandlers() {
@@ -41,11 +185,8 @@ class Dashboard {
         }
     }
 
-    async updateMetrics() {
+    renderMetrics(data) {
         try {
-            const response = await fetch('/api/metrics');
-            const data = await response.json();
-
             // Обновляем метрики на странице
             this.updateMetricCard('cpu', data.cpu_percent, '%');
             this.updateMetricCard('memory', data.memory_percent, '%', `${data.memory_used_gb}/${data.memory_total_gb} ГБ`);
@@ -70,15 +211,12 @@ class Dashboard {
             }
 
         } catch (error) {
-            console.error('Ошибка обновления метрик:', error);
+            console.error('Ошибка отображения метрик:', error);
         }
     }
 
-    async updateStatus() {
+    renderStatus(status) {
         try {
-            const response = await fetch('/api/status');
-            const status = await response.json();
-
             // Обновляем индикаторы статуса в верхней панели
             this.updateStatusIndicator('cpu', status.cpu_status);
             this.updateStatusIndicator('memory', status.memory_status);
@@ -87,7 +225,7 @@ class Dashboard {
             this.updateStatusIndicator('humidity', status.humidity_status);
 
         } catch (error) {
-            console.error('Ошибка обновления статуса:', error);
+            console.error('Ошибка отображения статуса:', error);
         }
     }
 
@@ -207,25 +345,22 @@ class Dashboard {
         }
     }
 
-    async updateCharts() {
-        try {
-            const response = await fetch('/api/history');
-            const data = await response.json();
-
-            this.updateSystemPerformanceChart(data);
-            this.updateNetworkChart(data);
-            this.updateEnvironmentChart(data);
+    renderHistory(data) {
+        // Привязка массивов истории к графикам; дальнейшие точки добавляет appendHistory
+        this.historyKeys.forEach(key => {
+            if (!Array.isArray(data[key])) data[key] = [];
+        });
+        this.updateSystemPerformanceChart(data);
+        this.updateNetworkChart(data);
+        this.updateEnvironmentChart(data);
+    }
 
-        } catch (error) {
-            console.error('Ошибка обновления графиков:', error);
-        }
+    refreshCharts() {
+        Object.values(this.charts).forEach(chart => chart.update('none'));
     }
 
-    async updateAlerts() {
+    renderAlerts(alerts) {
         try {
-            const response = await fetch('/api/alerts');
-            const alerts = await response.json();
-
             const alertsContainer = document.getElementById('alertsContainer');
             if (!alertsContainer) return;
 
@@ -247,7 +382,7 @@ class Dashboard {
             `).join('');
 
         } catch (error) {
-            console.error('Ошибка обновления оповещений:', error);
+            console.error('Ошибка отображения оповещений:', error);
         }
     }
 
@@ -453,6 +588,8 @@ class Dashboard {
             icon.className = 'fas fa-pause me-1';
             text.textContent = 'Пауза';
             pauseBtn.className = 'btn btn-outline-light btn-sm';
+            // Изменения, пришедшие во время паузы, уже учтены в состоянии
+            if (this.stream) this.render();
         } else {
             icon.className = 'fas fa-play me-1';
             text.textContent = 'Продолжить';
@@ -462,10 +599,9 @@ class Dashboard {
 
     refreshData() {
         if (this.isActive) {
-            this.updateMetrics();
-            this.updateStatus();
-            this.updateCharts();
-            this.updateAlerts();
+            // Ручное обновление перезагружает окно графиков целиком
+            this.historyCursor = null;
+            this.pollAll();
         }
     }
 
@@ -500,7 +636,7 @@ class Dashboard {
         // Возвращаем к реальным статусам
         setTimeout(() => {
             console.log('Возврат к реальным статусам');
-            this.updateStatus();
+            this.renderStatus(this.status);
         }, 7000);
     }
 }
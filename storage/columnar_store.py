@@ -0,0 +1,465 @@
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from storage import gorilla
+from storage.metrics_store import METRIC_COLUMNS
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_ms(timestamp: datetime) -> int:
+    """Наивное локальное время в миллисекунды от эпохи (без учета часового пояса)"""
+    return int((timestamp - EPOCH).total_seconds() * 1000)
+
+
+class ColumnChunk:
+    """Чанк фиксированного размера: по файлу .npy на колонку (после закрытия - .gor) и meta.json"""
+
+    def __init__(self, path: str, start_ms: int, end_ms: int, capacity: int, count: int = 0,
+                 is_sorted: bool = True, is_sealed: bool = False):
+        self.path = path
+        self.start_ms = start_ms  # Граница раздела времени, к которому относится чанк
+        self.end_ms = end_ms
+        self.capacity = capacity
+        self.count = count
+        self.is_sorted = is_sorted
+        self.is_sealed = is_sealed  # Закрытый чанк хранится в сжатом виде (.gor)
+        self.last_ms = None
+        self.writers = {}  # Открытые на запись memmap (только у текущего чанка)
+        self.meta_mtime = None  # Время изменения meta.json при последнем чтении
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+    def column_path(self, column: str) -> str:
+        return os.path.join(self.path, f'{column}.npy')
+
+    def compressed_path(self, column: str) -> str:
+        return os.path.join(self.path, f'{column}.gor')
+
+    def create(self, columns: Iterable[str]):
+        """Создание файлов чанка заранее заданного размера"""
+        os.makedirs(self.path, exist_ok=True)
+
+        timestamps = np.lib.format.open_memmap(
+            self.column_path('timestamp'), mode='w+', dtype=np.int64, shape=(self.capacity,)
+        )
+        self.writers['timestamp'] = timestamps
+
+        for column in columns:
+            values = np.lib.format.open_memmap(
+                self.column_path(column), mode='w+', dtype=np.float64, shape=(self.capacity,)
+            )
+            values[:] = np.nan
+            self.writers[column] = values
+
+        self.save_meta()
+
+    def open_for_append(self, columns: Iterable[str]):
+        """Открытие существующих файлов чанка на дозапись"""
+        for column in ['timestamp'] + list(columns):
+            if column not in self.writers:
+                self.writers[column] = np.lib.format.open_memmap(self.column_path(column), mode='r+')
+
+        if self.count and self.last_ms is None:
+            self.last_ms = int(self.writers['timestamp'][self.count - 1])
+
+    def append(self, timestamps: np.ndarray, values: Dict[str, np.ndarray]) -> int:
+        """Дозапись строк в свободные слоты, возвращает число записанных строк"""
+        size = min(len(timestamps), self.capacity - self.count)
+        if size <= 0:
+            return 0
+
+        begin, end = self.count, self.count + size
+        self.writers['timestamp'][begin:end] = timestamps[:size]
+        for column, column_values in values.items():
+            self.writers[column][begin:end] = column_values[:size]
+
+        for writer in self.writers.values():
+            writer.flush()
+
+        if self.last_ms is not None and timestamps[0] < self.last_ms:
+            self.is_sorted = False
+        if size > 1 and np.any(np.diff(timestamps[:size]) < 0):
+            self.is_sorted = False
+        self.last_ms = int(timestamps[size - 1])
+
+        # Счетчик обновляется после данных: читатели не увидят незаписанных слотов
+        self.count = end
+        self.save_meta()
+        return size
+
+    def close(self):
+        """Закрытие memmap на запись"""
+        for writer in self.writers.values():
+            writer.flush()
+        self.writers = {}
+
+    def save_meta(self):
+        """Атомарная запись meta.json"""
+        meta = {
+            'start_ms': self.start_ms,
+            'end_ms': self.end_ms,
+            'capacity': self.capacity,
+            'count': self.count,
+            'sorted': self.is_sorted,
+            'sealed': self.is_sealed
+        }
+        tmp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+    @classmethod
+    def load(cls, path: str) -> 'ColumnChunk':
+        chunk = cls(path, 0, 0, 0)
+        chunk.reload_meta()
+        return chunk
+
+    def reload_meta(self) -> bool:
+        """Перечитывание meta.json, если файл изменился после прошлого чтения"""
+        meta_path = os.path.join(self.path, 'meta.json')
+        mtime = os.stat(meta_path).st_mtime_ns
+        if mtime == self.meta_mtime:
+            return False
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.start_ms = meta['start_ms']
+        self.end_ms = meta['end_ms']
+        self.capacity = meta['capacity']
+        self.count = meta['count']
+        self.is_sorted = meta.get('sorted', True)
+        self.is_sealed = meta.get('sealed', False)
+        self.meta_mtime = mtime
+        return True
+
+    def seal(self):
+        """Сжатие заполненного или завершенного чанка и удаление файлов фиксированного размера"""
+        if self.is_sealed:
+            return
+
+        self.close()
+        columns = [name[:-4] for name in os.listdir(self.path) if name.endswith('.npy')]
+        for column in columns:
+            values = np.load(self.column_path(column), mmap_mode='r')[:self.count]
+            if column == 'timestamp':
+                encoded = gorilla.encode_timestamps(values)
+            else:
+                encoded = gorilla.encode_floats(values)
+
+            tmp_path = self.compressed_path(column) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(gorilla.MAGIC + encoded)
+            os.replace(tmp_path, self.compressed_path(column))
+
+        # Сначала фиксируем признак сжатия, затем удаляем несжатые файлы
+        self.is_sealed = True
+        self.save_meta()
+        for column in columns:
+            os.remove(self.column_path(column))
+
+    def load_column(self, column: str) -> Optional[np.ndarray]:
+        """Колонка чанка: memmap для открытого чанка, декодированный массив для закрытого"""
+        compressed_path = self.compressed_path(column)
+        if self.is_sealed or not os.path.exists(self.column_path(column)):
+            if not os.path.exists(compressed_path):
+                return None
+            with open(compressed_path, 'rb') as f:
+                buffer = f.read()
+            if column == 'timestamp':
+                return gorilla.decode_timestamps(buffer, len(gorilla.MAGIC))[0]
+            return gorilla.decode_floats(buffer, len(gorilla.MAGIC))[0]
+
+        return np.load(self.column_path(column), mmap_mode='r')[:self.count]
+
+    def read(self, columns: Iterable[str], start_ms: int, end_ms: int,
+             cache: Optional['DecodedColumnCache'] = None) -> Dict[str, np.ndarray]:
+        """Срез колонок за диапазон; для открытого чанка - представления memmap без копирования"""
+
+        def column_values(column):
+            if cache is not None and self.is_sealed:
+                return cache.get(self, column)
+            return self.load_column(column)
+
+        timestamps = column_values('timestamp')
+
+        if self.is_sorted:
+            left = int(np.searchsorted(timestamps, start_ms, side='left'))
+            right = int(np.searchsorted(timestamps, end_ms, side='right'))
+            selector = slice(left, right)
+        else:
+            selector = np.flatnonzero((timestamps >= start_ms) & (timestamps <= end_ms))
+
+        data = {'timestamp': timestamps[selector]}
+        for column in columns:
+            values = column_values(column)
+            if values is not None:
+                data[column] = values[selector]
+            else:
+                data[column] = np.full(len(data['timestamp']), np.nan)
+        return data
+
+
+class DecodedColumnCache:
+    """LRU-кэш декодированных колонок закрытых чанков"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, chunk: ColumnChunk, column: str) -> Optional[np.ndarray]:
+        key = (chunk.path, column)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        values = chunk.load_column(column)
+        if values is not None:
+            values.flags.writeable = False  # Массив разделяется между читателями
+        with self.lock:
+            self.entries[key] = values
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return values
+
+    def discard(self, path: str):
+        """Удаление колонок чанка из кэша"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == path]:
+                del self.entries[key]
+
+
+class ColumnarMetricsStore:
+    """Колоночное хранилище метрик: разделы по времени из чанков .npy (чтение через np.memmap),
+    завершенные чанки сжимаются в формат Gorilla"""
+
+    name = 'columnar'
+
+    def __init__(self, root: str, chunk_seconds: int = 3600, chunk_capacity: int = 4096,
+                 columns: Iterable[str] = METRIC_COLUMNS, read_only: bool = False,
+                 refresh_seconds: float = 1.0):
+        self.root = root
+        self.chunk_ms = int(chunk_seconds * 1000)
+        self.chunk_capacity = chunk_capacity
+        self.columns = list(columns)
+        self.lock = threading.Lock()
+        self.chunks = []  # Отсортированы по (start_ms, порядковый номер)
+        self.head = None  # Текущий чанк для дозаписи
+        self.cache = DecodedColumnCache()
+        self.read_only = read_only  # Читающий процесс: чанки пишет и сжимает только владелец
+        self.refresh_seconds = refresh_seconds  # Как часто читающий процесс подхватывает записи владельца
+        self.refreshed_at = 0.0
+
+        os.makedirs(self.root, exist_ok=True)
+        self.refresh()
+        if not read_only:
+            self.seal_completed()
+
+    def refresh(self):
+        """Подхват изменений другого процесса: загружаются только новые каталоги чанков,
+        у открытых чанков перечитывается изменившийся meta.json, закрытые чанки не меняются"""
+        with self.lock:
+            known = {os.path.basename(chunk.path): chunk for chunk in self.chunks}
+            chunks = []
+            for name in sorted(os.listdir(self.root)):
+                path = os.path.join(self.root, name)
+                chunk = known.pop(name, None)
+                try:
+                    if chunk is None:
+                        if not os.path.isfile(os.path.join(path, 'meta.json')):
+                            continue
+                        chunk = ColumnChunk.load(path)
+                    elif not chunk.is_sealed:
+                        chunk.reload_meta()
+                except FileNotFoundError:
+                    continue  # Чанк удален очисткой во время чтения каталога
+                chunks.append(chunk)
+
+            # Чанки, удаленные очисткой в другом процессе
+            for chunk in known.values():
+                self.cache.discard(chunk.path)
+
+            self.chunks = chunks
+            if self.head is not None:
+                self.head.close()
+            self.head = None
+            self.refreshed_at = time.monotonic()
+
+    def _refresh_if_stale(self):
+        """Читающий процесс перечитывает каталог не чаще раза в refresh_seconds"""
+        if self.read_only and time.monotonic() - self.refreshed_at >= self.refresh_seconds:
+            self.refresh()
+
+    def _chunk_for(self, timestamp_ms: int) -> ColumnChunk:
+        """Чанк для дозаписи строки с данной отметкой времени"""
+        partition_start = timestamp_ms - timestamp_ms % self.chunk_ms
+
+        head = self.head
+        if head is not None and head.start_ms == partition_start and not head.is_full:
+            return head
+
+        # Последний незаполненный чанк того же раздела (после перезапуска процесса)
+        for chunk in reversed(self.chunks):
+            if chunk.start_ms == partition_start and not chunk.is_full and not chunk.is_sealed:
+                self._release_head(head)
+                chunk.open_for_append(self.columns)
+                self.head = chunk
+                return chunk
+
+        sequence = sum(1 for chunk in self.chunks if chunk.start_ms == partition_start)
+        path = os.path.join(self.root, f'{partition_start:015d}-{sequence:03d}')
+        chunk = ColumnChunk(path, partition_start, partition_start + self.chunk_ms, self.chunk_capacity)
+        chunk.create(self.columns)
+
+        self._release_head(head)
+        self.chunks.append(chunk)
+        self.chunks.sort(key=lambda item: item.path)
+        self.head = chunk
+        return chunk
+
+    def _release_head(self, head: Optional[ColumnChunk]):
+        """Смена текущего чанка: заполненный или ушедший в прошлое чанк сжимается"""
+        if head is None:
+            return
+
+        newest_start = max(chunk.start_ms for chunk in self.chunks)
+        if head.is_full or head.start_ms < newest_start or self._is_partition_closed(head):
+            head.seal()
+        else:
+            head.close()
+
+    def _is_partition_closed(self, chunk: ColumnChunk) -> bool:
+        """Раздел чанка целиком в прошлом"""
+        now_ms = int((datetime.now() - EPOCH).total_seconds() * 1000)
+        return chunk.end_ms <= now_ms
+
+    def seal_completed(self) -> int:
+        """Сжатие всех завершенных чанков, кроме текущего (например, после перезапуска)"""
+        sealed = 0
+        with self.lock:
+            for chunk in self.chunks:
+                if chunk is self.head or chunk.is_sealed:
+                    continue
+                if chunk.is_full or self._is_partition_closed(chunk):
+                    chunk.seal()
+                    sealed += 1
+        return sealed
+
+    def write_rows(self, rows: List[Dict], connection=None):
+        """Дозапись пакета строк в чанки соответствующих разделов"""
+        if self.read_only:
+            raise RuntimeError('Колоночное хранилище открыто только для чтения')
+        if not rows:
+            return
+
+        timestamps = np.array([to_epoch_ms(row['timestamp']) for row in rows], dtype=np.int64)
+        values = {
+            column: np.array([row.get(column) for row in rows], dtype=np.float64)
+            for column in self.columns
+        }
+
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        values = {column: column_values[order] for column, column_values in values.items()}
+
+        with self.lock:
+            position = 0
+            while position < len(timestamps):
+                chunk = self._chunk_for(int(timestamps[position]))
+                # Строки текущего раздела
+                boundary = int(np.searchsorted(timestamps, chunk.end_ms, side='left'))
+                written = chunk.append(
+                    timestamps[position:boundary],
+                    {column: column_values[position:boundary] for column, column_values in values.items()}
+                )
+                position += written
+
+    def _chunks_in_range(self, start_ms: int, end_ms: int) -> List[ColumnChunk]:
+        return [chunk for chunk in self.chunks if chunk.start_ms <= end_ms and chunk.end_ms > start_ms]
+
+    def read_range(self, columns: Iterable[str], start: datetime, end: datetime,
+                   limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Колонки за диапазон: timestamp как datetime64[ms], значения как float64"""
+        columns = [column for column in columns if column in self.columns]
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+
+        # Новые чанки и счетчики строк появляются в другом процессе
+        self._refresh_if_stale()
+
+        with self.lock:
+            parts = [
+                chunk.read(columns, start_ms, end_ms, self.cache)
+                for chunk in self._chunks_in_range(start_ms, end_ms)
+            ]
+
+        parts = [part for part in parts if len(part['timestamp'])]
+        if not parts:
+            data = {'timestamp': np.array([], dtype='datetime64[ms]')}
+            data.update({column: np.array([], dtype=np.float64) for column in columns})
+            return data
+
+        if len(parts) == 1:
+            data = parts[0]
+        else:
+            data = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+        if any(not chunk.is_sorted for chunk in self._chunks_in_range(start_ms, end_ms)):
+            order = np.argsort(data['timestamp'], kind='stable')
+            data = {name: values[order] for name, values in data.items()}
+
+        if limit is not None:
+            data = {name: values[-limit:] for name, values in data.items()}
+
+        data['timestamp'] = data['timestamp'].view('datetime64[ms]')
+        return data
+
+    def count(self, since: Optional[datetime] = None) -> int:
+        """Количество сохраненных строк"""
+        self._refresh_if_stale()
+        with self.lock:
+            if since is None:
+                return sum(chunk.count for chunk in self.chunks)
+
+        data = self.read_range([], since, datetime.max)
+        return len(data['timestamp'])
+
+    def drop_before(self, cutoff: datetime) -> int:
+        """Удаление каталогов чанков, раздел которых целиком предшествует cutoff"""
+        if self.read_only:
+            raise RuntimeError('Колоночное хранилище открыто только для чтения')
+        cutoff_ms = to_epoch_ms(cutoff)
+        dropped = 0
+        with self.lock:
+            expired = [chunk for chunk in self.chunks if chunk.end_ms <= cutoff_ms]
+            for chunk in expired:
+                if chunk is self.head:
+                    chunk.close()
+                    self.head = None
+                self.cache.discard(chunk.path)
+                shutil.rmtree(chunk.path, ignore_errors=True)
+                dropped += chunk.count
+            self.chunks = [chunk for chunk in self.chunks if chunk.end_ms > cutoff_ms]
+        return dropped
+
+    def last_timestamp(self) -> Optional[datetime]:
+        """Время последней сохраненной строки"""
+        self._refresh_if_stale()
+        with self.lock:
+            chunks = [chunk for chunk in self.chunks if chunk.count]
+            if not chunks:
+                return None
+            latest = max(
+                int(chunk.read([], chunk.start_ms, chunk.end_ms, self.cache)['timestamp'].max())
+                for chunk in chunks[-2:]
+            )
+        return EPOCH + timedelta(milliseconds=latest)
@@ -0,0 +1,136 @@
+"""
+Сжатие рядов в стиле Gorilla: delta-of-delta для времени и XOR для значений.
+Вместо побитового кодирования используется побайтовое выравнивание, чтобы
+кодирование и декодирование выполнялись векторно средствами NumPy.
+
+Формат потока 64-битных слов:
+    битовая карта ненулевых слов (1 бит на слово),
+    заголовок на каждое ненулевое слово: старший полубайт - число нулевых младших байт,
+    младший полубайт - число значащих байт,
+    значащие байты подряд.
+"""
+
+import struct
+from typing import Tuple
+import numpy as np
+
+MAGIC = b'GOR1'
+BYTE_POSITIONS = np.arange(8)
+
+
+def _pack_words(words: np.ndarray) -> bytes:
+    """Упаковка массива uint64: нулевые слова - 1 бит, остальные - заголовок и значащие байты"""
+    count = len(words)
+    nonzero = words != 0
+    bitmap = np.packbits(nonzero).tobytes()
+
+    values = words[nonzero]
+    if len(values) == 0:
+        return struct.pack('<III', count, len(bitmap), 0) + bitmap
+
+    matrix = values.astype('<u8').view(np.uint8).reshape(-1, 8)
+    present = matrix != 0
+    low = np.argmax(present, axis=1)  # Нулевых младших байт
+    high = 7 - np.argmax(present[:, ::-1], axis=1)  # Индекс старшего значащего байта
+    sizes = high - low + 1
+
+    headers = ((low << 4) | sizes).astype(np.uint8)
+    valid = BYTE_POSITIONS[None, :] < sizes[:, None]
+    columns = np.minimum(low[:, None] + BYTE_POSITIONS[None, :], 7)
+    payload = matrix[np.arange(len(values))[:, None], columns][valid]
+
+    return struct.pack('<III', count, len(bitmap), len(values)) + bitmap + headers.tobytes() + payload.tobytes()
+
+
+def _unpack_words(buffer: bytes, offset: int = 0) -> Tuple[np.ndarray, int]:
+    """Обратная операция к _pack_words, возвращает слова и смещение за концом блока"""
+    count, bitmap_size, nonzero_count = struct.unpack_from('<III', buffer, offset)
+    offset += 12
+
+    bitmap = np.frombuffer(buffer, dtype=np.uint8, count=bitmap_size, offset=offset)
+    offset += bitmap_size
+    words = np.zeros(count, dtype=np.uint64)
+    if nonzero_count == 0:
+        return words, offset
+
+    nonzero = np.unpackbits(bitmap, count=count).astype(bool)
+
+    headers = np.frombuffer(buffer, dtype=np.uint8, count=nonzero_count, offset=offset)
+    offset += nonzero_count
+    low = (headers >> 4).astype(np.int64)
+    sizes = (headers & 0x0F).astype(np.int64)
+
+    payload_size = int(sizes.sum())
+    payload = np.frombuffer(buffer, dtype=np.uint8, count=payload_size, offset=offset)
+    offset += payload_size
+
+    valid = BYTE_POSITIONS[None, :] < sizes[:, None]
+    rows = np.broadcast_to(np.arange(nonzero_count)[:, None], valid.shape)[valid]
+    columns = (low[:, None] + BYTE_POSITIONS[None, :])[valid]
+
+    matrix = np.zeros((nonzero_count, 8), dtype=np.uint8)
+    matrix[rows, columns] = payload
+    words[nonzero] = matrix.view('<u8').reshape(-1)
+    return words, offset
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(words: np.ndarray) -> np.ndarray:
+    words = words.astype(np.uint64)
+    return ((words >> np.uint64(1)).view(np.int64)) ^ -((words & np.uint64(1)).view(np.int64))
+
+
+def encode_timestamps(timestamps: np.ndarray) -> bytes:
+    """Время (int64): первое значение, первая разность и далее разности второго порядка"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(timestamps) == 0:
+        return _pack_words(np.zeros(0, dtype=np.uint64))
+
+    deltas = np.diff(timestamps)
+    stream = np.concatenate([timestamps[:1], deltas[:1], np.diff(deltas)])
+    return _pack_words(_zigzag(stream))
+
+
+def decode_timestamps(buffer: bytes, offset: int = 0) -> Tuple[np.ndarray, int]:
+    """Восстановление времени двумя накопленными суммами"""
+    words, offset = _unpack_words(buffer, offset)
+    stream = _unzigzag(words)
+    if len(stream) == 0:
+        return stream, offset
+
+    deltas = np.cumsum(stream[1:])
+    timestamps = np.empty(len(stream), dtype=np.int64)
+    timestamps[0] = stream[0]
+    timestamps[1:] = stream[0] + np.cumsum(deltas)
+    return timestamps, offset
+
+
+def encode_floats(values: np.ndarray) -> bytes:
+    """Значения (float64): XOR битового представления с предыдущим значением"""
+    bits = np.asarray(values, dtype=np.float64).view(np.uint64)
+    previous = np.concatenate([np.zeros(1, dtype=np.uint64), bits[:-1]])
+    return _pack_words(bits ^ previous)
+
+
+def decode_floats(buffer: bytes, offset: int = 0) -> Tuple[np.ndarray, int]:
+    """Восстановление значений накопленным XOR"""
+    words, offset = _unpack_words(buffer, offset)
+    return np.bitwise_xor.accumulate(words).view(np.float64), offset
+
+
+def encode_block(timestamps: np.ndarray, values: np.ndarray) -> bytes:
+    """Блок ряда: время и значения одним буфером"""
+    return MAGIC + encode_timestamps(timestamps) + encode_floats(values)
+
+
+def decode_block(buffer: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Разбор блока, записанного encode_block"""
+    if buffer[:4] != MAGIC:
+        raise ValueError('Неверный формат сжатого блока')
+    timestamps, offset = decode_timestamps(buffer, 4)
+    values, _ = decode_floats(buffer, offset)
+    return timestamps, values
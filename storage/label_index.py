@@ -0,0 +1,332 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional
+import numpy as np
+
+METRIC_LABEL = '__name__'  # Имя метрики как метка селектора: {__name__=~"if_.*_bps"}
+MATCH_OPERATORS = ('=', '!=', '=~', '!~')
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<op>=~|!=|!~|=|\{|\}|,|\(|\))
+  | (?P<word>[A-Za-z0-9_.:/\-]+)
+)''', re.VERBOSE)
+_LABEL_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_METRIC_NAME = re.compile(r'[A-Za-z_:][A-Za-z0-9_:.]*')
+
+
+class Matcher:
+    """Условие на одну метку: name = значение, != значение, =~ регулярное выражение, !~ выражение"""
+
+    __slots__ = ('name', 'op', 'value', 'regex')
+
+    def __init__(self, name: str, op: str, value: str):
+        if op not in MATCH_OPERATORS:
+            raise ValueError(f"Неизвестный оператор {op}")
+        self.name = name
+        self.op = op
+        self.value = value
+        self.regex = None
+        if op in ('=~', '!~'):
+            try:
+                self.regex = re.compile(value)
+            except re.error as e:
+                raise ValueError(f"Некорректное регулярное выражение {value!r}: {e}")
+
+    def __repr__(self):
+        return f"{self.name}{self.op}{self.value!r}"
+
+
+def parse_selector(text: str):
+    """Разбор селектора серий
+
+    Селектор - имя метрики и/или условия на метки в фигурных скобках через запятую (И):
+    temperature{rack="A3"}, cpu_percent{role="db",host!~"test-.*"}, {room="1"}. Селекторы
+    объединяются операторами and и or (and связывает сильнее), допускаются скобки. Значение
+    без пробелов и спецсимволов можно не заключать в кавычки: {rack=A3}. Результат - дерево
+    ('or' | 'and', [узлы]) или ('select', [Matcher]).
+    """
+    tokens = []
+    position = 0
+    text = text or ''
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            if not text[position:].strip():
+                break
+            raise ValueError(f"Неожиданный символ в селекторе на позиции {position}: {text[position:position + 10]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            # Экранируются только кавычки и обратная косая черта: "\\d" в селекторе - \d в выражении
+            value = re.sub(r'\\(["\'\\])', r'\1', value[1:-1])
+        tokens.append((kind, value))
+
+    if not tokens:
+        raise ValueError("Пустой селектор")
+
+    index = 0
+
+    def peek():
+        return tokens[index] if index < len(tokens) else (None, None)
+
+    def take(kind=None, value=None):
+        nonlocal index
+        token = peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            expected = value or kind or 'продолжение'
+            raise ValueError(f"Ожидалось {expected!r}, получено {token[1]!r}")
+        index += 1
+        return token[1]
+
+    def expression():
+        nodes = [term()]
+        while peek() == ('word', 'or'):
+            take()
+            nodes.append(term())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def term():
+        nodes = [factor()]
+        while peek() == ('word', 'and'):
+            take()
+            nodes.append(factor())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def factor():
+        if peek() == ('op', '('):
+            take()
+            node = expression()
+            take('op', ')')
+            return node
+
+        matchers = []
+        if peek()[0] == 'word':
+            metric = take()
+            if not _METRIC_NAME.fullmatch(metric):
+                raise ValueError(f"Некорректное имя метрики: {metric}")
+            matchers.append(Matcher(METRIC_LABEL, '=', metric))
+        if peek() == ('op', '{'):
+            take()
+            while peek() != ('op', '}'):
+                name = take('word')
+                if not _LABEL_NAME.fullmatch(name):
+                    raise ValueError(f"Некорректное имя метки: {name}")
+                op = take('op')
+                kind, value = peek()
+                if kind not in ('string', 'word'):
+                    raise ValueError(f"Не указано значение метки {name}")
+                take()
+                matchers.append(Matcher(name, op, value))
+                if peek() == ('op', ','):
+                    take()
+                elif peek() != ('op', '}'):
+                    raise ValueError(f"Ожидалась ',' или '}}' после условия на метку {name}")
+            take('op', '}')
+        if not matchers:
+            raise ValueError(f"Ожидался селектор, получено {peek()[1]!r}")
+        return 'select', matchers
+
+    tree = expression()
+    if index != len(tokens):
+        raise ValueError(f"Лишний текст в селекторе: {tokens[index][1]!r}")
+    return tree
+
+
+def _contains(haystack: np.ndarray, needles: np.ndarray) -> np.ndarray:
+    """Маска needles, присутствующих в отсортированном haystack (двоичный поиск)"""
+    if len(haystack) == 0:
+        return np.zeros(len(needles), dtype=bool)
+    positions = np.searchsorted(haystack, needles)
+    positions[positions == len(haystack)] = 0
+    return haystack[positions] == needles
+
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+class LabelIndex:
+    """Инвертированный индекс меток серий в памяти: пара метки -> отсортированные идентификаторы серий
+
+    Списки хранятся компактными массивами int64 и пополняются при создании серии; для запроса
+    из них один раз строятся массивы NumPy. Пересечение короткого списка с длинным идет двоичным
+    поиском, сопоставимых по длине и объединение - через битовую маску по идентификаторам.
+    Регулярное выражение проверяется по значениям метки, а не по сериям, и его результат кэшируется
+    до появления нового значения или серии с этой меткой.
+    """
+
+    def __init__(self):
+        self.postings = {}  # (метка, значение) -> array('q') идентификаторов по возрастанию
+        self.values = {}  # метка -> set значений
+        self.all_ids = array('q')
+        self.arrays = {}  # кэш массивов NumPy: (метка, значение), ('*', метка) - все серии с меткой, None - все
+        self.regex_values = {}  # (метка, выражение) -> значения, подходящие под выражение
+        self.regex_arrays = {}  # метка -> {выражение: серии}
+        # Выражения, совпадающие с пустой строкой, включают серии без метки - сбрасываются при любой новой серии
+        self.empty_regex_arrays = {}  # метка -> {выражение: серии}
+        self.lock = threading.Lock()
+
+    def add(self, series_id: int, metric: str, labels: Dict[str, str]):
+        """Учет новой серии"""
+        with self.lock:
+            for name, value in [(METRIC_LABEL, metric), *labels.items()]:
+                pair = (name, value)
+                ids = self.postings.get(pair)
+                if ids is None:
+                    ids = self.postings[pair] = array('q')
+                    self.values.setdefault(name, set()).add(value)
+                    # Новое значение метки может подойти под уже вычисленные выражения
+                    for key in [key for key in self.regex_values if key[0] == name]:
+                        del self.regex_values[key]
+                _insert(ids, series_id)
+                self.arrays.pop(pair, None)
+                self.arrays.pop(('*', name), None)
+                self.regex_arrays.pop(name, None)
+                self.empty_regex_arrays.pop(name, None)
+            _insert(self.all_ids, series_id)
+            self.arrays.pop(None, None)
+            self.empty_regex_arrays.clear()
+
+    def __len__(self):
+        return len(self.all_ids)
+
+    def _array(self, key) -> np.ndarray:
+        values = self.arrays.get(key)
+        if values is None:
+            if key is None:
+                source = self.all_ids
+            elif key[0] == '*':
+                values = self._union([self._array((key[1], value)) for value in self.values.get(key[1], ())])
+                self.arrays[key] = values
+                return values
+            else:
+                source = self.postings.get(key, array('q'))
+            values = self.arrays[key] = np.frombuffer(source, dtype=np.int64).copy() if len(source) \
+                else EMPTY
+        return values
+
+    def _mask(self, ids: np.ndarray) -> np.ndarray:
+        mask = np.zeros(int(self.all_ids[-1]) + 1 if self.all_ids else 0, dtype=bool)
+        mask[ids] = True
+        return mask
+
+    def _member(self, haystack: np.ndarray, needles: np.ndarray) -> np.ndarray:
+        """Маска needles, входящих в haystack: двоичный поиск для короткого needles, иначе битовая маска"""
+        if len(needles) * 16 < len(haystack) or len(haystack) * 16 < len(needles):
+            return _contains(haystack, needles)
+        return self._mask(haystack)[needles]
+
+    def _intersect(self, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        if len(first) > len(second):
+            first, second = second, first
+        return first[self._member(second, first)]
+
+    def _union(self, arrays: List[np.ndarray]) -> np.ndarray:
+        arrays = [values for values in arrays if len(values)]
+        if not arrays:
+            return EMPTY
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.flatnonzero(self._mask(np.concatenate(arrays)))
+
+    def _matching_values(self, matcher: Matcher) -> List[str]:
+        key = (matcher.name, matcher.value)
+        values = self.regex_values.get(key)
+        if values is None:
+            values = self.regex_values[key] = [
+                value for value in self.values.get(matcher.name, ()) if matcher.regex.fullmatch(value)
+            ]
+        return values
+
+    def _matched(self, matcher: Matcher) -> np.ndarray:
+        """Серии, у которых метка совпадает (для = и =~); для != и !~ - множество, которое исключается"""
+        if matcher.regex is None:
+            if matcher.value == '':
+                # Пустое значение - серии без этой метки
+                return np.setdiff1d(self._array(None), self._array(('*', matcher.name)), assume_unique=True)
+            return self._array((matcher.name, matcher.value))
+
+        matches_empty = matcher.regex.fullmatch('') is not None
+        cache = (self.empty_regex_arrays if matches_empty else self.regex_arrays).setdefault(matcher.name, {})
+        matched = cache.get(matcher.value)
+        if matched is None:
+            matched = self._union([self._array((matcher.name, value)) for value in self._matching_values(matcher)])
+            if matches_empty:
+                without = np.setdiff1d(self._array(None), self._array(('*', matcher.name)), assume_unique=True)
+                matched = self._union([matched, without])
+            cache[matcher.value] = matched
+        return matched
+
+    def _select(self, matchers: List[Matcher]) -> np.ndarray:
+        include = [self._matched(matcher) for matcher in matchers if matcher.op in ('=', '=~')]
+        exclude = [self._matched(matcher) for matcher in matchers if matcher.op in ('!=', '!~')]
+
+        if include:
+            # Пересечение начинается с самого короткого списка
+            include.sort(key=len)
+            result = include[0]
+            for values in include[1:]:
+                if not len(result):
+                    break
+                result = self._intersect(result, values)
+        else:
+            result = self._array(None)
+
+        for values in exclude:
+            if len(result) and len(values):
+                result = result[~self._member(values, result)]
+        return result
+
+    def _evaluate(self, node) -> np.ndarray:
+        kind, items = node
+        if kind == 'select':
+            return self._select(items)
+        results = [self._evaluate(item) for item in items]
+        if kind == 'or':
+            return self._union(results)
+        results.sort(key=len)
+        result = results[0]
+        for values in results[1:]:
+            result = self._intersect(result, values)
+        return result
+
+    def select(self, selector) -> np.ndarray:
+        """Идентификаторы серий по селектору (строка или дерево parse_selector) по возрастанию"""
+        tree = parse_selector(selector) if isinstance(selector, str) else selector
+        with self.lock:
+            return self._evaluate(tree)
+
+    def label_values(self, name: str) -> List[str]:
+        with self.lock:
+            return sorted(self.values.get(name, ()))
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'series': len(self.all_ids),
+                'labels': len(self.values),
+                'pairs': len(self.postings),
+                'cached_arrays': len(self.arrays) + sum(
+                    len(cache) for caches in (self.regex_arrays, self.empty_regex_arrays) for cache in caches.values()
+                )
+            }
+
+
+def _insert(ids: array, series_id: int):
+    """Вставка с сохранением порядка: новые серии обычно получают наибольший идентификатор"""
+    if not ids or ids[-1] < series_id:
+        ids.append(series_id)
+        return
+    position = bisect_left(ids, series_id)
+    if position == len(ids) or ids[position] != series_id:
+        ids.insert(position, series_id)
+
+
+def selector_for(metric: Optional[str] = None, labels: Optional[Dict[str, str]] = None):
+    """Дерево селектора с точным совпадением метрики и меток"""
+    matchers = [Matcher(METRIC_LABEL, '=', metric)] if metric else []
+    matchers.extend(Matcher(name, '=', str(value)) for name, value in (labels or {}).items())
+    return 'select', matchers
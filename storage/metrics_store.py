@@ -0,0 +1,132 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from sqlalchemy import String, func, select, type_coerce
+from models.monitoring import db, SystemMetrics
+
+# Колонки строки метрик (без первичного ключа)
+METRIC_COLUMNS = tuple(
+    column.name for column in SystemMetrics.__table__.columns
+    if column.name not in ('id', 'timestamp')
+)
+
+
+def columns_to_records(data: Dict[str, np.ndarray]) -> List[Dict]:
+    """Колоночные массивы в список словарей формата SystemMetrics.to_dict"""
+    timestamps = data.get('timestamp')
+    if timestamps is None or len(timestamps) == 0:
+        return []
+
+    labels = np.datetime_as_string(timestamps, unit='s')
+    metrics = [name for name in data if name != 'timestamp']
+    records = []
+    for index, label in enumerate(labels):
+        record = {'timestamp': label.replace('T', ' ')}
+        for name in metrics:
+            value = data[name][index]
+            record[name] = None if np.isnan(value) else float(value)
+        records.append(record)
+    return records
+
+
+def raw_datetime(column):
+    """Колонка времени без разбора в datetime на каждой строке (строка разбирается векторно в NumPy)"""
+    return type_coerce(column, String).label(column.name)
+
+
+def rows_to_columns(rows: List, names: List[str], time_columns: Iterable[str] = ('timestamp',)) -> Dict[str, np.ndarray]:
+    """Строки результата Core-запроса в колонки: времена - datetime64[ms], остальное - float64 (NULL - NaN)"""
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    return {
+        name: np.array(column, dtype='datetime64[ms]' if name in time_columns else np.float64)
+        for name, column in zip(names, values)
+    }
+
+
+class SqlMetricsStore:
+    """Хранилище метрик в таблице system_metrics"""
+
+    name = 'sqlite'
+
+    def __init__(self, delete_batch_size: int = 5000):
+        self.table = SystemMetrics.__table__
+        self.columns = ['timestamp'] + list(METRIC_COLUMNS)
+        self.delete_batch_size = delete_batch_size  # Строк в одной транзакции удаления
+
+    def write_rows(self, rows: List[Dict], connection=None):
+        """Многострочная вставка (executemany) в транзакции вызывающего"""
+        # executemany требует одинаковый набор колонок во всех строках пакета
+        rows = [{column: row.get(column) for column in self.columns} for row in rows]
+
+        if connection is not None:
+            connection.execute(self.table.insert(), rows)
+            return
+
+        with db.engine.begin() as own_connection:
+            own_connection.execute(self.table.insert(), rows)
+
+    def read_range(self, columns: Iterable[str], start: datetime, end: datetime,
+                   limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Колонки за диапазон: timestamp как datetime64[ms], значения как float64"""
+        columns = [column for column in columns if column in METRIC_COLUMNS]
+        stmt = select(raw_datetime(self.table.c.timestamp), *[self.table.c[column] for column in columns]).where(
+            self.table.c.timestamp >= start,
+            self.table.c.timestamp <= end
+        )
+
+        if limit is not None:
+            # Последние limit строк диапазона
+            stmt = stmt.order_by(self.table.c.timestamp.desc()).limit(limit)
+            rows = list(reversed(db.session.execute(stmt).all()))
+        else:
+            rows = db.session.execute(stmt.order_by(self.table.c.timestamp)).all()
+
+        return rows_to_columns(rows, ['timestamp'] + columns)
+
+    def count(self, since: Optional[datetime] = None) -> int:
+        """Количество сохраненных строк"""
+        stmt = select(func.count()).select_from(self.table)
+        if since is not None:
+            stmt = stmt.where(self.table.c.timestamp >= since)
+        return db.session.execute(stmt).scalar() or 0
+
+    def last_timestamp(self) -> Optional[datetime]:
+        """Время последней сохраненной строки"""
+        return db.session.execute(select(func.max(self.table.c.timestamp))).scalar()
+
+    def drop_before(self, cutoff: datetime) -> int:
+        """Удаление строк старше cutoff короткими транзакциями"""
+        return delete_in_batches(self.table, self.table.c.timestamp < cutoff, self.delete_batch_size)
+
+
+def delete_in_batches(table, condition, batch_size: int = 5000) -> int:
+    """DELETE порциями по id: блокировка записи удерживается только на время одной порции"""
+    deleted = 0
+    while True:
+        batch = select(table.c.id).where(condition).limit(batch_size).scalar_subquery()
+        with db.engine.begin() as connection:
+            result = connection.execute(table.delete().where(table.c.id.in_(batch)))
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+def create_metrics_store(config, read_only: bool = False) -> object:
+    """Хранилище метрик по настройке METRICS_BACKEND (read_only - для читающих процессов)"""
+    backend = config.get('METRICS_BACKEND', 'sqlite')
+
+    if backend == 'partitioned':
+        from storage.partitioned_store import PartitionedMetricsStore
+        return PartitionedMetricsStore(config['PARTITIONED_DATA_DIR'])
+
+    if backend == 'columnar':
+        from storage.columnar_store import ColumnarMetricsStore
+        return ColumnarMetricsStore(
+            config['COLUMNAR_DATA_DIR'],
+            chunk_seconds=config['COLUMNAR_CHUNK_SECONDS'],
+            chunk_capacity=config['COLUMNAR_CHUNK_CAPACITY'],
+            read_only=read_only,
+            refresh_seconds=config.get('COLUMNAR_REFRESH_SECONDS', 1.0)
+        )
+
+    return SqlMetricsStore(config.get('RETENTION_DELETE_BATCH', 5000))
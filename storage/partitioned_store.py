@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from storage.columnar_store import EPOCH, to_epoch_ms
+from storage.metrics_store import METRIC_COLUMNS
+
+FILE_PREFIX = 'metrics-'
+FILE_SUFFIX = '.db'
+
+
+class PartitionedMetricsStore:
+    """Хранилище метрик в отдельных файлах SQLite на каждые сутки, открываемых по требованию"""
+
+    name = 'partitioned'
+
+    def __init__(self, root: str, columns: Iterable[str] = METRIC_COLUMNS, max_open: int = 16):
+        self.root = root
+        self.columns = list(columns)
+        self.max_open = max_open  # Максимум одновременно открытых файлов
+        self.lock = threading.Lock()
+        self.connections = OrderedDict()  # День -> соединение (LRU)
+
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, day: date) -> str:
+        return os.path.join(self.root, f"{FILE_PREFIX}{day.strftime('%Y%m%d')}{FILE_SUFFIX}")
+
+    def days(self) -> List[date]:
+        """Дни, для которых существуют файлы, по возрастанию"""
+        days = []
+        for name in os.listdir(self.root):
+            if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX):
+                try:
+                    days.append(datetime.strptime(name[len(FILE_PREFIX):-len(FILE_SUFFIX)], '%Y%m%d').date())
+                except ValueError:
+                    continue
+        return sorted(days)
+
+    def _connection(self, day: date, create: bool = False) -> Optional[sqlite3.Connection]:
+        """Соединение с файлом дня; вызывается под self.lock"""
+        connection = self.connections.get(day)
+        if connection is not None:
+            self.connections.move_to_end(day)
+            return connection
+
+        path = self.path_for(day)
+        if not create and not os.path.exists(path):
+            return None
+
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        column_sql = ', '.join(f'{column} REAL' for column in self.columns)
+        connection.execute(f'CREATE TABLE IF NOT EXISTS system_metrics (timestamp INTEGER NOT NULL, {column_sql})')
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_system_metrics_timestamp ON system_metrics (timestamp)')
+        connection.commit()
+
+        self.connections[day] = connection
+        while len(self.connections) > self.max_open:
+            _, oldest = self.connections.popitem(last=False)
+            oldest.close()
+        return connection
+
+    def write_rows(self, rows: List[Dict], connection=None):
+        """Вставка пакета строк в файлы соответствующих дней"""
+        if not rows:
+            return
+
+        by_day = {}
+        for row in rows:
+            timestamp = row['timestamp']
+            values = [to_epoch_ms(timestamp)] + [row.get(column) for column in self.columns]
+            by_day.setdefault(timestamp.date(), []).append(values)
+
+        placeholders = ', '.join('?' * (len(self.columns) + 1))
+        sql = f"INSERT INTO system_metrics (timestamp, {', '.join(self.columns)}) VALUES ({placeholders})"
+        with self.lock:
+            for day, values in by_day.items():
+                day_connection = self._connection(day, create=True)
+                with day_connection:
+                    day_connection.executemany(sql, values)
+
+    def _days_in_range(self, start: datetime, end: datetime) -> List[date]:
+        return [day for day in self.days() if start.date() <= day <= end.date()]
+
+    def read_range(self, columns: Iterable[str], start: datetime, end: datetime,
+                   limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Колонки за диапазон: timestamp как datetime64[ms], значения как float64"""
+        columns = [column for column in columns if column in self.columns]
+        select_sql = ', '.join(['timestamp'] + columns)
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+
+        parts = []
+        with self.lock:
+            days = self._days_in_range(start, end)
+            if limit is not None:
+                # Последние limit строк: от нового дня к старому
+                remaining = limit
+                for day in reversed(days):
+                    rows = self._connection(day).execute(
+                        f'SELECT {select_sql} FROM system_metrics WHERE timestamp BETWEEN ? AND ? '
+                        f'ORDER BY timestamp DESC LIMIT ?',
+                        (start_ms, end_ms, remaining)
+                    ).fetchall()
+                    parts.insert(0, rows[::-1])
+                    remaining -= len(rows)
+                    if remaining <= 0:
+                        break
+            else:
+                for day in days:
+                    parts.append(self._connection(day).execute(
+                        f'SELECT {select_sql} FROM system_metrics WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp',
+                        (start_ms, end_ms)
+                    ).fetchall())
+
+        rows = [row for part in parts for row in part]
+        matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(columns) + 1)
+
+        data = {'timestamp': matrix[:, 0].astype(np.int64).view('datetime64[ms]')}
+        for index, column in enumerate(columns, start=1):
+            data[column] = matrix[:, index]
+        return data
+
+    def count(self, since: Optional[datetime] = None) -> int:
+        """Количество сохраненных строк"""
+        since_ms = to_epoch_ms(since) if since is not None else None
+        total = 0
+        with self.lock:
+            for day in self.days():
+                if since is not None and day < since.date():
+                    continue
+                connection = self._connection(day)
+                if since_ms is None:
+                    total += connection.execute('SELECT count(*) FROM system_metrics').fetchone()[0]
+                else:
+                    total += connection.execute(
+                        'SELECT count(*) FROM system_metrics WHERE timestamp >= ?', (since_ms,)
+                    ).fetchone()[0]
+        return total
+
+    def last_timestamp(self) -> Optional[datetime]:
+        """Время последней сохраненной строки"""
+        with self.lock:
+            for day in reversed(self.days()):
+                latest = self._connection(day).execute('SELECT max(timestamp) FROM system_metrics').fetchone()[0]
+                if latest is not None:
+                    return EPOCH + timedelta(milliseconds=latest)
+        return None
+
+    def drop_before(self, cutoff: datetime) -> int:
+        """Удаление файлов дней, целиком предшествующих cutoff"""
+        dropped = 0
+        with self.lock:
+            for day in self.days():
+                if datetime.combine(day + timedelta(days=1), time.min) > cutoff:
+                    break
+
+                connection = self._connection(day)
+                dropped += connection.execute('SELECT count(*) FROM system_metrics').fetchone()[0]
+                connection.close()
+                self.connections.pop(day, None)
+
+                path = self.path_for(day)
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+        return dropped
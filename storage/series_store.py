@@ -0,0 +1,329 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from models.metric_catalog import metric_unit
+from models.monitoring import db, LabelPair, Sample, Series, SeriesLabel
+from storage.label_index import LabelIndex, selector_for
+
+# Метки, уточняющие источник внутри устройства (интерфейс коммутатора, датчик BMC)
+SOURCE_LABELS = ('interface', 'sensor')
+BACKSLASH = '\\'
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(timestamp: datetime) -> int:
+    """Время значения серии: целые секунды от эпохи (локальное время без часового пояса)"""
+    return int((timestamp - EPOCH).total_seconds())
+
+
+def format_epoch(ts: int) -> str:
+    return (EPOCH + timedelta(seconds=ts)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def labels_key(labels: Dict[str, str]) -> str:
+    """Каноническая запись набора меток: пары name=value по алфавиту через запятую"""
+    # Запятая в значении экранируется, чтобы разные наборы меток не давали одну запись
+    return ','.join(
+        f"{name}={str(labels[name]).replace(BACKSLASH, BACKSLASH * 2).replace(',', BACKSLASH + ',')}"
+        for name in sorted(labels)
+    )
+
+
+def parse_labels(text: Optional[str]) -> Dict[str, str]:
+    """Метки из записи "rack=A3,room=1" (пустая строка - без меток)"""
+    labels = {}
+    for pair in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, separator, value = pair.partition('=')
+        if not separator or not name.strip():
+            raise ValueError(f"Некорректная метка: {pair}")
+        labels[name.strip()] = value.strip()
+    return labels
+
+
+def source_name(labels: Dict[str, str]) -> str:
+    """Источник для оповещений: устройство или "устройство/интерфейс" ("устройство/датчик")"""
+    host = labels.get('host', '')
+    for name in SOURCE_LABELS:
+        if name in labels:
+            return f"{host}/{labels[name]}"
+    return host
+
+
+class SeriesInfo:
+    __slots__ = ('id', 'metric', 'unit', 'labels')
+
+    def __init__(self, series_id: int, metric: str, unit: Optional[str], labels: Dict[str, str]):
+        self.id = series_id
+        self.metric = metric
+        self.unit = unit
+        self.labels = labels
+
+    def to_dict(self) -> Dict:
+        return {'id': self.id, 'metric': self.metric, 'unit': self.unit, 'labels': self.labels}
+
+
+class SeriesStore:
+    """Хранилище метрик в виде серий: серия (метрика и метки) и компактные значения (серия, время, значение)
+
+    Пары меток интернируются в label_pairs, связи серий с парами лежат в series_labels. Справочник
+    серий и пар загружается в память при первом обращении, поэтому запись пакета обращается к базе
+    за справочником только при появлении новой серии. Новая метрика или устройство не меняют схему.
+    Выборка серий по меткам идет по инвертированному индексу в памяти (LabelIndex), без запросов к таблицам.
+    """
+
+    name = 'series'
+
+    def __init__(self, delete_batch_size: int = 5000):
+        self.samples = Sample.__table__
+        self.series_table = Series.__table__
+        self.pairs_table = LabelPair.__table__
+        self.links_table = SeriesLabel.__table__
+        self.delete_batch_size = delete_batch_size
+
+        self.series_ids = {}  # (метрика, запись меток) -> id
+        self.series = {}  # id -> SeriesInfo
+        self.pair_ids = {}  # (name, value) -> id пары меток
+        self.pairs = {}  # id пары -> (name, value)
+        self.index = LabelIndex()  # Пара метки -> серии; пополняется вместе со справочником
+        self.loaded = False
+        self.last_series_id = 0  # Последние загруженные из базы идентификаторы
+        self.last_pair_id = 0
+        self.lock = threading.Lock()
+        self.stats = {'series_created': 0, 'samples_written': 0, 'reloads': 0}
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self._load()
+            self.loaded = True
+
+    def _load(self):
+        """Догрузка серий и пар меток, созданных после уже загруженных, в том числе другими процессами
+
+        Вызывается под self.lock. Серии, созданные этим процессом, уже есть в справочнике и пропускаются.
+        """
+        series_table, pairs_table, links_table = self.series_table, self.pairs_table, self.links_table
+        with db.engine.connect() as connection:
+            # Порядок чтения: серии, затем их связи и пары. Серия фиксируется вместе со связями и новыми
+            # парами, поэтому у прочитанных серий связи и пары уже есть, а связи серий, созданных
+            # после чтения серий, отсекаются границей идентификатора
+            rows = connection.execute(
+                select(series_table.c.id, series_table.c.metric, series_table.c.unit, series_table.c.labels)
+                .where(series_table.c.id > self.last_series_id)).all()
+            max_series_id = max((row[0] for row in rows), default=self.last_series_id)
+
+            links = connection.execute(
+                select(links_table.c.series_id, links_table.c.label_id)
+                .where(links_table.c.series_id > self.last_series_id,
+                       links_table.c.series_id <= max_series_id)).all()
+
+            for pair_id, name, value in connection.execute(
+                    select(pairs_table.c.id, pairs_table.c.name, pairs_table.c.value)
+                    .where(pairs_table.c.id > self.last_pair_id)):
+                self.pairs[pair_id] = (name, value)
+                self.pair_ids[(name, value)] = pair_id
+                self.last_pair_id = max(self.last_pair_id, pair_id)
+
+            labels = {}
+            for series_id, label_id in links:
+                name, value = self.pairs[label_id]
+                labels.setdefault(series_id, {})[name] = value
+
+            for series_id, metric, unit, key in rows:
+                if series_id not in self.series:
+                    self.series[series_id] = SeriesInfo(series_id, metric, unit, labels.get(series_id, {}))
+                    self.series_ids[(metric, key)] = series_id
+                    self.index.add(series_id, metric, self.series[series_id].labels)
+            self.last_series_id = max_series_id
+        self.stats['reloads'] += 1
+
+    def refresh(self):
+        """Догрузка серий, созданных другими процессами"""
+        with self.lock:
+            self._load()
+            self.loaded = True
+
+    def resolve(self, rows: List[Dict]) -> List[int]:
+        """Идентификаторы серий для строк с metric и labels; недостающие серии создаются"""
+        with self.lock:
+            self._ensure_loaded()
+            keys = [(row['metric'], labels_key(row.get('labels') or {})) for row in rows]
+
+            missing = {}
+            for key, row in zip(keys, rows):
+                if key not in self.series_ids and key not in missing:
+                    missing[key] = row
+            if missing:
+                self._create(missing)
+
+            return [self.series_ids[key] for key in keys]
+
+    def _create(self, missing: Dict):
+        """Новые серии в отдельной короткой транзакции до записи значений
+
+        Транзакция вызывающего еще ничего не записала (для SQLite блокировки нет), а откат пакета
+        значений не оставляет в справочнике идентификаторов несуществующих серий.
+        """
+        try:
+            with db.engine.begin() as connection:
+                created, pairs = self._insert_series(connection, missing)
+        except IntegrityError:
+            # Ту же серию или пару одновременно создал другой процесс - догружаем справочник
+            self._load()
+            missing = {key: row for key, row in missing.items() if key not in self.series_ids}
+            with db.engine.begin() as connection:
+                created, pairs = self._insert_series(connection, missing)
+
+        # Справочник в памяти обновляется только после фиксации
+        for pair, pair_id in pairs.items():
+            self.pair_ids[pair] = pair_id
+            self.pairs[pair_id] = pair
+        for key, info in created:
+            self.series[info.id] = info
+            self.series_ids[key] = info.id
+            self.index.add(info.id, info.metric, info.labels)
+        self.stats['series_created'] += len(created)
+
+    def _insert_series(self, connection, missing: Dict):
+        created, pairs = [], {}
+        for (metric, key), row in missing.items():
+            labels = {str(name): str(value) for name, value in (row.get('labels') or {}).items()}
+            unit = row.get('unit') or metric_unit(metric) or None
+
+            series_id = connection.execute(self.series_table.insert().values(
+                metric=metric, unit=unit, labels=key, created_at=datetime.now()
+            )).inserted_primary_key[0]
+
+            links = []
+            for pair in labels.items():
+                pair_id = self.pair_ids.get(pair) or pairs.get(pair)
+                if pair_id is None:
+                    pair_id = pairs[pair] = connection.execute(
+                        self.pairs_table.insert().values(name=pair[0], value=pair[1])
+                    ).inserted_primary_key[0]
+                links.append({'series_id': series_id, 'label_id': pair_id})
+            if links:
+                connection.execute(self.links_table.insert(), links)
+
+            created.append(((metric, key), SeriesInfo(series_id, metric, unit, labels)))
+        return created, pairs
+
+    def write_rows(self, rows: List[Dict], connection=None):
+        """Значения серий (строки с timestamp, metric, labels, value) многострочной вставкой в транзакции вызывающего"""
+        series_ids = self.resolve(rows)
+        samples = [
+            {'series_id': series_id, 'ts': to_epoch(row['timestamp']), 'value': row['value']}
+            for series_id, row in zip(series_ids, rows)
+        ]
+
+        # Повтор значения серии в ту же секунду заменяет прежнее (ключ - серия и время)
+        stmt = sqlite_insert(self.samples)
+        stmt = stmt.on_conflict_do_update(index_elements=['series_id', 'ts'], set_={'value': stmt.excluded.value})
+
+        if connection is not None:
+            connection.execute(stmt, samples)
+        else:
+            with db.engine.begin() as own_connection:
+                own_connection.execute(stmt, samples)
+        self.stats['samples_written'] += len(samples)
+
+    def get_series(self, series_id: int) -> Optional[SeriesInfo]:
+        with self.lock:
+            self._ensure_loaded()
+            if series_id not in self.series and series_id > self.last_series_id:
+                self._load()
+            return self.series.get(series_id)
+
+    def list_series(self) -> List[SeriesInfo]:
+        with self.lock:
+            self._ensure_loaded()
+            return list(self.series.values())
+
+    def select(self, selector) -> List[SeriesInfo]:
+        """Серии по селектору меток: temperature{rack="A3"}, cpu_percent{role=~"db|cache"} or {room="2"}"""
+        with self.lock:
+            self._ensure_loaded()
+        series_ids = self.index.select(selector)
+        with self.lock:
+            return [self.series[series_id] for series_id in series_ids.tolist()]
+
+    def find(self, metric: Optional[str] = None, labels: Optional[Dict[str, str]] = None) -> List[SeriesInfo]:
+        """Серии метрики с заданными значениями меток (все пары совпадают)"""
+        return self.select(selector_for(metric, labels))
+
+    def read_range(self, series_id: int, start: datetime, end: datetime) -> List[Dict]:
+        """Значения одной серии за диапазон"""
+        stmt = select(self.samples.c.ts, self.samples.c.value).where(
+            self.samples.c.series_id == series_id,
+            self.samples.c.ts >= to_epoch(start),
+            self.samples.c.ts <= to_epoch(end)
+        ).order_by(self.samples.c.ts)
+        return [{'timestamp': format_epoch(ts), 'value': value} for ts, value in db.session.execute(stmt)]
+
+    def latest(self, series_ids: Optional[Iterable[int]] = None,
+               since: Optional[datetime] = None) -> Dict[int, Dict]:
+        """Последнее значение каждой серии: id -> {value, timestamp}"""
+        last = select(
+            self.samples.c.series_id, func.max(self.samples.c.ts).label('ts')
+        ).group_by(self.samples.c.series_id)
+        if series_ids is not None:
+            last = last.where(self.samples.c.series_id.in_(list(series_ids)))
+        if since is not None:
+            last = last.where(self.samples.c.ts >= to_epoch(since))
+        last = last.subquery()
+
+        stmt = select(self.samples.c.series_id, self.samples.c.value, self.samples.c.ts).join(
+            last, and_(
+                self.samples.c.series_id == last.c.series_id,
+                self.samples.c.ts == last.c.ts
+            )
+        )
+        return {
+            series_id: {'value': value, 'timestamp': format_epoch(ts)}
+            for series_id, value, ts in db.session.execute(stmt)
+        }
+
+    def count(self, since: Optional[datetime] = None) -> int:
+        stmt = select(func.count()).select_from(self.samples)
+        if since is not None:
+            stmt = stmt.where(self.samples.c.ts >= to_epoch(since))
+        return db.session.execute(stmt).scalar() or 0
+
+    def drop_before(self, cutoff: datetime) -> int:
+        """Удаление значений старше cutoff по сериям короткими транзакциями (справочник серий сохраняется)
+
+        Каждое удаление - диапазон ключа (серия, время), без просмотра таблицы и без индекса по времени.
+        """
+        samples = self.samples
+        cutoff_ts = to_epoch(cutoff)
+        with db.engine.connect() as connection:
+            series_ids = connection.execute(select(self.series_table.c.id)).scalars().all()
+
+        deleted = 0
+        for series_id in series_ids:
+            while True:
+                with db.engine.begin() as connection:
+                    # Время batch-го по счету значения: граница очередной порции удаления
+                    boundary = connection.execute(
+                        select(samples.c.ts)
+                        .where(samples.c.series_id == series_id, samples.c.ts < cutoff_ts)
+                        .order_by(samples.c.ts)
+                        .offset(self.delete_batch_size - 1).limit(1)
+                    ).scalar()
+                    condition = samples.c.ts < cutoff_ts if boundary is None else samples.c.ts <= boundary
+                    result = connection.execute(
+                        samples.delete().where(samples.c.series_id == series_id, condition)
+                    )
+                deleted += result.rowcount
+                if boundary is None:
+                    break
+        return deleted
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats, loaded=self.loaded, series=len(self.series), label_pairs=len(self.pair_ids))
+        stats['index'] = self.index.get_stats()
+        return stats